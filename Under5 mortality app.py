@@ -1,15 +1,17 @@
 import altair as alt
-import pandas as pd
+from data_store import load_source
+from derived_tables import get_table
+from heatmap_matrix import ALL_REGIONS, heatmap_frame, heatmap_matrix, heatmap_regions
 import streamlit as st
 
 # Page configuration
 st.set_page_config(page_title="Under-5 Mortality Rate Dashboard", layout="wide")
 
 # Load the data
-@st.cache_data
+@st.cache_resource
 def load_data():
     # Update this path to match your local file location
-    df = pd.read_excel('under5_mortality.xlsx')
+    df = load_source("mortality")
     return df
 
 df = load_data()
@@ -28,7 +30,7 @@ st.markdown("""
 """)
 
 # Country selector
-country_list = sorted(df['setting'].unique())
+country_list = get_table("mortality_countries")['setting'].tolist()
 selected_countries = st.multiselect(
     "Select countries to compare:",
     options=country_list,
@@ -50,11 +52,7 @@ else:
     
     if trend_type == 'Overall Trend':
         # Get ALL countries data for grey background
-        df_all = df[df['dimension'] == 'Sex'].copy()
-        df_all = df_all.drop_duplicates(subset=['setting', 'date'])
-        df_all = df_all[['setting', 'date', 'setting_average']].rename(
-            columns={'setting_average': 'estimate'}
-        )
+        df_all = get_table("mortality_trend")
         
         # Background: all OTHER countries in grey
         df_background = df_all[~df_all['setting'].isin(selected_countries)]
@@ -171,48 +169,38 @@ else:
 st.markdown("---")
 st.header("🗓️ Heatmap: Mortality Rate Over Time")
 
-# Prepare data for heatmap
-df_heatmap = df[df['dimension'] == 'Sex'].copy()
-df_heatmap = df_heatmap.drop_duplicates(subset=['setting', 'date'])
-df_heatmap = df_heatmap[['setting', 'date', 'setting_average', 'whoreg6']].rename(
-    columns={'setting_average': 'mortality_rate'}
-)
-
 # Filter options
 col1, col2 = st.columns(2)
 
 with col1:
     # Region filter
-    regions = ['All Regions'] + sorted(df_heatmap['whoreg6'].dropna().unique().tolist())
+    regions = [ALL_REGIONS] + heatmap_regions()
     selected_region = st.selectbox("Filter by WHO Region:", options=regions)
 
 with col2:
     # Year range filter
+    _, _, heatmap_years, _ = heatmap_matrix()
     year_range = st.slider(
         "Select year range:",
-        min_value=int(df_heatmap['date'].min()),
-        max_value=int(df_heatmap['date'].max()),
+        min_value=int(heatmap_years[0]),
+        max_value=int(heatmap_years[-1]),
         value=(1990, 2022)
     )
 
-# Apply filters
-df_heatmap_filtered = df_heatmap[
-    (df_heatmap['date'] >= year_range[0]) & 
-    (df_heatmap['date'] <= year_range[1])
-]
-
-if selected_region != 'All Regions':
-    df_heatmap_filtered = df_heatmap_filtered[df_heatmap_filtered['whoreg6'] == selected_region]
-
-# Sort countries by their most recent mortality rate
-country_order = df_heatmap_filtered[df_heatmap_filtered['date'] == df_heatmap_filtered['date'].max()].sort_values(
-    'mortality_rate', ascending=False
-)['setting'].tolist()
+# One row per country (sorted by its most recent rate), one column per year;
+# the chart folds the year columns back into cells
+df_heatmap = heatmap_frame(selected_region, *year_range)
+df_heatmap = df_heatmap[df_heatmap.iloc[:, 1:].notna().any(axis=1)]
+year_columns = list(df_heatmap.columns[1:])
 
 # Create heatmap
-heatmap = alt.Chart(df_heatmap_filtered).mark_rect().encode(
-    x=alt.X('date:O', title='Year', axis=alt.Axis(labelAngle=-45, values=list(range(year_range[0], year_range[1]+1, 5)))),
-    y=alt.Y('setting:N', title='Country', sort=country_order),
+heatmap = alt.Chart(df_heatmap).transform_fold(
+    year_columns, as_=['date', 'mortality_rate']
+).transform_filter(
+    'isValid(datum.mortality_rate)'
+).mark_rect().encode(
+    x=alt.X('date:O', title='Year', axis=alt.Axis(labelAngle=-45, values=[str(y) for y in range(year_range[0], year_range[1]+1, 5)])),
+    y=alt.Y('setting:N', title='Country', sort=df_heatmap['setting'].tolist()),
     color=alt.Color('mortality_rate:Q', 
                     title='Mortality Rate',
                     scale=alt.Scale(scheme='reds', domain=[0, 300])),
@@ -223,7 +211,7 @@ heatmap = alt.Chart(df_heatmap_filtered).mark_rect().encode(
     ]
 ).properties(
     width=800,
-    height=max(400, len(country_order) * 12),  # Dynamic height based on number of countries
+    height=max(400, len(df_heatmap) * 12),  # Dynamic height based on number of countries
     title=f'Under-5 Mortality Rate Heatmap ({year_range[0]}-{year_range[1]})'
 )
 
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+# As-of query engine: "latest snapshot" and "snapshot as of year Y" slices
+# of a HIDR frame. A DateIndex is built once per table: each row gets the
+# code of its (setting, indicator_name, dimension) series, and a small table
+# lists the distinct dates of every series. A query takes the latest date
+# per group from that table and selects rows with one indexed lookup, so a
+# per-country as-of year slider does not re-run a merge per tick.
+#
+# Usage:
+#   index = DateIndex(df)
+#   index.as_of()                          # most recent date per setting
+#   index.as_of(year=2015)                 # most recent date up to 2015
+#   index.as_of(year={"Peru": 2012})       # per-country as-of year
+
+INDEX_KEYS = ["setting", "indicator_name", "dimension"]
+
+
+def _dates(df):
+    # date column as float, missing (Int16 NA or NaN) as NaN
+    return df["date"].to_numpy(dtype=float, na_value=np.nan)
+
+
+class DateIndex:
+    def __init__(self, df, keys=INDEX_KEYS):
+        self.df = df
+        self.keys = keys
+
+        # row -> series code (-1 where a key is missing)
+        codes = df.groupby(keys, observed=True, sort=False, dropna=True).ngroup()
+        self.codes = codes.fillna(-1).to_numpy(dtype=np.int64)
+
+        # one row per (series, date); series keys repeated for grouping
+        dates = pd.DataFrame({"series": self.codes, "date": _dates(df)})
+        dates = dates[(dates["series"] >= 0) & dates["date"].notna()].drop_duplicates()
+        first = dates.index.to_numpy()
+        self.dates = pd.concat(
+            [dates.reset_index(drop=True), df[keys].iloc[first].reset_index(drop=True)],
+            axis=1,
+        )
+        self.n_series = int(self.codes.max()) + 1 if len(self.codes) else 0
+
+    def years(self, setting=None):
+        # Distinct dates, optionally for one setting, ascending
+        dates = self.dates
+        if setting is not None:
+            dates = dates[dates["setting"] == setting]
+        return sorted(int(d) for d in dates["date"].unique())
+
+    def latest_dates(self, by="setting", year=None):
+        # Most recent date per `by` group, up to `year`: None (no limit),
+        # a number, or a setting -> year mapping (other settings unlimited)
+        dates = self.dates
+        if year is not None:
+            if isinstance(year, (dict, pd.Series)):
+                cutoff = dates["setting"].map(year).astype(float).fillna(np.inf)
+            else:
+                cutoff = year
+            dates = dates[dates["date"] <= cutoff]
+        return dates.groupby(by, observed=True)["date"].max()
+
+    def as_of(self, by="setting", year=None):
+        # Rows of each `by` group at that group's latest date (see latest_dates)
+        by = [by] if isinstance(by, str) else list(by)
+        latest = self.latest_dates(by, year)
+
+        # latest date per series, then per row by series code
+        series = self.dates.drop_duplicates("series")[["series"] + by]
+        series = series.merge(latest.rename("target").reset_index(), on=by)
+        target = np.full(self.n_series + 1, np.nan)
+        target[series["series"].to_numpy()] = series["target"].to_numpy()
+
+        row_target = target[self.codes]  # code -1 reads the trailing NaN
+        mask = _dates(self.df) == row_target
+        return self.df[mask]
@@ -0,0 +1,113 @@
+import contextlib
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+
+import altair as alt
+import pyarrow as pa
+import streamlit as st
+
+from data_store import _arrow_safe
+from pre_transform import pre_transform
+
+# Ready-made Vega-Lite specs for the pages' Altair charts.
+# Rendering an Altair chart normally rebuilds it on every rerun, then
+# validates and converts it to a Vega-Lite dict, serializing its data to
+# Arrow. altair_chart(page, version, state, build) keeps the converted spec
+# (data as Arrow bytes, the way Streamlit sends it) under
+# (page, data version, widget state), so a repeated view or a toggle back
+# to an earlier widget value skips build() and every serialization step.
+#
+# state is normalized before it is used as a key: lists and sets become
+# sorted tuples (a selection of countries is the same chart in any order)
+# and dicts sorted items. Pass anything whose order matters as a tuple.
+#
+# server_transforms=True evaluates the spec's selection filter -> aggregate
+# views in Python before caching it (see pre_transform.py), so only the
+# aggregated rows are sent.
+#
+# Usage:
+#   altair_chart("mortality", table_version("mortality_trend"),
+#                {"countries": selected_countries}, build_trend_chart,
+#                use_container_width=True)
+
+# specs kept in memory, least recently used evicted first
+MAX_SPECS = 64
+
+# (page, version, state) -> spec
+_specs = OrderedDict()
+
+# altair's theme and data transformer settings are process-global
+_lock = threading.Lock()
+
+
+def normalize(state):
+    # Hashable, order-insensitive form of a widget state
+    if isinstance(state, dict):
+        return tuple(sorted((k, normalize(v)) for k, v in state.items()))
+    if isinstance(state, (list, set, frozenset)):
+        return tuple(sorted((normalize(v) for v in state), key=repr))
+    if isinstance(state, tuple):
+        return tuple(normalize(v) for v in state)
+    if hasattr(state, "item"):  # numpy scalar
+        return state.item()
+    return state
+
+
+def _arrow_bytes(df):
+    table = pa.Table.from_pandas(_arrow_safe(df), preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def to_spec(chart):
+    # Vega-Lite dict of an Altair chart with its data as named Arrow datasets
+    datasets = {}
+
+    def to_dataset(data):
+        data = _arrow_bytes(data)
+        name = hashlib.md5(data).hexdigest()
+        datasets[name] = data
+        return {"name": name}
+
+    with _lock:
+        alt.data_transformers.register("chart_cache", to_dataset)
+        # the default theme's fixed width/height do not apply in Streamlit
+        if alt.theme.active == "default":
+            theme = alt.theme.enable("none")
+        else:
+            theme = contextlib.nullcontext()
+        with theme, alt.data_transformers.enable("chart_cache"):
+            spec = chart.to_dict()
+
+    spec["datasets"] = {**spec.get("datasets", {}), **datasets}
+    return spec
+
+
+def chart_spec(page, version, state, build, server_transforms=False):
+    # Converted spec of build() for this page, data version and widget state
+    key = (page, version, normalize(state), server_transforms)
+    with _lock:
+        spec = _specs.get(key)
+        if spec is not None:
+            _specs.move_to_end(key)
+            return spec
+
+    spec = to_spec(build())
+    if server_transforms:
+        spec = pre_transform(spec)
+    with _lock:
+        _specs[key] = spec
+        while len(_specs) > MAX_SPECS:
+            _specs.popitem(last=False)
+    return spec
+
+
+def altair_chart(page, version, state, build, server_transforms=False, **kwargs):
+    # st.altair_chart(build(), **kwargs) through the spec cache; Streamlit
+    # pops the datasets out of the spec it is given, so it gets a copy
+    spec = chart_spec(page, version, state, build, server_transforms)
+    return st.vega_lite_chart(spec=copy.deepcopy(spec), **kwargs)
@@ -0,0 +1,64 @@
+import pandas as pd
+
+from indicators import add_indicator_metadata, startswith_mask
+
+# Completeness matrix: one row per (setting, indicator_name, dimension,
+# subgroup) series with its available years and the share of non-null
+# estimates. Built once per data version (see derived_tables), so country
+# selectors and validity filters read a small summary instead of scanning
+# the full frame on every rerun.
+#
+# Usage: settings_with(matrix, indicator="...", dimension=[...], complete=True)
+
+MATRIX_KEYS = ["setting", "indicator_name", "dimension", "subgroup"]
+
+
+def completeness_matrix(df, value="estimate"):
+    df = df[MATRIX_KEYS + ["date"]].assign(non_null=df[value].notna())
+    grouped = df.groupby(MATRIX_KEYS, observed=True)
+
+    matrix = grouped.agg(
+        rows=("non_null", "size"),
+        non_null_share=("non_null", "mean"),
+        first_year=("date", "min"),
+        last_year=("date", "max"),
+        n_years=("date", "nunique"),
+    )
+
+    # available years per series, ascending
+    dates = df[MATRIX_KEYS + ["date"]].dropna(subset=["date"]).drop_duplicates()
+    years = dates.sort_values("date").groupby(MATRIX_KEYS, observed=True)["date"].agg(list)
+    matrix["years"] = years.reindex(matrix.index).apply(lambda y: y if isinstance(y, list) else [])
+
+    return add_indicator_metadata(matrix.reset_index())
+
+
+def select(matrix, indicator=None, indicator_prefix=None, dimension=None, subgroup=None):
+    # Matrix rows for the given indicator(s), dimension(s) and subgroup(s)
+    mask = pd.Series(True, index=matrix.index)
+    if indicator is not None:
+        mask &= matrix["indicator_name"].isin(_as_list(indicator))
+    if indicator_prefix is not None:
+        mask &= startswith_mask(matrix["indicator_name"], indicator_prefix)
+    if dimension is not None:
+        mask &= matrix["dimension"].isin(_as_list(dimension))
+    if subgroup is not None:
+        mask &= matrix["subgroup"].isin(_as_list(subgroup))
+    return matrix[mask]
+
+
+def settings_with(matrix, complete=False, dated=False, **criteria):
+    # Sorted settings with at least one series matching criteria (see select).
+    # complete: every matching series has no missing estimates
+    # dated: only count series with at least one year
+    rows = select(matrix, **criteria)
+    if complete:
+        share = rows.groupby("setting", observed=True)["non_null_share"].min()
+        rows = rows[rows["setting"].isin(share.index[share == 1])]
+    if dated:
+        rows = rows[rows["last_year"].notna()]
+    return sorted(rows["setting"].unique())
+
+
+def _as_list(value):
+    return value if isinstance(value, (list, tuple, set)) else [value]
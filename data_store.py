@@ -0,0 +1,482 @@
+import argparse
+import fnmatch
+import hashlib
+import io
+import json
+import os
+import shutil
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from indicators import add_indicator_metadata
+
+# Shared loader for the WHO HIDR workbooks.
+# Parsing xlsx with openpyxl takes seconds, so each workbook is converted once
+# into a Parquet snapshot and every later load (including fresh worker
+# processes after a deploy) reads the snapshot instead.
+# Snapshots hold the normalized (compact, typed) frame, see normalize_frame.
+# Next to each snapshot sits a dataset partitioned by indicator_name and
+# dimension, so a page that declares its partitions only reads those files.
+# load_shared serves page frames from uncompressed Arrow IPC files that every
+# worker process memory-maps read-only, so N workers share one copy in the
+# OS page cache instead of holding N pickled copies.
+# The full WHO HIDR CSV export is streamed in blocks (ingest_csv) straight
+# into the partitioned layout, keeping only the partitions the pages read.
+# Set HIDR_EXPORT to the export's path to make the pages load from it.
+
+SNAPSHOT_DIR = os.environ.get("HIDR_SNAPSHOT_DIR", ".snapshots")
+
+WORKBOOKS = ["under5_mortality.xlsx", "health_determinants.xlsx", "immunizations.xlsx"]
+
+# bump when the snapshot contents change so old snapshots are rebuilt
+SNAPSHOT_VERSION = 3
+
+PARTITION_COLUMNS = ["indicator_name", "dimension"]
+
+# repeated string columns stored as categoricals
+CATEGORY_COLUMNS = ["setting", "iso3", "whoreg6", "dimension", "subgroup", "indicator_name", "update"]
+
+# Partitions each dashboard page reads (indicator_name / dimension patterns,
+# matched case-insensitively with fnmatch)
+MORTALITY_PARTITIONS = [
+    {"indicator_name": ["Under-five mortality rate*", "Under-5 mortality rate*"],
+     "dimension": ["Sex", "Economic status (wealth quintile)"]},
+]
+HEALTH_DETERMINANTS_PARTITIONS = [
+    {"indicator_name": "Share of household income (%)"},
+    {"indicator_name": "People with no education (%)*"},
+    {"indicator_name": "Population with electricity (%)*", "dimension": ["Subnational region", "Place of residence"]},
+]
+IMMUNIZATION_PARTITIONS = [
+    {"indicator_name": "Full immunization coverage among one-year-olds (%)",
+     "dimension": ["Education (3 groups)", "Economic status (wealth decile)"]},
+]
+PAGE_PARTITIONS = MORTALITY_PARTITIONS + HEALTH_DETERMINANTS_PARTITIONS + IMMUNIZATION_PARTITIONS
+
+# workbook and partitions behind each dashboard data source
+SOURCES = {
+    "mortality": ("under5_mortality.xlsx", MORTALITY_PARTITIONS),
+    "health_determinants": ("health_determinants.xlsx", HEALTH_DETERMINANTS_PARTITIONS),
+    "immunization": ("immunizations.xlsx", IMMUNIZATION_PARTITIONS),
+}
+
+# columns of the CSV export the pages use; everything else is dropped at ingest
+EXPORT_TEXT_COLUMNS = ["setting", "source", "indicator_name", "dimension", "subgroup", "iso3", "whoreg6", "update"]
+EXPORT_NUMBER_COLUMNS = ["date", "estimate", "setting_average"]
+
+# (path, size, mtime) -> content hash, so a process only hashes each file once
+_hash_memo = {}
+
+# content hashes persisted across processes, so a multi-GB export is not
+# re-hashed by every worker on startup
+HASH_INDEX = os.path.join(SNAPSHOT_DIR, "hashes.json")
+
+
+def _content_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _read_hash_index():
+    try:
+        with open(HASH_INDEX) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _remember_hash(path, stat, digest):
+    _hash_memo[(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)] = digest
+    index = _read_hash_index()
+    index[os.path.abspath(path)] = [stat.st_size, stat.st_mtime_ns, digest]
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp = f"{HASH_INDEX}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp, HASH_INDEX)
+
+
+def _known_hash(path, stat):
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _hash_memo:
+        stored = _read_hash_index().get(memo_key[0])
+        if not stored or stored[:2] != [stat.st_size, stat.st_mtime_ns]:
+            return None
+        _hash_memo[memo_key] = stored[2]
+    return _hash_memo[memo_key]
+
+
+def source_key(path):
+    # Snapshot key: size, mtime and content hash of the source workbook
+    stat = os.stat(path)
+    digest = _known_hash(path, stat)
+    if digest is None and path.lower().endswith(".csv"):
+        # an export is hashed while it is ingested, in one read
+        ingest_csv(path)
+        digest = _known_hash(path, stat)
+    if digest is None:
+        digest = _content_hash(path)
+        _remember_hash(path, stat, digest)
+    return f"{stat.st_size}-{stat.st_mtime_ns}-{digest[:16]}"
+
+
+def snapshot_path(path, suffix=".parquet"):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(SNAPSHOT_DIR, f"{stem}-v{SNAPSHOT_VERSION}-{source_key(path)}{suffix}")
+
+
+def _partitions_tag(partitions):
+    return hashlib.sha1(json.dumps(partitions, sort_keys=True).encode()).hexdigest()[:8]
+
+
+def _dataset_suffix(partitions):
+    return ".dataset" if partitions is None else f"-{_partitions_tag(partitions)}.dataset"
+
+
+def dataset_path(path, partitions=None):
+    # partitions: the clauses a CSV export was ingested with, part of the
+    # key since the dataset only holds those rows
+    return snapshot_path(path, suffix=_dataset_suffix(partitions))
+
+
+def _arrow_safe(df):
+    # Columns mixing strings and numbers (e.g. a stray "n/a" in estimate)
+    # cannot be written to Parquet as-is, so store them as strings
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True).startswith("mixed"):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def normalize_frame(df):
+    # Compact typed representation: categoricals for repeated strings,
+    # float32 for measurements and int16 for the survey year
+    df = df.copy()
+    for col in df.columns:
+        series = df[col]
+        is_text = series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+        if is_text:
+            # other low-cardinality text columns (source, indicator_abbr, ...) too
+            if col in CATEGORY_COLUMNS or series.nunique() < 0.5 * len(series):
+                df[col] = series.astype("category")
+        elif col == "date" and pd.api.types.is_numeric_dtype(series):
+            whole = series.dropna()
+            if (whole == whole.round()).all():
+                df[col] = series.astype("int16" if len(whole) == len(series) else "Int16")
+        elif series.dtype == "float64":
+            df[col] = series.astype("float32")
+    return df
+
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 1e6
+
+
+def memory_report(name, raw, compact):
+    before, after = memory_mb(raw), memory_mb(compact)
+    return f"{name}: {before:.1f} MB -> {after:.1f} MB ({before / max(after, 1e-9):.1f}x smaller)"
+
+
+def _remove_stale_snapshots(path, keep, suffix=".parquet"):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    for name in os.listdir(SNAPSHOT_DIR):
+        full = os.path.join(SNAPSHOT_DIR, name)
+        if name.startswith(f"{stem}-") and name.endswith(suffix) and full != keep:
+            try:
+                if os.path.isdir(full):
+                    shutil.rmtree(full)
+                else:
+                    os.remove(full)
+            except OSError:
+                pass
+
+
+def build_snapshot(path):
+    # Convert the workbook to Parquet (no-op if an up-to-date snapshot exists)
+    snap = snapshot_path(path)
+    if os.path.exists(snap):
+        return snap
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    df = normalize_frame(_arrow_safe(pd.read_excel(path)))
+
+    # write to a temp file and rename so concurrent workers never read a partial file
+    tmp = f"{snap}.{os.getpid()}.tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, snap)
+
+    _remove_stale_snapshots(path, keep=snap)
+    return snap
+
+
+def build_dataset(path):
+    # Write the snapshot as a hive-style dataset partitioned by
+    # indicator_name/dimension (no-op if an up-to-date one exists)
+    if path.lower().endswith(".csv"):
+        return ingest_csv(path)
+
+    root = dataset_path(path)
+    if os.path.exists(root):
+        return root
+
+    df = pd.read_parquet(build_snapshot(path))
+    tmp = f"{root}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    df.to_parquet(tmp, index=False, partition_cols=PARTITION_COLUMNS)
+    try:
+        os.rename(tmp, root)
+    except OSError:
+        # another worker finished first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    _remove_stale_snapshots(path, keep=root, suffix=".dataset")
+    return root
+
+
+def _as_list(value):
+    return [value] if isinstance(value, str) else list(value)
+
+
+def _matches(value, patterns):
+    return isinstance(value, str) and any(
+        fnmatch.fnmatchcase(value.lower(), p.lower()) for p in _as_list(patterns)
+    )
+
+
+def _clause_matches(clause, row):
+    return all(_matches(row[col], patterns) for col, patterns in clause.items())
+
+
+class _HashingReader(io.RawIOBase):
+    # File wrapper that hashes the bytes as they stream past
+    def __init__(self, f):
+        self.f = f
+        self.hash = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self.f.readinto(buffer)
+        self.hash.update(memoryview(buffer)[:n])
+        return n
+
+
+def ingest_csv(path, partitions=PAGE_PARTITIONS, block_size=64 << 20):
+    # Stream a WHO HIDR CSV export block by block into the partitioned
+    # dataset layout, keeping only rows in the pages' partitions. Peak memory
+    # is about one block plus one row group per open partition file.
+    # The content hash is taken in the same read as the rows, unless it is
+    # already known
+    stat = os.stat(path)
+    digest = _known_hash(path, stat)
+    if digest is not None and os.path.exists(dataset_path(path, partitions)):
+        return dataset_path(path, partitions)
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    tmp = os.path.join(SNAPSHOT_DIR, f"{stem}.{os.getpid()}.ingest.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    columns = EXPORT_TEXT_COLUMNS + EXPORT_NUMBER_COLUMNS
+    convert = pacsv.ConvertOptions(
+        column_types={**{c: pa.string() for c in EXPORT_TEXT_COLUMNS}, **{c: pa.float64() for c in EXPORT_NUMBER_COLUMNS}},
+        include_columns=columns,
+        include_missing_columns=True,
+    )
+    file_schema = pa.schema(
+        [(c, pa.string()) for c in EXPORT_TEXT_COLUMNS if c not in PARTITION_COLUMNS]
+        + [(c, pa.float32()) for c in EXPORT_NUMBER_COLUMNS]
+    )
+
+    keep = {}     # (indicator_name, dimension) -> bool, decided once per pair
+    writers = {}  # (indicator_name, dimension) -> open ParquetWriter
+    with open(path, "rb") as raw:
+        source = _HashingReader(raw) if digest is None else raw
+        reader = pacsv.open_csv(source, read_options=pacsv.ReadOptions(block_size=block_size), convert_options=convert)
+        try:
+            for batch in reader:
+                block = batch.to_pandas()
+                # rows without an indicator or dimension are never shown
+                block = block.dropna(subset=PARTITION_COLUMNS)
+
+                pairs = block[PARTITION_COLUMNS].drop_duplicates()
+                for pair in pairs.itertuples(index=False):
+                    if tuple(pair) not in keep:
+                        row = dict(zip(PARTITION_COLUMNS, pair))
+                        keep[tuple(pair)] = any(_clause_matches(c, row) for c in partitions)
+                kept = [pair for pair, ok in keep.items() if ok]
+                block = block[pd.MultiIndex.from_frame(block[PARTITION_COLUMNS]).isin(kept)]
+
+                for pair, part in block.groupby(PARTITION_COLUMNS, sort=False):
+                    if pair not in writers:
+                        folder = os.path.join(tmp, *[f"{c}={quote(v, safe='')}" for c, v in zip(PARTITION_COLUMNS, pair)])
+                        os.makedirs(folder)
+                        writers[pair] = pq.ParquetWriter(os.path.join(folder, "part-0.parquet"), file_schema)
+                    table = pa.Table.from_pandas(part.drop(columns=PARTITION_COLUMNS), preserve_index=False)
+                    writers[pair].write_table(table.cast(file_schema))
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+    if not writers:
+        # no row in the partitions: an empty file keeps the columns
+        empty_schema = pa.schema([(c, pa.string()) for c in PARTITION_COLUMNS] + list(file_schema))
+        pq.write_table(empty_schema.empty_table(), os.path.join(tmp, "part-0.parquet"))
+
+    # the content hash is only known once the whole export has been read
+    if digest is None:
+        _remember_hash(path, stat, source.hash.hexdigest())
+    root = dataset_path(path, partitions)
+    try:
+        os.rename(tmp, root)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.exists(root):
+            raise
+    _remove_stale_snapshots(path, keep=root, suffix=_dataset_suffix(partitions))
+    return root
+
+
+def partition_filter(dataset, partitions):
+    # partitions: list of clauses, each mapping a partition column to a
+    # pattern or list of patterns (fnmatch, e.g. "Population with electricity (%)*").
+    # A row is kept if it matches every column of at least one clause.
+    # (no dictionary when the dataset has no partition folders: nothing matched at ingest)
+    values = dict(zip(
+        dataset.partitioning.schema.names,
+        [d.to_pylist() if d is not None else [] for d in dataset.partitioning.dictionaries],
+    ))
+
+    expr = None
+    for clause in partitions:
+        clause_expr = None
+        for col, patterns in clause.items():
+            matched = [v for v in values.get(col, []) if _matches(v, patterns)]
+            col_expr = ds.field(col).isin(pa.array(matched, type=pa.string()))
+            clause_expr = col_expr if clause_expr is None else clause_expr & col_expr
+        if clause_expr is not None:
+            expr = clause_expr if expr is None else expr | clause_expr
+    return expr
+
+
+def load_workbook(path, partitions=None):
+    # Drop-in replacement for pd.read_excel(path) on the HIDR workbooks.
+    # With partitions, only the matching indicator_name/dimension partitions are read.
+    # A CSV export is always read through its ingested dataset.
+    # Indicator metadata (base name, sex, unit) is parsed once per distinct indicator.
+    if not partitions and not path.lower().endswith(".csv"):
+        return add_indicator_metadata(pd.read_parquet(build_snapshot(path)))
+
+    dataset = ds.dataset(
+        build_dataset(path),
+        format="parquet",
+        partitioning=ds.HivePartitioning.discover(infer_dictionary=True),
+    )
+    table = dataset.to_table(filter=partition_filter(dataset, partitions) if partitions else None)
+    df = normalize_frame(table.to_pandas())
+    for col in PARTITION_COLUMNS:
+        df[col] = df[col].cat.remove_unused_categories()
+    return add_indicator_metadata(df)
+
+
+def _shared_store_suffix(partitions):
+    return f"-{_partitions_tag(partitions)}.arrow"
+
+
+def shared_store_path(path, partitions=None):
+    return snapshot_path(path, suffix=_shared_store_suffix(partitions))
+
+
+def _to_arrow(df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # keep NaN as a float value rather than an Arrow null, so float columns
+    # have no validity bitmap and convert back to pandas without a copy
+    for i, name in enumerate(table.column_names):
+        if df[name].dtype in ("float32", "float64"):
+            table = table.set_column(i, name, pa.array(df[name].to_numpy()))
+    return table
+
+
+def write_ipc(df, path):
+    # Write a frame as an uncompressed Arrow IPC file (atomically)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    table = _to_arrow(df)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def read_ipc(path):
+    # Memory-map the IPC file read-only and build the DataFrame on top of the
+    # mapped buffers (numeric columns are zero-copy)
+    source = pa.memory_map(path, "r")
+    return pa.ipc.open_file(source).read_all().to_pandas(split_blocks=True)
+
+
+def build_shared_store(path, partitions=None):
+    # Write the (optionally partition-filtered) frame as an uncompressed Arrow IPC file
+    store = shared_store_path(path, partitions)
+    if os.path.exists(store):
+        return store
+
+    write_ipc(load_workbook(path, partitions), store)
+    _remove_stale_snapshots(path, keep=store, suffix=_shared_store_suffix(partitions))
+    return store
+
+
+def load_shared(path, partitions=None):
+    # Meant to be wrapped in st.cache_resource, which hands every session the
+    # same memory-mapped object.
+    # With HIDR_EXPORT set, every page reads its partitions from that export.
+    path = os.environ.get("HIDR_EXPORT") or path
+    return read_ipc(build_shared_store(path, partitions))
+
+
+def load_source(name):
+    # Frame behind a named dashboard data source (see SOURCES)
+    return load_shared(*SOURCES[name])
+
+
+def source_version(name):
+    # Identifies the data behind a source: changes whenever the workbook
+    # (or export), the partitions or the snapshot format change
+    path, partitions = SOURCES[name]
+    path = os.environ.get("HIDR_EXPORT") or path
+    return os.path.basename(shared_store_path(path, partitions))[:-len(".arrow")]
+
+
+if __name__ == "__main__":
+    # Ingest at deploy time: python data_store.py [--report] [workbook ...]
+    parser = argparse.ArgumentParser(description="Build Parquet snapshots and partitioned datasets")
+    parser.add_argument("workbooks", nargs="*", default=WORKBOOKS)
+    parser.add_argument("--report", action="store_true", help="print memory before/after normalization")
+    parser.add_argument("--csv", help="stream a full WHO HIDR CSV export into the partitioned store")
+    parser.add_argument("--block-size", type=int, default=64, help="CSV block size in MB (default: 64)")
+    args = parser.parse_args()
+
+    if args.csv:
+        print(f"{args.csv} -> {ingest_csv(args.csv, block_size=args.block_size << 20)}")
+        raise SystemExit
+
+    for workbook in args.workbooks:
+        if not os.path.exists(workbook):
+            print(f"{workbook}: not found, skipped")
+            continue
+        print(f"{workbook} -> {build_snapshot(workbook)}")
+        print(f"{workbook} -> {build_dataset(workbook)}")
+        if args.report:
+            # memory of the frame as pd.read_excel returns it vs the normalized one
+            print("  " + memory_report(workbook, pd.read_excel(workbook), load_workbook(workbook)))
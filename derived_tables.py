@@ -0,0 +1,350 @@
+import os
+
+import pandas as pd
+
+from asof import DateIndex
+from completeness import completeness_matrix, select, settings_with
+from data_store import SNAPSHOT_DIR, SOURCES, load_source, read_ipc, source_version, write_ipc
+from indicators import startswith_mask
+from taxonomy import assign_groups, lookup_table
+
+# Derived tables shared by every dashboard entry point.
+# Each table is built once per data version (see data_store.source_version),
+# written next to the snapshots as an Arrow IPC file that every worker
+# memory-maps, and memoized in-process. A widget interaction then only
+# slices an existing table instead of recomputing it on every rerun.
+#
+# Usage: get_table("income_recent")
+
+DERIVED_DIR = os.path.join(SNAPSHOT_DIR, "derived")
+
+# bump when a builder changes so tables built by the old code are rebuilt
+DERIVED_VERSION = 5
+
+# name -> (source, builder)
+_builders = {}
+
+# name -> (version, DataFrame)
+_tables = {}
+
+# name -> (version, DateIndex)
+_indexes = {}
+
+
+def derived(name, source):
+    # Register a builder for a derived table computed from a data source
+    def register(build):
+        _builders[name] = (source, build)
+        return build
+    return register
+
+
+def table_version(name):
+    source, _ = _builders[name]
+    return f"v{DERIVED_VERSION}-{source_version(source)}"
+
+
+def get_table(name):
+    version = table_version(name)
+    cached = _tables.get(name)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    path = os.path.join(DERIVED_DIR, f"{name}-{version}.arrow")
+    if not os.path.exists(path):
+        _, build = _builders[name]
+        write_ipc(build().reset_index(drop=True), path)
+        # finished tables of other versions only: another worker may be
+        # writing its own {path}.{pid}.tmp right now
+        for old in os.listdir(DERIVED_DIR):
+            if old.startswith(f"{name}-v") and old.endswith(".arrow") and old != os.path.basename(path):
+                try:
+                    os.remove(os.path.join(DERIVED_DIR, old))
+                except OSError:
+                    pass
+
+    df = read_ipc(path)
+    _tables[name] = (version, df)
+    return df
+
+
+def get_index(name):
+    # As-of DateIndex over a derived table, built once per table version
+    version = table_version(name)
+    cached = _indexes.get(name)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    index = DateIndex(get_table(name))
+    _indexes[name] = (version, index)
+    return index
+
+
+# -------------------------------------------------------------------------
+# Completeness matrices: "<source>_completeness" (see completeness.py)
+# -------------------------------------------------------------------------
+def _completeness_builder(source):
+    def build():
+        return completeness_matrix(load_source(source))
+    return build
+
+
+for _source in SOURCES:
+    derived(f"{_source}_completeness", source=_source)(_completeness_builder(_source))
+
+
+# -------------------------------------------------------------------------
+# Under-5 Mortality
+# -------------------------------------------------------------------------
+@derived("mortality_countries", source="mortality")
+def build_mortality_countries():
+    # Country selector options
+    return pd.DataFrame({"setting": settings_with(get_table("mortality_completeness"))})
+
+
+@derived("mortality_by_year", source="mortality")
+def build_mortality_by_year():
+    # One row per (setting, year): the Sex dimension repeats setting_average per subgroup
+    df = load_source("mortality")
+    df_all = df[df['dimension'] == 'Sex']
+    df_all = df_all.drop_duplicates(subset=['setting', 'date'])
+    return df_all[['setting', 'date', 'setting_average', 'whoreg6']]
+
+
+@derived("mortality_trend", source="mortality")
+def build_mortality_trend():
+    # Overall Trend background/foreground lines
+    return get_table("mortality_by_year")[['setting', 'date', 'setting_average']].rename(
+        columns={'setting_average': 'estimate'}
+    )
+
+
+# background band quantiles of the Overall Trend chart
+ENVELOPE_QUANTILES = {"p10": 0.1, "p25": 0.25, "median": 0.5, "p75": 0.75, "p90": 0.9}
+
+
+@derived("mortality_envelope", source="mortality")
+def build_mortality_envelope():
+    # Per-year quantiles of the country trend lines, over every country
+    # (scope "Global") and per WHO region: scope, date, p10 ... p90, n
+    df = get_table("mortality_by_year")
+    df = pd.concat([
+        df.assign(scope="Global"),
+        df[df["whoreg6"].notna()].assign(scope=lambda d: d["whoreg6"].astype(str)),
+    ])
+    grouped = df.groupby(["scope", "date"], observed=True)["setting_average"]
+
+    envelope = grouped.quantile(list(ENVELOPE_QUANTILES.values())).unstack().astype("float32")
+    envelope.columns = list(ENVELOPE_QUANTILES)
+    envelope["n"] = grouped.count()
+    return envelope.reset_index()
+
+
+@derived("mortality_heatmap", source="mortality")
+def build_mortality_heatmap():
+    return get_table("mortality_by_year").rename(columns={'setting_average': 'mortality_rate'})
+
+
+# -------------------------------------------------------------------------
+# Health Determinants
+# -------------------------------------------------------------------------
+@derived("health_determinants_countries", source="health_determinants")
+def build_health_determinants_countries():
+    # Which views each setting has data for: income (poorest quintile share),
+    # education (both sexes at the most recent date, needs income) and
+    # living (electricity access, needs education)
+    matrix = get_table("health_determinants_completeness")
+    income = settings_with(
+        matrix, dated=True,
+        indicator='Share of household income (%)', subgroup='Quintile 1 (poorest)'
+    )
+
+    df_education = select(matrix, indicator_prefix='People with no education (%)')
+    df_education = df_education[
+        df_education['setting'].isin(income) & df_education['last_year'].notna()
+    ]
+    latest = df_education.groupby('setting', observed=True)['last_year'].transform('max')
+    df_education = df_education[df_education['last_year'] == latest]
+    sex_counts = df_education.groupby(["setting", "indicator_sex"], observed=True).size().unstack(fill_value=0)
+    education = sex_counts[
+        (sex_counts.get("Male", 0) > 0) & (sex_counts.get("Female", 0) > 0)
+    ].index
+
+    living = settings_with(
+        matrix, dated=True,
+        indicator_prefix="Population with electricity (%)",
+        dimension=["Subnational region", "Place of residence"]
+    )
+
+    settings = pd.Series(sorted(matrix["setting"].unique()), name="setting")
+    return pd.DataFrame({
+        "setting": settings,
+        "income": settings.isin(income),
+        "education": settings.isin(education),
+        "living": settings.isin(education) & settings.isin(living),
+    })
+
+
+def health_determinants_countries(*views):
+    # Sorted settings that have data for all the given views
+    countries = get_table("health_determinants_countries")
+    mask = countries[list(views)].all(axis=1)
+    return countries.loc[mask, "setting"].tolist()
+
+
+@derived("income_history", source="health_determinants")
+def build_income_history():
+    # Income share of the poorest quintile, all years
+    df = load_source("health_determinants")
+    df_filtered = df[df['indicator_name'] == 'Share of household income (%)']
+    return df_filtered[df_filtered['subgroup'] == 'Quintile 1 (poorest)']
+
+
+@derived("income_recent", source="health_determinants")
+def build_income_recent():
+    # Income share of the poorest quintile, most recent year per country
+    df_recent_year = get_index("income_history").as_of().sort_values('setting', kind='stable')
+    return df_recent_year.drop_duplicates(subset=['setting'])
+
+
+@derived("education_history", source="health_determinants")
+def build_education_history():
+    # No-education shares by sex, all years, for countries with income data
+    df = load_source("health_determinants")
+    income_countries = health_determinants_countries("income")
+
+    df_education = df[
+        (df['setting'].isin(income_countries)) &
+        (startswith_mask(df['indicator_name'], 'People with no education (%)')) &
+        (df['date'].notna())
+    ]
+
+    # sex qualifier and name without it, parsed at ingest (see indicators.py)
+    return df_education.assign(
+        sex=df_education["indicator_sex"],
+        indicator_clean=df_education["indicator_base"],
+    )
+
+
+@derived("education_recent", source="health_determinants")
+def build_education_recent():
+    # No-education shares at the most recent date, for countries with income
+    # data and both Male and Female rows
+    df_education_recent = get_index("education_history").as_of()
+    valid_countries = health_determinants_countries("education")
+    return df_education_recent[df_education_recent["setting"].isin(valid_countries)]
+
+
+@derived("living_history", source="health_determinants")
+def build_living_history():
+    # Electricity access, all years, for countries in education_recent
+    df = load_source("health_determinants")
+    valid_settings = health_determinants_countries("education")
+
+    return df[
+        df["setting"].isin(valid_settings) &
+        startswith_mask(df["indicator_name"], "Population with electricity (%)") &
+        df["dimension"].isin(["Subnational region", "Place of residence"])
+    ]
+
+
+@derived("living_recent", source="health_determinants")
+def build_living_recent():
+    # Electricity access at the most recent date per country
+    return get_index("living_history").as_of()
+
+
+def health_determinants_years(setting):
+    # As-of slider options for a setting: the survey years of its education
+    # or its electricity data, ascending
+    years = set(get_index("education_history").years(setting))
+    years |= set(get_index("living_history").years(setting))
+    return sorted(years)
+
+
+def setting_as_of(name, setting, year):
+    # A history table with `setting` at its latest survey up to `year`, or at
+    # its earliest survey when it has none that early (other settings at
+    # their latest). Returns (rows, survey year shown for setting or None)
+    index = get_index(name)
+    years = index.years(setting)
+    if not years:
+        return index.as_of(), None
+    shown = max((y for y in years if y <= year), default=years[0])
+    return index.as_of(year={setting: shown}), shown
+
+
+def region_values(df_living):
+    # Subnational electricity access for the map: setting, iso3, region, value
+    df_regions = df_living[df_living["dimension"] == "Subnational region"]
+    return df_regions.rename(columns={
+        "subgroup": "region",
+        "estimate": "value"
+    })
+
+
+@derived("regions", source="health_determinants")
+def build_regions():
+    return region_values(get_table("living_recent"))
+
+
+@derived("region_history", source="health_determinants")
+def build_region_history():
+    # Subnational electricity access, every survey year (animated map)
+    return region_values(get_table("living_history"))
+
+
+# -------------------------------------------------------------------------
+# Vaccination Coverage
+# -------------------------------------------------------------------------
+VACCINATION_INDICATOR = "Full immunization coverage among one-year-olds (%)"
+VACCINATION_DIMENSIONS = ["Education (3 groups)", "Economic status (wealth decile)"]
+VACCINATION_GROUPINGS = ["wealth_decile_3", "education_3"]
+
+
+@derived("vaccination_countries", source="immunization")
+def build_vaccination_countries():
+    # Countries with no missing vaccination coverage and at least one
+    # subgroup in the display groupings
+    matrix = get_table("immunization_completeness")
+    complete = settings_with(
+        matrix, complete=True,
+        indicator=VACCINATION_INDICATOR, dimension=VACCINATION_DIMENSIONS
+    )
+    grouped = set(settings_with(
+        matrix,
+        indicator=VACCINATION_INDICATOR, dimension=VACCINATION_DIMENSIONS,
+        subgroup=lookup_table(VACCINATION_GROUPINGS)["subgroup"].tolist()
+    ))
+    return pd.DataFrame({"setting": [c for c in complete if c in grouped]})
+
+
+@derived("vaccination", source="immunization")
+def build_vaccination():
+    # Full immunization coverage by grouped economic/educational status
+    df = load_source("immunization")
+    valid_countries = get_table("vaccination_countries")["setting"]
+
+    # Filter for relevant indicators and dimensions, countries with no
+    # missing vaccination coverage
+    df = df[
+        (df['indicator_name'] == VACCINATION_INDICATOR) &
+        (df['dimension'].isin(VACCINATION_DIMENSIONS)) &
+        (df['setting'].isin(valid_countries))
+    ]
+
+    df = df[['setting', 'date', 'dimension', 'subgroup', 'estimate']].rename(
+        columns={'estimate': 'vaccination_coverage'}
+    )
+
+    # Map subgroups to grouped categories (see taxonomy.py)
+    df = assign_groups(df, VACCINATION_GROUPINGS)
+    return df.dropna(subset=['group'])
+
+
+@derived("vaccination_line_data", source="immunization")
+def build_vaccination_line_data():
+    # Aggregate line chart data to avoid duplicate points
+    return get_table("vaccination").groupby(
+        ['setting', 'date', 'dimension_type', 'group'], as_index=False, observed=True
+    )['vaccination_coverage'].mean()
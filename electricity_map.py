@@ -0,0 +1,284 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import streamlit as st
+
+from geo_store import boundaries_url, download_status, fit_zoom, is_ready, map_assets, mosaic_assets, mosaic_geojson
+from map_frames import frame_locations, frame_unmatched, frame_values, frame_years
+from region_match import confident_names, region_aliases
+
+# Subnational electricity-access maps shared by the dashboard pages.
+#
+#   plot_setting_map        one country, one value per region
+#   plot_setting_animation  one country, a frame per survey year
+#   plot_mosaic_map         every selected country on the merged layer
+#
+# Each returns a plotly figure (or None after showing why there is no map)
+# drawn over mapbox tiles, or with offline=True on a geo projection whose
+# base map comes from the app itself (see geo_store.py); chart_config()
+# is the matching st.plotly_chart config.
+#
+# Usage:
+#   fig = plot_setting_map("GHA", df_regions, title="Ghana", offline=offline_map)
+#   st.plotly_chart(fig, config=chart_config(offline_map))
+
+COLORBAR_TITLE = "% Population with Electricity"
+
+
+def chart_config(offline):
+    # st.plotly_chart config: plotly fetches the geo base map from
+    # topojsonURL, so the offline mode points it at ours
+    if not offline:
+        return {}
+    mosaic = mosaic_assets()
+    if mosaic and st.get_option("server.enableStaticServing"):
+        return {"topojsonURL": mosaic["basemap_url"]}
+    st.caption("The offline base map needs static file serving (server.enableStaticServing).")
+    return {}
+
+
+def fuzzy_merge_regions(df_setting, iso3):
+    # Match region names to GADM NAME_1 through the persistent alias table
+    # (see region_match.py); low-confidence matches, and weaker claims on a
+    # polygon another of these regions matched, are left unmatched
+    confident = confident_names(region_aliases(iso3, df_setting["region"]))
+
+    df_setting = df_setting.copy()
+    df_setting["matched_region"] = df_setting["region"].astype(object).map(confident)
+    return df_setting
+
+
+def choropleth(df, geojson, locations, featureidkey, center, zoom, base, hover_data, offline=False):
+    # Choropleth of df["value"] by region: over mapbox tiles, or offline on
+    # a geo projection whose base layer (country outlines, and the regions
+    # in base without a value in grey) comes from the local store
+    if not offline:
+        return px.choropleth_mapbox(
+            df,
+            geojson=geojson,
+            locations=locations,
+            featureidkey=featureidkey,
+            color="value",
+            color_continuous_scale="RdBu_r",
+            hover_name="region",
+            hover_data=hover_data,
+            mapbox_style="carto-positron",
+            center=center,
+            zoom=zoom,
+            opacity=0.8,
+        )
+
+    fig = px.choropleth(
+        df,
+        geojson=geojson,
+        locations=locations,
+        featureidkey=featureidkey,
+        color="value",
+        color_continuous_scale="RdBu_r",
+        hover_name="region",
+        hover_data=hover_data,
+    )
+
+    missing = sorted(set(base) - set(df[locations]))
+    if missing:
+        base_geojson = geojson
+        if isinstance(geojson, dict):
+            # only the features not already drawn, so the geometry is sent once
+            def feature_id(feature):
+                for part in featureidkey.split("."):
+                    feature = feature.get(part) or {}
+                return feature
+
+            base_geojson = {"type": "FeatureCollection", "features": [
+                f for f in geojson["features"] if feature_id(f) in missing
+            ]}
+        fig.add_trace(go.Choropleth(
+            geojson=base_geojson,
+            locations=missing,
+            featureidkey=featureidkey,
+            z=[0] * len(missing),
+            colorscale=[[0, "#eeeeee"], [1, "#eeeeee"]],
+            showscale=False,
+            hoverinfo="skip",
+        ))
+        fig.data = fig.data[::-1]
+
+    fig.update_geos(
+        fitbounds="locations",
+        projection_type="mercator",
+        showcountries=True,
+        countrycolor="#999999",
+        showland=False,
+        showocean=False,
+        showlakes=False,
+        showcoastlines=False,
+        showframe=False,
+    )
+    return fig
+
+
+def _country_geojson(iso3, assets):
+    # the bundle file by URL when it is served (the browser fetches it once);
+    # otherwise the GeoJSON goes into the figure
+    if st.get_option("server.enableStaticServing"):
+        return boundaries_url(iso3, assets["zoom"]) or assets["geojson"]
+    return assets["geojson"]
+
+
+def plot_setting_map(iso3, df_regions, title, offline=False):
+    # One country's regions (df_regions: setting, iso3, region, value)
+    df_setting = df_regions[df_regions["iso3"] == iso3]
+
+    if df_setting.empty:
+        st.error(f"No rows found for ISO3 code: {iso3}")
+        return None
+
+    if not is_ready(iso3):
+        if download_status(iso3) == "unavailable":
+            st.info("Map boundaries for this country are not available.")
+        else:
+            st.info("Map boundaries for this country are still downloading. Please check back in a moment.")
+        return None
+
+    # GeoJSON simplified for the map zoom, region names, centroid and a zoom
+    # that fits the country, cached per country (see geo_store.py)
+    assets = map_assets(iso3)
+
+    df_setting = fuzzy_merge_regions(df_setting, iso3)
+    unmatched = df_setting.loc[df_setting["matched_region"].isna(), "region"].tolist()
+    if unmatched:
+        st.caption("Not shown on the map (no confident boundary match): " + ", ".join(unmatched))
+    df_setting = df_setting.dropna(subset=["matched_region"])
+
+    fig = choropleth(
+        df_setting, _country_geojson(iso3, assets), "matched_region", "properties.NAME_1",
+        center=assets["center"], zoom=assets["zoom"], base=assets["names"],
+        hover_data={"value": ":.1f"}, offline=offline,
+    )
+    fig.update_coloraxes(colorbar_title=COLORBAR_TITLE)
+    fig.update_layout(
+        margin=dict(l=0, r=0, t=40, b=0),
+        height=600,
+        title=title
+    )
+    return fig
+
+
+def plot_mosaic_map(iso3s, df_regions, offline=False):
+    # Every selected country on one map from the merged layer (see
+    # geo_store.py): the figure references the layer by URL, so only the
+    # region values change between reruns. Latest value per region (the
+    # as-of year is per country)
+    mosaic = mosaic_assets()
+    if mosaic is None:
+        st.info("Map boundaries are still downloading. Please check back in a moment.")
+        return None
+
+    shown = [iso3 for iso3 in iso3s if iso3 in mosaic["bounds"]]
+    missing = [iso3 for iso3 in iso3s if iso3 not in mosaic["bounds"]]
+    unavailable = [iso3 for iso3 in missing if download_status(iso3) == "unavailable"]
+    downloading = [iso3 for iso3 in missing if iso3 not in unavailable]
+    if downloading:
+        st.caption("Boundaries still downloading for: " + ", ".join(downloading))
+    if unavailable:
+        st.caption("Boundaries not available for: " + ", ".join(unavailable))
+    if not shown:
+        return None
+
+    df_map = pd.concat(
+        [fuzzy_merge_regions(df_regions[df_regions["iso3"] == iso3], iso3) for iso3 in shown]
+    ).dropna(subset=["matched_region"])
+    df_map["location"] = df_map["iso3"].astype(str) + "/" + df_map["matched_region"]
+
+    # fit the union of the selected countries
+    boxes = [mosaic["bounds"][iso3] for iso3 in shown]
+    bounds = [
+        min(b[0] for b in boxes), min(b[1] for b in boxes),
+        max(b[2] for b in boxes), max(b[3] for b in boxes),
+    ]
+
+    # static file URL (fetched once by the browser) unless static serving is off
+    if st.get_option("server.enableStaticServing"):
+        geojson = mosaic["url"]
+    else:
+        geojson = mosaic_geojson()
+
+    fig = choropleth(
+        df_map, geojson, "location", "id",
+        center={"lat": (bounds[1] + bounds[3]) / 2, "lon": (bounds[0] + bounds[2]) / 2},
+        zoom=fit_zoom(bounds),
+        base=[f"{iso3}/{name}" for iso3 in shown for name in mosaic["names"][iso3]],
+        hover_data={"setting": True, "value": ":.1f", "location": False},
+        offline=offline,
+    )
+    fig.update_coloraxes(colorbar_title=COLORBAR_TITLE)
+    fig.update_layout(
+        margin=dict(l=0, r=0, t=40, b=0),
+        height=600,
+        title="Population with electricity (%) across selected countries",
+    )
+    return fig
+
+
+def plot_setting_animation(iso3, country, df_regions, offline=False):
+    # Every survey year of one country: the figure carries the geometry
+    # once and each frame only that year's values (see map_frames.py).
+    # Falls back to the static map of df_regions without survey years
+    years = frame_years(iso3)
+    if not is_ready(iso3) or not years:
+        return plot_setting_map(iso3, df_regions, f"{country} — Population with electricity (%)", offline)
+
+    locations, regions = frame_locations(iso3)
+    unmatched = frame_unmatched(iso3)
+    if unmatched:
+        st.caption("Not shown on the map (no confident boundary match): " + ", ".join(unmatched))
+    frames = {year: frame_values(iso3, year) for year in years}
+    values = np.concatenate(list(frames.values()))
+    if not np.isfinite(values).any():
+        return None
+
+    assets = map_assets(iso3)
+
+    df_frame = pd.DataFrame({"matched_region": locations, "region": regions, "value": frames[years[-1]]})
+    fig = choropleth(
+        df_frame, _country_geojson(iso3, assets), "matched_region", "properties.NAME_1",
+        center=assets["center"], zoom=assets["zoom"], base=assets["names"],
+        hover_data={"value": ":.1f"}, offline=offline,
+    )
+
+    # one color scale for every year; frames restyle the values trace only
+    fig.update_coloraxes(cmin=np.nanmin(values), cmax=np.nanmax(values),
+                         colorbar_title=COLORBAR_TITLE)
+    trace = len(fig.data) - 1
+    fig.frames = [
+        go.Frame(name=str(year), data=[{"type": fig.data[trace].type, "z": frames[year]}], traces=[trace])
+        for year in years
+    ]
+
+    step = {"frame": {"duration": 800, "redraw": True}, "transition": {"duration": 0}}
+    fig.update_layout(
+        margin=dict(l=0, r=0, t=40, b=0),
+        height=600,
+        title=f"{country} — Population with electricity (%) by survey year",
+        sliders=[{
+            "active": len(years) - 1,
+            "currentvalue": {"prefix": "Survey year: "},
+            "steps": [
+                {"label": str(year), "method": "animate",
+                 "args": [[str(year)], {**step, "mode": "immediate"}]}
+                for year in years
+            ],
+        }],
+        updatemenus=[{
+            "type": "buttons",
+            "showactive": False,
+            "x": 0, "y": 0, "xanchor": "left", "yanchor": "top",
+            "buttons": [
+                {"label": "Play", "method": "animate", "args": [[str(y) for y in years], step]},
+                {"label": "Pause", "method": "animate",
+                 "args": [[None], {"frame": {"duration": 0, "redraw": False}, "mode": "immediate"}]},
+            ],
+        }],
+    )
+    return fig
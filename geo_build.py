@@ -0,0 +1,364 @@
+import argparse
+import glob
+import gzip
+import hashlib
+import math
+import os
+import shutil
+
+import brotli
+import numpy as np
+import shapely
+
+from geo_store import (
+    BUNDLE_DIR, BUNDLE_VERSION, GADM_DIR, GEO_DIR, LEVEL_ZOOMS, MAX_ZOOM,
+    MOSAIC_ZOOM, STATIC_DIR, _is_current, _write_bytes, _write_json,
+    assets_path, dump_json, fit_zoom, gadm_countries, level_for_zoom,
+    level_path, mosaic_path, pixel, prefetch, prepare, raw_path, read_json,
+    sha256_file,
+)
+
+# Offline preprocessing for geo_store, on shapely alone: GADM files are
+# GeoJSON, read with geo_store.read_json, so the Streamlit server never
+# imports geopandas/fiona/pyproj, even when geo_store builds on a cache miss.
+#
+# build_levels() writes several simplified copies of a GADM admin-1 file,
+# one per zoom level in LEVEL_ZOOMS:
+# - regions are simplified together as a coverage, so a border shared by
+#   two regions is simplified once and stays shared (no gaps or slivers)
+# - islands smaller than a pixel are dropped
+# - coordinates are snapped to a grid and written with a matching number of
+#   decimals, so the JSON text stays short
+# build_assets() writes the map metadata (centroid, bounds, zoom, level,
+# region names) computed from the full resolution boundaries.
+# build_mosaic() merges every country's MOSAIC_ZOOM level into the
+# multi-country layer and publishes it under STATIC_DIR, along with the
+# country outlines as a TopoJSON base map for the offline (no tiles) map.
+# build_bundle() writes the precompressed, content-addressed deploy bundle
+# read by geo_store.read_bundle().
+#
+# geo_store calls these on a cache miss; a deploy runs this script first so
+# the server starts with everything built:
+# Usage: python geo_build.py [ISO3 ...]     (prebuild levels and assets, print sizes)
+#        python geo_build.py --prefetch     (first download every mapped country)
+#        python geo_build.py --bundle       (then write the deploy bundle)
+
+# simplification tolerance in screen pixels at the level's zoom (the
+# Visvalingam-Whyatt area threshold used by coverage_simplify is its square)
+TOLERANCE_PX = 2
+
+# feature properties kept in simplified levels (region names and codes)
+PROPERTIES = ["GID_1", "NAME_1", "VARNAME_1", "HASC_1"]
+
+
+def tolerance(zoom):
+    return TOLERANCE_PX * pixel(zoom)
+
+
+def grid_digits(zoom):
+    # decimals of the quantization grid: half a pixel or finer
+    return math.ceil(-math.log10(pixel(zoom) / 2))
+
+
+def _drop_specks(geom, min_area):
+    # Drop polygon parts (small islands) below min_area, keeping the largest
+    if geom is None or geom.geom_type != "MultiPolygon":
+        return geom
+    parts = sorted(geom.geoms, key=lambda p: p.area, reverse=True)
+    return shapely.MultiPolygon([parts[0]] + [p for p in parts[1:] if p.area >= min_area])
+
+
+def _simplify(geoms, zoom):
+    try:
+        return shapely.coverage_simplify(geoms, tolerance(zoom))
+    except shapely.errors.GEOSException:
+        # not a clean coverage (overlapping regions): simplify each on its own
+        return shapely.simplify(geoms, tolerance(zoom), preserve_topology=True)
+
+
+def _quantize(coords, digits):
+    if isinstance(coords[0], (int, float)):
+        return [round(c, digits) for c in coords]
+    return [_quantize(c, digits) for c in coords]
+
+
+def read_layer(path):
+    # Properties and shapely geometries (None where missing) of the features
+    # in a GeoJSON file
+    features = read_json(path)["features"]
+    props = [feature.get("properties") or {} for feature in features]
+    geoms = np.array([
+        shapely.geometry.shape(feature["geometry"]) if feature.get("geometry") else None
+        for feature in features
+    ], dtype=object)
+    return props, geoms
+
+
+def simplified_geojson(props, geoms, zoom):
+    # FeatureCollection of the features simplified for this zoom level
+    digits = grid_digits(zoom)
+    geoms = [_drop_specks(g, pixel(zoom) ** 2) for g in geoms]
+    geoms = shapely.set_precision(_simplify(geoms, zoom), 10 ** -digits)
+    return _feature_collection(props, geoms, digits)
+
+
+def quantized_geojson(props, geoms, zoom=MAX_ZOOM):
+    # FeatureCollection of the features at full resolution, snapped to the
+    # grid of this zoom level (the most detailed the map shows)
+    digits = grid_digits(zoom)
+    geoms = shapely.set_precision(geoms, 10 ** -digits)
+    return _feature_collection(props, geoms, digits)
+
+
+def _feature_collection(props, geoms, digits):
+    columns = [c for c in PROPERTIES if any(c in p for p in props)]
+    features = []
+    for p, geom in zip(props, geoms):
+        if geom is None or geom.is_empty:
+            continue
+        geometry = shapely.geometry.mapping(geom)
+        features.append({
+            "type": "Feature",
+            "properties": {c: p.get(c) for c in columns},
+            "geometry": {
+                "type": geometry["type"],
+                "coordinates": _quantize(geometry["coordinates"], digits),
+            },
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def build_levels(iso3):
+    # Write every simplified level for a country; returns their paths
+    source = raw_path(iso3)
+    props, geoms = read_layer(source)
+
+    paths = []
+    for zoom in LEVEL_ZOOMS:
+        path = level_path(iso3, zoom)
+        if not _is_current(path, source):
+            _write_json(simplified_geojson(props, geoms, zoom), path)
+        paths.append(path)
+
+    for old in glob.glob(os.path.join(GEO_DIR, f"{iso3.upper()}_adm1-v*.json")):
+        if old not in paths and old != assets_path(iso3):
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return paths
+
+
+def build_assets(iso3):
+    # Write a country's map metadata (centroid, bounds, zoom, level, region
+    # names) computed from the full resolution boundaries; returns it
+    props, geoms = read_layer(raw_path(iso3))
+    centroid = shapely.union_all(geoms).centroid
+    bounds = [float(b) for b in shapely.total_bounds(geoms)]
+    zoom = fit_zoom(bounds)
+
+    meta = {
+        "center": {"lat": centroid.y, "lon": centroid.x},
+        "bounds": bounds,
+        "zoom": zoom,
+        "level": level_for_zoom(zoom),
+        "names": [p.get("NAME_1") for p in props],
+    }
+    _write_json(meta, assets_path(iso3))
+    return meta
+
+
+def topology(name, geoms):
+    # TopoJSON with one GeometryCollection of {id: polygon geometry}, each
+    # ring its own arc (no shared arcs, no quantization)
+    arcs = []
+
+    def rings(polygon):
+        for ring in polygon:
+            arcs.append(ring)
+        return [[i] for i in range(len(arcs) - len(polygon), len(arcs))]
+
+    geometries = []
+    for id, geom in geoms.items():
+        geometry = shapely.geometry.mapping(geom)
+        coords = _quantize(geometry["coordinates"], grid_digits(MOSAIC_ZOOM))
+        if geometry["type"] == "Polygon":
+            geometries.append({"type": "Polygon", "id": id, "arcs": rings(coords)})
+        elif geometry["type"] == "MultiPolygon":
+            geometries.append({"type": "MultiPolygon", "id": id, "arcs": [rings(p) for p in coords]})
+    return {
+        "type": "Topology",
+        "objects": {name: {"type": "GeometryCollection", "geometries": geometries}},
+        "arcs": arcs,
+    }
+
+
+def _publish(data, name, pattern):
+    # Write data (and its compressed variants, for a web server in front of
+    # Streamlit) to STATIC_DIR under name and remove older files matching
+    # pattern; returns the path relative to STATIC_DIR
+    path = os.path.join(STATIC_DIR, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_bytes(gzip.compress(data, 9, mtime=0), path + ".gz")
+    _write_bytes(brotli.compress(data, quality=11), path + ".br")
+    _write_bytes(data, path)
+    for old in glob.glob(os.path.join(STATIC_DIR, pattern)):
+        if old.startswith(path) or path.startswith(old + os.sep):
+            continue
+        if os.path.isdir(old):
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return name
+
+
+def build_mosaic():
+    # Merge every country's MOSAIC_ZOOM level into one FeatureCollection
+    # (feature id "ISO3/NAME_1"), write it to STATIC_DIR/geo under a content
+    # hash and its metadata to mosaic_path(); returns the metadata
+    countries = gadm_countries()
+    features = []
+    outlines = {}
+    bounds = {}
+    zooms = {}
+    names = {}
+    mtime = 0
+    for iso3 in countries:
+        mtime = max(mtime, os.path.getmtime(raw_path(iso3)))
+        try:
+            path = level_path(iso3, MOSAIC_ZOOM)
+            if not _is_current(path, raw_path(iso3)):
+                build_levels(iso3)
+            if _is_current(assets_path(iso3), raw_path(iso3)):
+                meta = read_json(assets_path(iso3))
+            else:
+                meta = build_assets(iso3)
+            layer = read_json(path)
+        except Exception:
+            continue  # a bad file only leaves that country off the map
+        for feature in layer["features"]:
+            props = feature["properties"]
+            features.append({
+                "type": "Feature",
+                "id": f"{iso3}/{props.get('NAME_1')}",
+                "properties": {"iso3": iso3, "NAME_1": props.get("NAME_1")},
+                "geometry": feature["geometry"],
+            })
+        outlines[iso3] = shapely.set_precision(
+            shapely.union_all([shapely.geometry.shape(f["geometry"]) for f in layer["features"]]),
+            10 ** -grid_digits(MOSAIC_ZOOM),
+        )
+        bounds[iso3] = meta["bounds"]
+        zooms[iso3] = meta["zoom"]
+        names[iso3] = meta["names"]
+
+    data = dump_json({"type": "FeatureCollection", "features": features})
+    file = _publish(data, f"geo/mosaic-{hashlib.sha1(data).hexdigest()[:12]}.json", "geo/mosaic-*")
+
+    # country outlines under the name plotly's geo maps fetch for their base
+    # layers (scope "world", resolution 110), in a content-hashed directory
+    data = dump_json(topology("countries", outlines))
+    basemap = _publish(data, f"geo/base-{hashlib.sha1(data).hexdigest()[:12]}/world_110m.json", "geo/base-*")
+
+    meta = {
+        "file": file, "basemap": os.path.dirname(basemap), "countries": countries,
+        "mtime": mtime, "bounds": bounds, "zoom": zooms, "names": names,
+    }
+    _write_json(meta, mosaic_path())
+    return meta
+
+
+def _bundle_file(out_dir, name, data):
+    # Write data as {name}.{hash}.json with its compressed variants (once per
+    # content); returns its manifest item
+    digest = hashlib.sha256(data).hexdigest()
+    file = f"{name}.{digest[:16]}.json"
+    path = os.path.join(out_dir, file)
+    if not os.path.exists(path):
+        _write_bytes(gzip.compress(data, 9, mtime=0), path + ".gz")
+        _write_bytes(brotli.compress(data, quality=11), path + ".br")
+        _write_bytes(data, path)
+    return {"file": file, "sha256": digest, "size": len(data)}
+
+
+def build_bundle(out_dir=BUNDLE_DIR):
+    # Write the deploy bundle of every country in geo_gadm to out_dir (see
+    # geo_store.read_bundle) and remove files no longer listed; returns the
+    # manifest
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {"version": BUNDLE_VERSION, "countries": {}}
+    for iso3 in gadm_countries():
+        prepare(iso3)
+        full = quantized_geojson(*read_layer(raw_path(iso3)))
+        files = {"full": _bundle_file(out_dir, f"{iso3}.full", dump_json(full))}
+        for zoom in LEVEL_ZOOMS:
+            with open(level_path(iso3, zoom), "rb") as f:
+                files[f"z{zoom}"] = _bundle_file(out_dir, f"{iso3}.z{zoom}", f.read())
+        files["assets"] = _bundle_file(out_dir, f"{iso3}.assets", dump_json(read_json(assets_path(iso3))))
+        manifest["countries"][iso3] = {"source_sha256": sha256_file(raw_path(iso3)), "files": files}
+
+    _write_json(manifest, os.path.join(out_dir, "manifest.json"))
+
+    listed = {"manifest.json"} | {
+        item["file"] + ext
+        for entry in manifest["countries"].values()
+        for item in entry["files"].values()
+        for ext in ("", ".gz", ".br")
+    }
+    for name in os.listdir(out_dir):
+        if name not in listed and not name.endswith(".tmp"):
+            os.remove(os.path.join(out_dir, name))
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build simplified GADM boundary levels and map assets.")
+    parser.add_argument("countries", nargs="*",
+                        help="ISO3 codes (default: every file in geo_gadm, or with "
+                             "--prefetch every country on the electricity map)")
+    parser.add_argument("--prefetch", action="store_true",
+                        help="download missing GADM files first")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="concurrent downloads for --prefetch")
+    parser.add_argument("--bundle", action="store_true",
+                        help=f"write the deploy bundle of every country to {BUNDLE_DIR}")
+    args = parser.parse_args()
+
+    countries = args.countries
+    if args.prefetch:
+        if not countries:
+            from derived_tables import get_table
+            countries = get_table("regions")["iso3"].dropna().unique()
+        paths = prefetch(countries, workers=args.workers)
+        countries = sorted(iso3 for iso3, path in paths.items() if path)
+        for iso3 in sorted(iso3 for iso3, path in paths.items() if not path):
+            print(f"{iso3}: not available")
+
+    else:
+        countries = countries or sorted(
+            os.path.basename(p).split("_")[0] for p in glob.glob(os.path.join(GADM_DIR, "*_adm1.json"))
+        )
+    for iso3 in countries:
+        sizes = [os.path.getsize(p) // 1024 for p in build_levels(iso3)]
+        levels = ", ".join(f"z{z} {s} KB" for z, s in zip(LEVEL_ZOOMS, sizes))
+        zoom = build_assets(iso3)["zoom"]
+        print(f"{iso3}: full {os.path.getsize(raw_path(iso3)) // 1024} KB | {levels} | map zoom {zoom}")
+
+    mosaic = build_mosaic()
+    size = os.path.getsize(os.path.join(STATIC_DIR, mosaic["file"])) // 1024
+    print(f"mosaic: {len(mosaic['bounds'])} countries, {size} KB ({mosaic['file']})")
+
+    if args.bundle:
+        manifest = build_bundle()
+        sizes = {ext: 0 for ext in ("", ".gz", ".br")}
+        for entry in manifest["countries"].values():
+            for item in entry["files"].values():
+                for ext in sizes:
+                    path = os.path.join(BUNDLE_DIR, item["file"] + ext)
+                    sizes[ext] += os.path.getsize(path) if os.path.exists(path) else 0
+        raw = sum(os.path.getsize(raw_path(iso3)) for iso3 in manifest["countries"])
+        print(f"bundle: {len(manifest['countries'])} countries in {BUNDLE_DIR} | geo_gadm {raw // 1024} KB | "
+              + " | ".join(f"{ext or 'json'} {size // 1024} KB" for ext, size in sizes.items() if size))
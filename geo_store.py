@@ -0,0 +1,503 @@
+import gzip
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # plain json is slower but gives the same dicts
+    orjson = None
+    import json
+
+from data_store import SNAPSHOT_DIR
+
+# Boundary store for the subnational electricity map: the render-time side.
+# It serves GADM admin-1 files (geo_gadm/) through the simplified levels,
+# map assets, merged multi-country layer and deploy bundle that geo_build.py
+# writes ahead of a deploy; a cache miss builds them with geo_build (shapely
+# only). Missing GADM files are downloaded off the render path by
+# start_warmer(), retried with a growing delay.
+
+GADM_DIR = "geo_gadm"
+GEO_DIR = os.path.join(SNAPSHOT_DIR, "geo")
+
+# bump when simplification changes so levels built by the old code are rebuilt
+GEO_VERSION = 1
+
+# map zoom levels with a simplified copy; above the last one the full
+# resolution file is used
+LEVEL_ZOOMS = [2, 4, 6, 8]
+
+# map size the fitted zoom is computed for (plot_setting_map: wide layout, 600 px high)
+MAP_WIDTH = 900
+MAP_HEIGHT = 600
+MAX_ZOOM = 10
+
+# countries whose assets are kept in memory
+MAX_CACHED_ASSETS = 16
+
+# iso3 -> assets, least recently used first; shared by every session thread
+_assets = OrderedDict()
+_assets_lock = threading.Lock()
+
+# level of the merged multi-country layer (a continental view)
+MOSAIC_ZOOM = 4
+
+# Streamlit serves files under ./static at app/static/
+STATIC_DIR = "static"
+STATIC_URL = "app/static"
+
+BUNDLE_VERSION = 1
+BUNDLE_DIR = os.environ.get("HIDR_GEO_BUNDLE", os.path.join(STATIC_DIR, "geo", f"bundle-v{BUNDLE_VERSION}"))
+
+_manifest = None
+_source_hashes = {}
+
+# default map mode where there is no tile server (air-gapped machines)
+OFFLINE_MAP = os.environ.get("HIDR_OFFLINE_MAP", "") not in ("", "0")
+
+_mosaic = None
+_mosaic_lock = threading.Lock()
+
+# GADM 4.1 admin-1 GeoJSON; GADM_URL can point at a mirror or local stand-in
+GADM_URL = os.environ.get(
+    "GADM_URL", "https://geodata.ucdavis.edu/gadm/gadm4.1/json/gadm41_{iso3}_1.json"
+)
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_TIMEOUT = (5, 60)  # connect, read (seconds)
+DOWNLOAD_RETRIES = 3
+
+# warmer rounds per country, and seconds before the first retry (doubled
+# after each failed round)
+DOWNLOAD_ATTEMPTS = 5
+RETRY_BACKOFF = 30
+
+# iso3 -> (failed rounds, time of the next retry or None if given up)
+_failures = {}
+_failures_lock = threading.Lock()
+
+_warmer = None
+_warmer_lock = threading.Lock()
+
+
+def raw_path(iso3):
+    return os.path.join(GADM_DIR, f"{iso3.upper()}_adm1.json")
+
+
+def level_path(iso3, zoom):
+    return os.path.join(GEO_DIR, f"{iso3.upper()}_adm1-v{GEO_VERSION}-z{zoom}.json")
+
+
+def assets_path(iso3):
+    return os.path.join(GEO_DIR, f"{iso3.upper()}_adm1-v{GEO_VERSION}-assets.json")
+
+
+def mosaic_path():
+    return os.path.join(GEO_DIR, f"mosaic_adm1-v{GEO_VERSION}-z{MOSAIC_ZOOM}.json")
+
+
+def gadm_countries():
+    # ISO3 codes with a GADM file in geo_gadm
+    if not os.path.isdir(GADM_DIR):
+        return []
+    return sorted(f.split("_")[0] for f in os.listdir(GADM_DIR) if f.endswith("_adm1.json"))
+
+
+def pixel(zoom):
+    # one screen pixel at this zoom, in degrees (512 px web map tiles)
+    return 360 / (512 * 2 ** zoom)
+
+
+def level_for_zoom(zoom):
+    # Coarsest level at least as detailed as the map zoom (None: full resolution)
+    for level in LEVEL_ZOOMS:
+        if level >= zoom:
+            return level
+    return None
+
+
+def fit_zoom(bounds, width=MAP_WIDTH, height=MAP_HEIGHT, padding=0.9):
+    # Largest zoom (in quarter steps) at which bounds fit the map
+    min_lon, min_lat, max_lon, max_lat = bounds
+
+    def mercator(lat):
+        lat = max(min(lat, 85.0), -85.0)
+        return math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+
+    lon_span = max(max_lon - min_lon, 1e-6) / 360
+    lat_span = max(mercator(max_lat) - mercator(min_lat), 1e-6) / (2 * math.pi)
+    zoom = min(
+        math.log2(width * padding / (512 * lon_span)),
+        math.log2(height * padding / (512 * lat_span)),
+        MAX_ZOOM,
+    )
+    return max(math.floor(zoom * 4) / 4, 0)
+
+
+def read_json(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def dump_json(data):
+    return orjson.dumps(data) if orjson else json.dumps(data, separators=(",", ":")).encode()
+
+
+def _write_json(data, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    _write_bytes(dump_json(data), path)
+
+
+def _write_bytes(data, path):
+    # Write to a temporary file unique to this process and thread, then
+    # rename into place, so readers never see a partial file
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _is_current(path, source):
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source)
+
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def bundle_manifest():
+    # The bundle's manifest.json (reread when it changes); None without a bundle
+    global _manifest
+    path = os.path.join(BUNDLE_DIR, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    if _manifest is None or _manifest[0] != mtime:
+        _manifest = (mtime, read_json(path))
+    return _manifest[1]
+
+
+def _source_hash(iso3):
+    # sha256 of a country's GADM file, computed once per file version
+    source = raw_path(iso3)
+    key = (source, os.path.getmtime(source))
+    if key not in _source_hashes:
+        _source_hashes[key] = sha256_file(source)
+    return _source_hashes[key]
+
+
+def _bundle_item(iso3, kind):
+    # Manifest item of a country's bundle file ("full", "z{level}" or
+    # "assets") if it was built from the current GADM file
+    manifest = bundle_manifest()
+    entry = manifest and manifest["countries"].get(iso3.upper())
+    if not entry or kind not in entry["files"]:
+        return None
+    if entry["source_sha256"] != _source_hash(iso3):
+        return None
+    return entry["files"][kind]
+
+
+def _bundle_kind(zoom):
+    level = level_for_zoom(zoom)
+    return "full" if level is None else f"z{level}"
+
+
+def read_bundle(iso3, kind):
+    # JSON dict of a country's bundle file; None if the bundle has no file
+    # built from the current GADM file, or the file does not match its sha256
+    item = _bundle_item(iso3, kind)
+    if item is None:
+        return None
+
+    # the plain file reads faster; a deploy may ship only the .gz variants
+    path = os.path.join(BUNDLE_DIR, item["file"])
+    try:
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+        else:
+            with open(path + ".gz", "rb") as f:
+                data = gzip.decompress(f.read())
+    except (OSError, EOFError, gzip.BadGzipFile):
+        return None
+    if hashlib.sha256(data).hexdigest() != item["sha256"]:
+        return None
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def boundaries_url(iso3, zoom):
+    # Static URL of the bundle file load_boundaries(iso3, zoom) would read;
+    # None if it is not in a current bundle under STATIC_DIR
+    item = _bundle_item(iso3, _bundle_kind(zoom))
+    if item is None:
+        return None
+    path = os.path.relpath(os.path.join(BUNDLE_DIR, item["file"]), STATIC_DIR)
+    if path.startswith(".."):
+        return None
+    return f"{STATIC_URL}/{path.replace(os.sep, '/')}"
+
+
+def load_boundaries(iso3, zoom):
+    # GeoJSON dict of a country's admin-1 regions at the level for this zoom
+    # (see level_for_zoom); None if the GADM file is not available
+    source = raw_path(iso3)
+    if not os.path.exists(source):
+        return None
+
+    bundled = read_bundle(iso3, _bundle_kind(zoom))
+    if bundled is not None:
+        return bundled
+
+    level = level_for_zoom(zoom)
+    if level is None:
+        path = source
+    else:
+        path = level_path(iso3, level)
+        if not _is_current(path, source):
+            from geo_build import build_levels
+            build_levels(iso3)
+
+    return read_json(path)
+
+
+def map_assets(iso3):
+    # Ready-to-plot map assets for a country (see geo_build.build_assets), with the
+    # GeoJSON dict under "geojson"; None if the GADM file is not available
+    iso3 = iso3.upper()
+    source = raw_path(iso3)
+    if not os.path.exists(source):
+        return None
+
+    mtime = os.path.getmtime(source)
+    with _assets_lock:
+        cached = _assets.get(iso3)
+        if cached and cached["mtime"] == mtime:
+            _assets.move_to_end(iso3)
+            return cached
+
+    assets = read_bundle(iso3, "assets")
+    if assets is None:
+        if _is_current(assets_path(iso3), source):
+            assets = read_json(assets_path(iso3))
+        else:
+            from geo_build import build_assets
+            assets = build_assets(iso3)
+
+    assets["geojson"] = load_boundaries(iso3, assets["zoom"])
+    assets["mtime"] = mtime
+
+    # built outside the lock: two sessions may build the same country, the
+    # last one is kept
+    with _assets_lock:
+        _assets[iso3] = assets
+        while len(_assets) > MAX_CACHED_ASSETS:
+            _assets.popitem(last=False)
+    return assets
+
+
+def _mosaic_is_current(meta):
+    # Built from the GADM files now in geo_gadm, none of them newer
+    countries = gadm_countries()
+    return (
+        meta["countries"] == countries
+        and os.path.exists(os.path.join(STATIC_DIR, meta["file"]))
+        and "basemap" in meta
+        and os.path.isdir(os.path.join(STATIC_DIR, meta["basemap"]))
+        and all(os.path.getmtime(raw_path(iso3)) <= meta["mtime"] for iso3 in countries)
+    )
+
+
+def mosaic_assets():
+    # Merged layer of every country in geo_gadm (see geo_build.build_mosaic):
+    # "url" of the static GeoJSON file, "basemap_url" of the offline base
+    # map, "bounds", "zoom" and region "names" per country and "countries";
+    # None if no country has boundaries yet
+    global _mosaic
+    with _mosaic_lock:
+        if _mosaic is None or not _mosaic_is_current(_mosaic):
+            meta = read_json(mosaic_path()) if os.path.exists(mosaic_path()) else None
+            if meta is None or not _mosaic_is_current(meta):
+                if not gadm_countries():
+                    return None
+                from geo_build import build_mosaic
+                meta = build_mosaic()
+            meta["url"] = f"{STATIC_URL}/{meta['file']}"
+            meta["basemap_url"] = f"{STATIC_URL}/{meta['basemap']}/"
+            _mosaic = meta
+        return _mosaic
+
+
+def mosaic_geojson():
+    # The merged layer as a GeoJSON dict, for when static serving is off
+    mosaic = mosaic_assets()
+    if mosaic is None:
+        return None
+    if "geojson" not in mosaic:
+        mosaic["geojson"] = read_json(os.path.join(STATIC_DIR, mosaic["file"]))
+    return mosaic["geojson"]
+
+
+def prepare(iso3):
+    # Build a country's simplified levels and assets on disk if missing or stale
+    source = raw_path(iso3)
+    paths = [assets_path(iso3)] + [level_path(iso3, zoom) for zoom in LEVEL_ZOOMS]
+    if not all(_is_current(path, source) for path in paths):
+        from geo_build import build_assets, build_levels
+        build_levels(iso3)
+        build_assets(iso3)
+
+
+def download_session(workers=DOWNLOAD_WORKERS, retries=DOWNLOAD_RETRIES):
+    # Session with a connection pool per worker and retries with backoff on
+    # connection errors and transient HTTP statuses
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+    )
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=retry))
+    session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=retry))
+    return session
+
+
+def _record_failure(iso3, permanent=False):
+    with _failures_lock:
+        attempts = _failures.get(iso3, (0, None))[0] + 1
+        if permanent or attempts >= DOWNLOAD_ATTEMPTS:
+            _failures[iso3] = (attempts, None)
+        else:
+            _failures[iso3] = (attempts, time.monotonic() + RETRY_BACKOFF * 2 ** (attempts - 1))
+
+
+def download_gadm(iso3, session=None, timeout=DOWNLOAD_TIMEOUT):
+    # Download a country's GADM admin-1 file into geo_gadm unless present;
+    # returns its path, or None if it is not available (recorded for
+    # download_status and the warmer's retries)
+    iso3 = iso3.upper()
+    path = raw_path(iso3)
+    if os.path.exists(path):
+        return path
+
+    session = session or download_session(workers=1)
+    try:
+        r = session.get(GADM_URL.format(iso3=iso3), timeout=timeout)
+    except requests.RequestException:
+        _record_failure(iso3)
+        return None
+    if r.status_code != 200:
+        # client errors other than throttling will not go away on a retry
+        _record_failure(iso3, permanent=400 <= r.status_code < 500 and r.status_code not in (408, 429))
+        return None
+
+    # only keep a complete, parseable file
+    try:
+        orjson.loads(r.content) if orjson else json.loads(r.content)
+    except ValueError:
+        _record_failure(iso3)
+        return None
+
+    os.makedirs(GADM_DIR, exist_ok=True)
+    _write_bytes(r.content, path)
+    with _failures_lock:
+        _failures.pop(iso3, None)
+    return path
+
+
+def prefetch(iso3s, workers=DOWNLOAD_WORKERS):
+    # Download every missing country concurrently; returns iso3 -> path (or None)
+    iso3s = sorted({iso3.upper() for iso3 in iso3s if isinstance(iso3, str)})
+    missing = [iso3 for iso3 in iso3s if not os.path.exists(raw_path(iso3))]
+
+    paths = {iso3: raw_path(iso3) for iso3 in iso3s if iso3 not in missing}
+    if missing:
+        session = download_session(workers)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for iso3, path in zip(missing, pool.map(lambda c: download_gadm(c, session), missing)):
+                paths[iso3] = path
+    return paths
+
+
+def warm(iso3s, workers=DOWNLOAD_WORKERS):
+    # Download missing countries, then build their levels and assets, then
+    # the merged layer
+    for iso3, path in prefetch(iso3s, workers).items():
+        if path:
+            try:
+                prepare(iso3)
+            except Exception:
+                pass  # a bad file only affects that country's map
+    try:
+        mosaic_assets()
+    except Exception:
+        pass
+
+
+def retries_due():
+    # (countries whose failed download is due for a retry, seconds until the
+    # next pending retry or None if there is none)
+    now = time.monotonic()
+    with _failures_lock:
+        pending = [(iso3, at) for iso3, (_, at) in _failures.items() if at is not None]
+    due = sorted(iso3 for iso3, at in pending if at <= now)
+    later = [at - now for _, at in pending if at > now]
+    return due, (min(later) if later else None)
+
+
+def _warm_and_retry(iso3s):
+    # warm(), then retry failed downloads as they come due until each one
+    # succeeds or is given up
+    warm(iso3s)
+    while True:
+        due, wait = retries_due()
+        if due:
+            warm(due)
+        elif wait is None:
+            return
+        else:
+            time.sleep(wait)
+
+
+def start_warmer(iso3s):
+    # Run warm() in a background thread, once per process; the thread stays
+    # until failed downloads have been retried
+    global _warmer
+    with _warmer_lock:
+        if _warmer is None:
+            _warmer = threading.Thread(target=_warm_and_retry, args=(list(iso3s),), daemon=True)
+            _warmer.start()
+    return _warmer
+
+
+def is_ready(iso3):
+    # True if the country's boundaries are on disk (the map will not download)
+    return os.path.exists(raw_path(iso3))
+
+
+def download_status(iso3):
+    # "ready" (on disk), "unavailable" (not on the server, or given up after
+    # DOWNLOAD_ATTEMPTS rounds) or "pending" (not fetched yet, or a retry
+    # is scheduled)
+    iso3 = iso3.upper()
+    if is_ready(iso3):
+        return "ready"
+    with _failures_lock:
+        failure = _failures.get(iso3)
+    if failure and failure[1] is None:
+        return "unavailable"
+    return "pending"
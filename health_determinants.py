@@ -1,109 +1,23 @@
 import altair as alt
 import pandas as pd
+from derived_tables import get_table, health_determinants_countries, health_determinants_years, region_values, setting_as_of
 import streamlit as st
-import plotly.express as px
-
-@st.cache_data
-def load_data():
-    df = pd.read_excel('health_determinants.xlsx')
-    return df
-
-@st.cache_data
-def prepare_recent_income_year(df):
-    df_filtered = df[df['indicator_name'] == 'Share of household income (%)']
-    df_quintile_1 = df_filtered[df_filtered['subgroup'] == 'Quintile 1 (poorest)']
-    df_recent_year = df_quintile_1.sort_values(
-        by=['setting', 'date'],
-        ascending=[True, False]
-    )
-    df_recent_year = df_recent_year.drop_duplicates(subset=['setting'])
-    return df_recent_year
-
-# Load data
-df = load_data()
 
 # Income indicator (poorest quintile)
-df_income_recent = prepare_recent_income_year(df)
-income_countries = sorted(df_income_recent['setting'].unique())
+df_income_recent = get_table("income_recent")
 
 # ---- EDUCATION FILTERING ----
-df_education = df[    (df['setting'].isin(income_countries)) &
-    (df['indicator_name'].str.startswith('People with no education (%)')) &
-    (df['date'].notna())
-]
-
-
-df_education = df_education.copy()
-
-df_education["sex"] = df_education["indicator_name"].str.lower().apply(
-    lambda x: "Female" if "female" in x
-    else ("Male" if "male" in x
-    else "Both")
-)
-
-df_education["indicator_clean"] = (
-    df_education["indicator_name"]
-    .str.replace(" - Female", "", regex=False)
-    .str.replace(" - Male", "", regex=False)
-)
-
-
-most_recent_years_education = (
-    df_education.groupby('setting')['date']
-    .max()
-    .reset_index()
-    .rename(columns={'date': 'most_recent_date'})
-)
-
-df_education_recent = pd.merge(
-    df_education,
-    most_recent_years_education,
-    left_on=['setting', 'date'],
-    right_on=['setting', 'most_recent_date'],
-    how='inner'
-).drop(columns=['most_recent_date'])
-
-sex_counts = df_education_recent.groupby(["setting", "sex"]).size().unstack(fill_value=0)
-
-valid_countries = sex_counts[
-    (sex_counts["Male"] > 0) & (sex_counts["Female"] > 0)
-].index.tolist()
-
-df_education_recent = df_education_recent[
-    df_education_recent["setting"].isin(valid_countries)
-]
-
-education_countries = sorted(df_education_recent['setting'].unique())
+# most recent year per country, countries with both Male and Female data
+df_education_recent = get_table("education_recent")
 
 # Countries in BOTH datasets
-country_list = [c for c in income_countries if c in education_countries]
+country_list = health_determinants_countries("income", "education")
 
 
 # ---- LIVING CONDITIONS FILTERING ----
 
-# keep only the countries that appear in df_education_recent
-valid_settings = df_education_recent["setting"].unique()
-
-df_living = df[
-    df["setting"].isin(valid_settings) &
-    df["indicator_name"].str.startswith("Population with electricity (%)") &
-    df["dimension"].isin(["Subnational region", "Place of residence"])
-].copy()
-
-most_recent_living = (
-    df_living.groupby("setting")["date"]
-    .max()
-    .reset_index()
-    .rename(columns={"date": "most_recent_date"})
-)
-
-df_living_recent = pd.merge(
-    df_living,
-    most_recent_living,
-    left_on=["setting", "date"],
-    right_on=["setting", "most_recent_date"],
-    how="inner"
-).drop(columns=["most_recent_date"])
+# most recent year per country, countries that appear in df_education_recent
+df_living_recent = get_table("living_recent")
 
 # Context text
 st.markdown("""
@@ -142,7 +56,7 @@ chart = (
     .encode(
         y=alt.Y("setting:N", sort='-x', title="Country"),
         x=alt.X("estimate:Q", title="Poorest Quintile Income Share (%)"),
-        tooltip=["setting", "estimate", "date"],
+        tooltip=["setting", alt.Tooltip("estimate:Q", format=".1f"), "date"],
         opacity=alt.condition(selection, alt.value(1), alt.value(0.3))
     )
     .add_params(selection)
@@ -198,6 +112,25 @@ else:
     st.warning("Please select at least one country above.")
     st.stop()
 
+# As-of year for the selected country, defaulting to its most recent survey
+as_of_year = None
+country_years = health_determinants_years(selected_country_name)
+if len(country_years) > 1:
+    as_of_year = st.select_slider(
+        "Show data as of year:",
+        options=country_years,
+        value=country_years[-1]
+    )
+    if as_of_year == country_years[-1]:
+        as_of_year = None
+    else:
+        # each table at its own latest survey up to the chosen year
+        df_education_recent, education_year = setting_as_of(
+            "education_history", selected_country_name, as_of_year
+        )
+        if education_year > as_of_year:
+            st.caption(f"No education survey up to {as_of_year}; showing {education_year}.")
+
 #----EDUCATION PLLOTS----
 #choose country
 
@@ -230,7 +163,7 @@ def pie_chart(data, title):
         .encode(
             theta=alt.Theta("estimate:Q", stack=True),
             color=alt.Color("subgroup:N", title="Wealth Quintile"),
-            tooltip=["subgroup", "estimate"]
+            tooltip=["subgroup", alt.Tooltip("estimate:Q", format=".1f")]
         )
         .properties(
             width=250,
@@ -275,14 +208,14 @@ with st.expander("ℹ️ More about this data "):
     """)
 
 #----LIVING CDTS PLOTS-----
-df_regions = df_living_recent[
-    df_living_recent["dimension"] == "Subnational region"
-].copy()
-
-df_regions = df_regions.rename(columns={
-    "subgroup": "region",
-    "estimate": "value"
-})
+df_regions = get_table("regions")
+if as_of_year is not None:
+    df_living_as_of, living_year = setting_as_of("living_history", selected_country_name, as_of_year)
+    if living_year is not None and living_year > as_of_year:
+        st.caption(f"No electricity survey up to {as_of_year}; showing {living_year}.")
+    df_regions_as_of = region_values(df_living_as_of)
+else:
+    df_regions_as_of = df_regions
 
 country_to_iso = dict(zip(df_regions["setting"], df_regions["iso3"]))
 
@@ -307,97 +240,14 @@ This makes electricity access a powerful indicator of **infrastructure developme
 st.markdown("#### % of people with no education by wealth quintile")
 
 import streamlit as st
-import geopandas as gpd
-import requests
-import os
-import matplotlib.pyplot as plt
-from rapidfuzz import process, fuzz
-import json
+from electricity_map import chart_config, plot_mosaic_map, plot_setting_animation, plot_setting_map
+from geo_store import OFFLINE_MAP, start_warmer
 
-def load_gadm_adm1(iso3):
-    iso3 = iso3.upper()
-    os.makedirs("geo_gadm", exist_ok=True)
-    path = f"geo_gadm/{iso3}_adm1.json"
+# Download missing GADM boundaries for every mapped country in the
+# background, once per server process (see geo_store.py)
+start_warmer(df_regions["iso3"].dropna().unique())
 
-    if os.path.exists(path):
-        return gpd.read_file(path)
 
-    url = f"https://geodata.ucdavis.edu/gadm/gadm4.1/json/gadm41_{iso3}_1.json"
-    r = requests.get(url)
-    if r.status_code != 200:
-        return None
-
-    with open(path, "wb") as f:
-        f.write(r.content)
-
-    return gpd.read_file(path)
-
-
-
-# Fuzzy match your region names to GADM NAME_1
-
-def fuzzy_merge_regions(df_setting, gdf):
-    gadm_names = list(gdf["NAME_1"])
-
-    matches = df_setting["region"].apply(
-        lambda x: process.extractOne(
-            x,
-            gadm_names,
-            scorer=fuzz.WRatio
-        )[0]
-    )
-
-    df_setting = df_setting.copy()
-    df_setting["matched_region"] = matches
-    return df_setting
-
-
-
-# Plot choropleth map
-
-def plot_setting_map(iso3, df_regions):
-    df_setting = df_regions[df_regions["iso3"] == iso3]
-
-    if df_setting.empty:
-        st.error(f"No rows found for ISO3 code: {iso3}")
-        return None
-
-    gdf = load_gadm_adm1(iso3)
-    if gdf is None:
-        st.error("Could not load boundaries.")
-        return None
-
-    df_setting = fuzzy_merge_regions(df_setting, gdf)
-
-    geojson_dict = json.loads(gdf.to_json())
-
-    # center map on the country geometry
-    centroid = gdf.geometry.unary_union.centroid
-    center_lat = centroid.y
-    center_lon = centroid.x
-
-    fig = px.choropleth_mapbox(
-    df_setting,
-    geojson=geojson_dict,
-    locations="matched_region",
-    featureidkey="properties.NAME_1",
-    color="value",
-    color_continuous_scale="RdBu_r",   
-    hover_name="region",
-    hover_data={"value": ":.1f"},
-    mapbox_style="carto-positron",
-    center={"lat": center_lat, "lon": center_lon},
-    zoom=5,
-    opacity=0.8,
-)
-
-    fig.update_layout(
-        margin=dict(l=0, r=0, t=40, b=0),
-        height=600,
-        title=f"{iso3} — Population with electricity (%)"
-    )
-
-    return fig
 
 # Streamlit Integration
 
@@ -410,21 +260,28 @@ def app(df_regions):
     setting = st.selectbox("Choose a setting", sorted(df_regions["setting"].unique()))
     iso3 = setting_to_iso[setting]
 
-    fig = plot_setting_map(iso3, df_regions)
+    fig = plot_setting_map(iso3, df_regions, setting)
     if fig:
         st.pyplot(fig)
 
 
 iso3_selected = country_to_iso[country_selected]
 
-fig = plot_setting_map(iso3_selected, df_regions)
-fig.update_traces(marker_line_width=0.5, marker_line_color="black")
-fig.update_traces(
-    marker_line_color="black",
-    marker_line_width=1
-)
+map_mode = st.radio("Map:", ["Selected country", "Selected country by survey year", "All selected countries"], horizontal=True)
+offline_map = st.checkbox("Offline base map (no tile server)", value=OFFLINE_MAP)
+if map_mode == "Selected country":
+    fig = plot_setting_map(iso3_selected, df_regions_as_of, f"{iso3_selected} — Population with electricity (%)", offline_map)
+elif map_mode == "Selected country by survey year":
+    fig = plot_setting_animation(iso3_selected, country_selected, df_regions_as_of, offline_map)
+else:
+    fig = plot_mosaic_map([country_to_iso[c] for c in selected_countries if c in country_to_iso], df_regions, offline_map)
 if fig:
-    st.plotly_chart(fig, use_container_width=True)
+    fig.update_traces(marker_line_width=0.5, marker_line_color="black")
+    fig.update_traces(
+        marker_line_color="black",
+        marker_line_width=1
+    )
+    st.plotly_chart(fig, use_container_width=True, config=chart_config(offline_map))
 
 with st.expander("ℹ️ More about this data"):
     st.write("""
@@ -0,0 +1,97 @@
+import bisect
+
+import numpy as np
+import pandas as pd
+
+from derived_tables import get_table, table_version
+
+# Dense setting x year matrix behind the mortality heatmap.
+#
+# The long-form "mortality_heatmap" table (one row per setting and year) is
+# pivoted once per data version into a float32 array, NaN where a setting
+# has no estimate. A region filter is a cached row selection and the row
+# order (most recent year in range, highest rate first) is cached per
+# (region, year), so moving the year slider is an array slice.
+#
+# heatmap_frame() hands the slice to the chart in wide form, one row per
+# setting and one float32 column per year; the chart folds the year
+# columns back into cells in the browser. The Arrow buffer it ships is the
+# matrix itself instead of a (setting, year, rate, region) record per cell.
+#
+# Usage:
+#   regions = heatmap_regions()
+#   settings, years, values = heatmap_slice("Africa", 1990, 2022)
+#   df = heatmap_frame("All Regions", 1990, 2022)   # setting, "1990", ...
+
+ALL_REGIONS = "All Regions"
+
+# version -> (settings, regions, years, values)
+_matrices = {}
+
+# (region, year, version) -> row indices
+_orders = {}
+
+
+def heatmap_matrix():
+    # (settings, WHO region per setting, years, values[setting, year])
+    version = table_version("mortality_heatmap")
+    if version not in _matrices:
+        df = get_table("mortality_heatmap")
+        settings = df["setting"].astype(object)
+        rows, setting_names = pd.factorize(settings, sort=True)
+        years = np.sort(df["date"].unique()).astype(int)
+        cols = np.searchsorted(years, df["date"].to_numpy())
+
+        values = np.full((len(setting_names), len(years)), np.nan, dtype=np.float32)
+        values[rows, cols] = df["mortality_rate"].to_numpy(dtype=np.float32)
+
+        regions = df.groupby(settings)["whoreg6"].first().astype(object)
+        regions = regions.reindex(setting_names).to_numpy()
+
+        _matrices.clear()
+        _orders.clear()
+        _matrices[version] = (np.asarray(setting_names, dtype=object), regions, years, values)
+    return _matrices[version]
+
+
+def heatmap_regions():
+    # WHO regions with at least one setting, sorted
+    _, regions, _, _ = heatmap_matrix()
+    return sorted({r for r in regions if isinstance(r, str)})
+
+
+def row_order(region, year):
+    # Rows of the region's settings, highest rate in year first; settings
+    # without an estimate that year go last
+    version = table_version("mortality_heatmap")
+    key = (region, year, version)
+    if key not in _orders:
+        settings, regions, years, values = heatmap_matrix()
+        if region == ALL_REGIONS:
+            rows = np.arange(len(settings))
+        else:
+            rows = np.flatnonzero(regions == region)
+        column = values[rows, np.searchsorted(years, year)]
+        # stable sort on the negated rate keeps NaN last, ties alphabetical
+        _orders[key] = rows[np.argsort(-column, kind="stable")]
+    return _orders[key]
+
+
+def heatmap_slice(region, first, last):
+    # (settings, years, values) for the region and year range, rows ordered
+    # by the most recent year in range
+    settings, _, years, values = heatmap_matrix()
+    start = bisect.bisect_left(years, first)
+    stop = bisect.bisect_right(years, last)
+    if start == stop:
+        return settings[:0], years[:0], values[:0, :0]
+    rows = row_order(region, int(years[stop - 1]))
+    return settings[rows], years[start:stop], values[rows, start:stop]
+
+
+def heatmap_frame(region, first, last):
+    # Wide DataFrame of heatmap_slice: setting, then one column per year
+    settings, years, values = heatmap_slice(region, first, last)
+    df = pd.DataFrame(values, columns=[str(y) for y in years])
+    df.insert(0, "setting", settings)
+    return df
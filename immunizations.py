@@ -1,61 +1,12 @@
-import pandas as pd
+from derived_tables import get_table
 import altair as alt
 
-# Load the Excel file
-df = pd.read_excel('immunizations.xlsx')
-
-# Filter for relevant indicators and dimensions
-df = df[
-    (df['indicator_name'] == "Full immunization coverage among one-year-olds (%)") &
-    ((df['dimension'] == "Education (3 groups)") |
-     (df['dimension'] == "Economic status (wealth decile)"))
-]
-
-# Prepare plotting DataFrame
-df = df[['setting', 'date', 'dimension', 'subgroup', 'estimate']].copy()
-df.rename(columns={'estimate': 'vaccination_coverage'}, inplace=True)
-
-# Clean data: keep only countries with no missing vaccination coverage
-valid_countries = df.groupby('setting')['vaccination_coverage'].apply(lambda x: x.notna().all())
-valid_countries = valid_countries[valid_countries].index.tolist()
-df = df[df['setting'].isin(valid_countries)]
-
-# Map subgroups to grouped categories
-economic_map = {
-    'Decile 1 (poorest)': 'Lowest Economic Status',
-    'Decile 2': 'Lowest Economic Status',
-    'Decile 3': 'Middle Economic Status',
-    'Decile 4': 'Middle Economic Status',
-    'Decile 5': 'Middle Economic Status',
-    'Decile 6': 'Middle Economic Status',
-    'Decile 7': 'Middle Economic Status',
-    'Decile 8': 'Middle Economic Status',
-    'Decile 9': 'Highest Economic Status',
-    'Decile 10 (richest)': 'Highest Economic Status'
-}
-
-education_map = {
-    'No education': 'Lowest Educational Status',
-    'Primary education': 'Medium Educational Status',
-    'Secondary or higher education': 'Highest Educational Status'
-}
-
-df['group'] = df.apply(
-    lambda row: economic_map.get(row['subgroup']) if row['dimension'] == 'Economic status (wealth decile)'
-    else education_map.get(row['subgroup']) if row['dimension'] == 'Education (3 groups)'
-    else None,
-    axis=1
-)
-df['dimension_type'] = df['dimension'].apply(
-    lambda x: 'Economic Status' if 'Economic' in x else 'Education' if 'Education' in x else None
-)
-df = df.dropna(subset=['group'])
-
-# Aggregate line chart data to avoid duplicate points
-line_data = df.groupby(['setting', 'date', 'dimension_type', 'group'], as_index=False)['vaccination_coverage'].mean()
+# Coverage by grouped economic/educational status, and line chart data
+df = get_table("vaccination")
+line_data = get_table("vaccination_line_data")
 
 # Country selector
-countries = sorted(df['setting'].dropna().unique())
+countries = get_table("vaccination_countries")['setting'].tolist()
 country_dropdown = alt.binding_select(options=countries, name='Country: ')
 country_select = alt.selection_point(fields=['setting'], bind=country_dropdown, name='country_select', value=None)
 
@@ -0,0 +1,60 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Indicator catalog: parses each distinct indicator_name once into its base
+# indicator, sex qualifier and unit, e.g.
+#   "People with no education (%) - Female" -> ("People with no education (%)", "Female", "%")
+# and joins the result back onto the frame by category code, so string work
+# scales with the number of distinct indicators rather than rows.
+
+SEX_SUFFIXES = [" - Female", " - Male"]
+
+CATALOG_COLUMNS = ["indicator_base", "indicator_sex", "indicator_unit"]
+
+
+def parse_indicator(name):
+    lower = name.lower()
+    sex = "Female" if "female" in lower else ("Male" if "male" in lower else "Both")
+
+    base = name
+    for suffix in SEX_SUFFIXES:
+        base = base.replace(suffix, "")
+
+    unit = re.search(r"\(([^()]*)\)", base)
+    return base, sex, unit.group(1) if unit else None
+
+
+def indicator_catalog(names):
+    # One row per distinct indicator name
+    names = list(names)
+    return pd.DataFrame(
+        [parse_indicator(name) for name in names],
+        index=pd.Index(names, name="indicator_name"),
+        columns=CATALOG_COLUMNS,
+    )
+
+
+def add_indicator_metadata(df):
+    # Add indicator_base, indicator_sex and indicator_unit (categoricals)
+    names = df["indicator_name"].astype("category")
+    catalog = indicator_catalog(names.cat.categories)
+    codes = names.cat.codes.to_numpy()
+    return df.assign(**{
+        col: pd.Categorical(catalog[col].tolist()).take(codes, allow_fill=True)
+        for col in CATALOG_COLUMNS
+    })
+
+
+def category_mask(series, predicate):
+    # Evaluate predicate on the distinct values of a categorical column and
+    # broadcast the result to its rows by code
+    series = series.astype("category")
+    hits = np.asarray(predicate(series.cat.categories.to_series()), dtype=bool)
+    hits = np.append(hits, False)  # code -1 (missing) indexes the last slot
+    return pd.Series(hits[series.cat.codes.to_numpy()], index=series.index)
+
+
+def startswith_mask(series, prefix):
+    return category_mask(series, lambda values: values.str.startswith(prefix))
@@ -1,7 +1,11 @@
 import streamlit as st
 import pandas as pd
+from chart_cache import altair_chart
+from data_store import load_source, source_version
+from derived_tables import get_table, health_determinants_countries, health_determinants_years, region_values, setting_as_of, table_version
+from heatmap_matrix import ALL_REGIONS, heatmap_frame, heatmap_matrix, heatmap_regions
+from vaccination_slices import SERVER_SELECTION, country_slice, prefetch
 import altair as alt
-import plotly.express as px
 
 # Set Streamlit page configuration
 st.set_page_config(page_title="Health Equity Dashboards", layout="wide")
@@ -19,9 +23,9 @@ if page == "Under-5 Mortality":
     st.markdown("*Deaths per 1,000 live births*")
 
     # Load the data
-    @st.cache_data
+    @st.cache_resource
     def load_mortality_data():
-        df = pd.read_excel('under5_mortality.xlsx')
+        df = load_source("mortality")
         return df
 
     df = load_mortality_data()
@@ -36,7 +40,7 @@ if page == "Under-5 Mortality":
     """)
 
     # Country selector
-    country_list = sorted(df['setting'].unique())
+    country_list = get_table("mortality_countries")['setting'].tolist()
     selected_countries = st.multiselect(
         "Select countries to compare:",
         options=country_list,
@@ -57,81 +61,119 @@ if page == "Under-5 Mortality":
         df_filtered = df[df['setting'].isin(selected_countries)]
         
         if trend_type == 'Overall Trend':
-            # Get ALL countries data for grey background
-            df_all = df[df['dimension'] == 'Sex'].copy()
-            df_all = df_all.drop_duplicates(subset=['setting', 'date'])
-            df_all = df_all[['setting', 'date', 'setting_average']].rename(
-                columns={'setting_average': 'estimate'}
-            )
-            
-            # Background: all OTHER countries in grey
-            df_background = df_all[~df_all['setting'].isin(selected_countries)]
-            
-            # Foreground: selected countries
-            df_selected = df_all[df_all['setting'].isin(selected_countries)]
-            
-            # Grey background lines (all other countries)
-            background = alt.Chart(df_background).mark_line(strokeWidth=1, opacity=0.3).encode(
-                x=alt.X('date:O', title='Year', axis=alt.Axis(labelAngle=-45, values=list(range(1950, 2025, 5)))),
-                y=alt.Y('estimate:Q', title='Mortality Rate (per 1,000 live births)'),
-                detail='setting:N',
-                color=alt.value('#888888'),
-                tooltip=[
-                    alt.Tooltip('setting:N', title='Country'),
-                    alt.Tooltip('date:O', title='Year'),
-                    alt.Tooltip('estimate:Q', title='Mortality Rate', format='.1f')
-                ]
-            )
-            
-            # Highlighted selected countries
-            foreground = alt.Chart(df_selected).mark_line(strokeWidth=3, point=True).encode(
-                x=alt.X('date:O', title='Year'),
-                y=alt.Y('estimate:Q'),
-                color=alt.Color('setting:N', title='Country', 
-                               scale=alt.Scale(scheme='category10')),
-                tooltip=[
-                    alt.Tooltip('setting:N', title='Country'),
+            # Background: quantile bands of every country's trend (global or
+            # one WHO region), or on demand every other country's line
+            col1, col2 = st.columns(2)
+            with col1:
+                df_envelope = get_table("mortality_envelope")
+                scopes = ["Global"] + sorted(set(df_envelope["scope"]) - {"Global"})
+                band_scope = st.selectbox("Background band:", options=scopes)
+            with col2:
+                show_lines = st.checkbox("Show every other country's line in the background")
+
+            def build_chart():
+                df_all = get_table("mortality_trend")
+
+                # Foreground: selected countries
+                df_selected = df_all[df_all['setting'].isin(selected_countries)]
+
+                # Background bands: p10-p90 and p25-p75 of the countries in scope, and their median
+                df_band = df_envelope[df_envelope['scope'] == band_scope]
+                x = alt.X('date:O', title='Year', axis=alt.Axis(labelAngle=-45, values=list(range(1950, 2025, 5))))
+                band_tooltip = [
                     alt.Tooltip('date:O', title='Year'),
-                    alt.Tooltip('estimate:Q', title='Mortality Rate', format='.1f')
+                    alt.Tooltip('median:Q', title=f'{band_scope} median', format='.1f'),
+                    alt.Tooltip('p25:Q', title='25th percentile', format='.1f'),
+                    alt.Tooltip('p75:Q', title='75th percentile', format='.1f'),
+                    alt.Tooltip('n:Q', title='Countries'),
                 ]
+                outer = alt.Chart(df_band).mark_area(color='#888888', opacity=0.15).encode(
+                    x=x,
+                    y=alt.Y('p10:Q', title='Mortality Rate (per 1,000 live births)'),
+                    y2='p90:Q',
+                    tooltip=band_tooltip
+                )
+                inner = alt.Chart(df_band).mark_area(color='#888888', opacity=0.3).encode(
+                    x=x, y='p25:Q', y2='p75:Q', tooltip=band_tooltip
+                )
+                median = alt.Chart(df_band).mark_line(color='#666666', strokeDash=[4, 3]).encode(
+                    x=x, y='median:Q', tooltip=band_tooltip
+                )
+                layers = [outer, inner, median]
+
+                if show_lines:
+                    # Grey background lines (all other countries)
+                    df_background = df_all[~df_all['setting'].isin(selected_countries)]
+                    layers.append(alt.Chart(df_background).mark_line(strokeWidth=1, opacity=0.3).encode(
+                        x=x,
+                        y=alt.Y('estimate:Q'),
+                        detail='setting:N',
+                        color=alt.value('#888888'),
+                        tooltip=[
+                            alt.Tooltip('setting:N', title='Country'),
+                            alt.Tooltip('date:O', title='Year'),
+                            alt.Tooltip('estimate:Q', title='Mortality Rate', format='.1f')
+                        ]
+                    ))
+
+                # Highlighted selected countries
+                layers.append(alt.Chart(df_selected).mark_line(strokeWidth=3, point=True).encode(
+                    x=alt.X('date:O', title='Year'),
+                    y=alt.Y('estimate:Q'),
+                    color=alt.Color('setting:N', title='Country',
+                                   scale=alt.Scale(scheme='category10')),
+                    tooltip=[
+                        alt.Tooltip('setting:N', title='Country'),
+                        alt.Tooltip('date:O', title='Year'),
+                        alt.Tooltip('estimate:Q', title='Mortality Rate', format='.1f')
+                    ]
+                ))
+
+                # Layer background + foreground
+                chart = alt.layer(*layers).properties(
+                    width=800,
+                    height=400,
+                    title='Under-5 Mortality Rate: Overall Trend'
+                )
+                return chart
+
+            altair_chart(
+                page, (table_version("mortality_trend"), table_version("mortality_envelope")),
+                {"trend": trend_type, "countries": selected_countries, "band": band_scope, "lines": show_lines},
+                build_chart, use_container_width=True
             )
-            
-            # Layer background + foreground
-            chart = (background + foreground).properties(
-                width=800,
-                height=400,
-                title='Under-5 Mortality Rate: Overall Trend'
-            )
-            
-            st.altair_chart(chart, use_container_width=True)
+            st.caption(f"Grey bands: 10th–90th and 25th–75th percentile of country under-5 mortality per year ({band_scope}); dashed line: median.")
             
         elif trend_type == 'Split by Sex':
             df_plot = df_filtered[df_filtered['dimension'] == 'Sex'].copy()
             df_plot = df_plot[['setting', 'date', 'subgroup', 'estimate']]
             
-            # Use faceting by country with max 3 columns per row
-            chart = alt.Chart(df_plot).mark_line(strokeWidth=2.5, point=True).encode(
-                x=alt.X('date:O', title='Year', axis=alt.Axis(labelAngle=-45, values=list(range(1950, 2025, 10)))),
-                y=alt.Y('estimate:Q', title='Mortality Rate (per 1,000 live births)'),
-                color=alt.Color('subgroup:N', title='Sex',
-                               scale=alt.Scale(domain=['Female', 'Male'], 
-                                              range=['#e377c2', '#1f77b4'])),
-                tooltip=[
-                    alt.Tooltip('setting:N', title='Country'),
-                    alt.Tooltip('date:O', title='Year'),
-                    alt.Tooltip('subgroup:N', title='Sex'),
-                    alt.Tooltip('estimate:Q', title='Mortality Rate', format='.1f')
-                ]
-            ).properties(
-                width=280,
-                height=300,
-                title='Under-5 Mortality Rate by Sex'
-            ).facet(
-                facet=alt.Facet('setting:N', title='Country'),
-                columns=3
-            )
-            
-            st.altair_chart(chart, use_container_width=True)
+            def build_chart():
+                # Use faceting by country with max 3 columns per row
+                chart = alt.Chart(df_plot).mark_line(strokeWidth=2.5, point=True).encode(
+                    x=alt.X('date:O', title='Year', axis=alt.Axis(labelAngle=-45, values=list(range(1950, 2025, 10)))),
+                    y=alt.Y('estimate:Q', title='Mortality Rate (per 1,000 live births)'),
+                    color=alt.Color('subgroup:N', title='Sex',
+                                   scale=alt.Scale(domain=['Female', 'Male'], 
+                                                  range=['#e377c2', '#1f77b4'])),
+                    tooltip=[
+                        alt.Tooltip('setting:N', title='Country'),
+                        alt.Tooltip('date:O', title='Year'),
+                        alt.Tooltip('subgroup:N', title='Sex'),
+                        alt.Tooltip('estimate:Q', title='Mortality Rate', format='.1f')
+                    ]
+                ).properties(
+                    width=280,
+                    height=300,
+                    title='Under-5 Mortality Rate by Sex'
+                ).facet(
+                    facet=alt.Facet('setting:N', title='Country'),
+                    columns=3
+                )
+                return chart
+
+            altair_chart(page, source_version("mortality"), {"trend": trend_type, "countries": selected_countries},
+                         build_chart, use_container_width=True)
         
         else:  # Split by Economic Status
             df_plot = df_filtered[df_filtered['dimension'] == 'Economic status (wealth quintile)'].copy()
@@ -149,29 +191,32 @@ if page == "Under-5 Mortality":
                 # Color scheme for quintiles
                 quintile_colors = ['#d62728', '#ff7f0e', '#bcbd22', '#2ca02c', '#1f77b4']
                 
-                # Faceted chart with max 3 columns
-                chart = alt.Chart(df_plot).mark_line(strokeWidth=2.5, point=True).encode(
-                    x=alt.X('date:O', title='Year', axis=alt.Axis(labelAngle=-45, values=list(range(1990, 2025, 5)))),
-                    y=alt.Y('estimate:Q', title='Mortality Rate (per 1,000 live births)'),
-                    color=alt.Color('quintile:N', title='Economic Status',
-                                   scale=alt.Scale(domain=quintile_labels, range=quintile_colors),
-                                   sort=quintile_labels),
-                    tooltip=[
-                        alt.Tooltip('setting:N', title='Country'),
-                        alt.Tooltip('date:O', title='Year'),
-                        alt.Tooltip('quintile:N', title='Economic Status'),
-                        alt.Tooltip('estimate:Q', title='Mortality Rate', format='.1f')
-                    ]
-                ).properties(
-                    width=280,
-                    height=300,
-                    title='Under-5 Mortality Rate by Economic Status'
-                ).facet(
-                    facet=alt.Facet('setting:N', title='Country'),
-                    columns=3
-                )
-                
-                st.altair_chart(chart, use_container_width=True)
+                def build_chart():
+                    # Faceted chart with max 3 columns
+                    chart = alt.Chart(df_plot).mark_line(strokeWidth=2.5, point=True).encode(
+                        x=alt.X('date:O', title='Year', axis=alt.Axis(labelAngle=-45, values=list(range(1990, 2025, 5)))),
+                        y=alt.Y('estimate:Q', title='Mortality Rate (per 1,000 live births)'),
+                        color=alt.Color('quintile:N', title='Economic Status',
+                                       scale=alt.Scale(domain=quintile_labels, range=quintile_colors),
+                                       sort=quintile_labels),
+                        tooltip=[
+                            alt.Tooltip('setting:N', title='Country'),
+                            alt.Tooltip('date:O', title='Year'),
+                            alt.Tooltip('quintile:N', title='Economic Status'),
+                            alt.Tooltip('estimate:Q', title='Mortality Rate', format='.1f')
+                        ]
+                    ).properties(
+                        width=280,
+                        height=300,
+                        title='Under-5 Mortality Rate by Economic Status'
+                    ).facet(
+                        facet=alt.Facet('setting:N', title='Country'),
+                        columns=3
+                    )
+                    return chart
+
+                altair_chart(page, source_version("mortality"), {"trend": trend_type, "countries": selected_countries},
+                             build_chart, use_container_width=True)
 
     # -----------------------------------------------------------------------------
     # Heatmap: Countries × Years
@@ -179,61 +224,52 @@ if page == "Under-5 Mortality":
     st.markdown("---")
     st.header("🗓️ Heatmap: Mortality Rate Over Time")
 
-    # Prepare data for heatmap
-    df_heatmap = df[df['dimension'] == 'Sex'].copy()
-    df_heatmap = df_heatmap.drop_duplicates(subset=['setting', 'date'])
-    df_heatmap = df_heatmap[['setting', 'date', 'setting_average', 'whoreg6']].rename(
-        columns={'setting_average': 'mortality_rate'}
-    )
-
     # Filter options
     col1, col2 = st.columns(2)
 
     with col1:
-        regions = ['All Regions'] + sorted(df_heatmap['whoreg6'].dropna().unique().tolist())
+        regions = [ALL_REGIONS] + heatmap_regions()
         selected_region = st.selectbox("Filter by WHO Region:", options=regions)
 
     with col2:
+        _, _, heatmap_years, _ = heatmap_matrix()
         year_range = st.slider(
             "Select year range:",
-            min_value=int(df_heatmap['date'].min()),
-            max_value=int(df_heatmap['date'].max()),
+            min_value=int(heatmap_years[0]),
+            max_value=int(heatmap_years[-1]),
             value=(1990, 2022)
         )
 
-    # Apply filters
-    df_heatmap_filtered = df_heatmap[
-        (df_heatmap['date'] >= year_range[0]) & 
-        (df_heatmap['date'] <= year_range[1])
-    ]
-
-    if selected_region != 'All Regions':
-        df_heatmap_filtered = df_heatmap_filtered[df_heatmap_filtered['whoreg6'] == selected_region]
-
-    # Sort countries by their most recent mortality rate
-    country_order = df_heatmap_filtered[df_heatmap_filtered['date'] == df_heatmap_filtered['date'].max()].sort_values(
-        'mortality_rate', ascending=False
-    )['setting'].tolist()
-
-    # Create heatmap
-    heatmap = alt.Chart(df_heatmap_filtered).mark_rect().encode(
-        x=alt.X('date:O', title='Year', axis=alt.Axis(labelAngle=-45, values=list(range(year_range[0], year_range[1]+1, 5)))),
-        y=alt.Y('setting:N', title='Country', sort=country_order),
-        color=alt.Color('mortality_rate:Q', 
-                        title='Mortality Rate',
-                        scale=alt.Scale(scheme='redyellowblue', reverse=True, domain=[0, 300])),
-        tooltip=[
-            alt.Tooltip('setting:N', title='Country'),
-            alt.Tooltip('date:O', title='Year'),
-            alt.Tooltip('mortality_rate:Q', title='Mortality Rate', format='.1f')
-        ]
-    ).properties(
-        width=800,
-        height=max(400, len(country_order) * 12),
-        title=f'Under-5 Mortality Rate Heatmap ({year_range[0]}-{year_range[1]})'
-    )
+    def build_heatmap():
+        # One row per country (sorted by its most recent rate), one column
+        # per year; the chart folds the year columns back into cells
+        df_heatmap = heatmap_frame(selected_region, *year_range)
+        df_heatmap = df_heatmap[df_heatmap.iloc[:, 1:].notna().any(axis=1)]
+        year_columns = list(df_heatmap.columns[1:])
+        heatmap = alt.Chart(df_heatmap).transform_fold(
+            year_columns, as_=['date', 'mortality_rate']
+        ).transform_filter(
+            'isValid(datum.mortality_rate)'
+        ).mark_rect().encode(
+            x=alt.X('date:O', title='Year', axis=alt.Axis(labelAngle=-45, values=[str(y) for y in range(year_range[0], year_range[1]+1, 5)])),
+            y=alt.Y('setting:N', title='Country', sort=df_heatmap['setting'].tolist()),
+            color=alt.Color('mortality_rate:Q', 
+                            title='Mortality Rate',
+                            scale=alt.Scale(scheme='redyellowblue', reverse=True, domain=[0, 300])),
+            tooltip=[
+                alt.Tooltip('setting:N', title='Country'),
+                alt.Tooltip('date:O', title='Year'),
+                alt.Tooltip('mortality_rate:Q', title='Mortality Rate', format='.1f')
+            ]
+        ).properties(
+            width=800,
+            height=max(400, len(df_heatmap) * 12),
+            title=f'Under-5 Mortality Rate Heatmap ({year_range[0]}-{year_range[1]})'
+        )
+        return heatmap
 
-    st.altair_chart(heatmap, use_container_width=True)
+    altair_chart(page, table_version("mortality_heatmap"), {"region": selected_region, "years": tuple(year_range)},
+                 build_heatmap, use_container_width=True)
 
     # Footer
     st.markdown("---")
@@ -245,109 +281,22 @@ if page == "Under-5 Mortality":
 elif page == "Health Determinants":
     st.header("🏠 Health Determinants Dashboard")
 
-    @st.cache_data
-    def load_data():
-        df = pd.read_excel('health_determinants.xlsx')
-        return df
-
-    @st.cache_data
-    def prepare_recent_income_year(df):
-        df_filtered = df[df['indicator_name'] == 'Share of household income (%)']
-        df_quintile_1 = df_filtered[df_filtered['subgroup'] == 'Quintile 1 (poorest)']
-        df_recent_year = df_quintile_1.sort_values(
-            by=['setting', 'date'],
-            ascending=[True, False]
-        )
-        df_recent_year = df_recent_year.drop_duplicates(subset=['setting'])
-        return df_recent_year
-
-    # Load data
-    df = load_data()
-
     # Income indicator (poorest quintile)
-    df_income_recent = prepare_recent_income_year(df)
-    income_countries = sorted(df_income_recent['setting'].unique())
+    df_income_recent = get_table("income_recent")
 
     # ---- EDUCATION FILTERING ----
-    df_education = df[    (df['setting'].isin(income_countries)) &
-        (df['indicator_name'].str.startswith('People with no education (%)')) &
-        (df['date'].notna())
-    ]
-
-
-    df_education = df_education.copy()
-
-    df_education["sex"] = df_education["indicator_name"].str.lower().apply(
-        lambda x: "Female" if "female" in x
-        else ("Male" if "male" in x
-        else "Both")
-    )
-
-    df_education["indicator_clean"] = (
-        df_education["indicator_name"]
-        .str.replace(" - Female", "", regex=False)
-        .str.replace(" - Male", "", regex=False)
-    )
-
-
-    most_recent_years_education = (
-        df_education.groupby('setting')['date']
-        .max()
-        .reset_index()
-        .rename(columns={'date': 'most_recent_date'})
-    )
-
-    df_education_recent = pd.merge(
-        df_education,
-        most_recent_years_education,
-        left_on=['setting', 'date'],
-        right_on=['setting', 'most_recent_date'],
-        how='inner'
-    ).drop(columns=['most_recent_date'])
-
-    sex_counts = df_education_recent.groupby(["setting", "sex"]).size().unstack(fill_value=0)
-
-    valid_countries = sex_counts[
-        (sex_counts["Male"] > 0) & (sex_counts["Female"] > 0)
-    ].index.tolist()
-
-    df_education_recent = df_education_recent[
-        df_education_recent["setting"].isin(valid_countries)
-    ]
-
-    education_countries = sorted(df_education_recent['setting'].unique())
+    # most recent year per country, countries with both Male and Female data
+    df_education_recent = get_table("education_recent")
 
     # Countries in BOTH datasets
-    country_list = [c for c in income_countries if c in education_countries]
+    country_list = health_determinants_countries("income", "education")
 
 
     # ---- LIVING CONDITIONS FILTERING ----
 
-    # keep only the countries that appear in df_education_recent
-    valid_settings = df_education_recent["setting"].unique()
-
-    df_living = df[
-        df["setting"].isin(valid_settings) &
-        df["indicator_name"].str.startswith("Population with electricity (%)") &
-        df["dimension"].isin(["Subnational region", "Place of residence"])
-    ].copy()
-
-    most_recent_living = (
-        df_living.groupby("setting")["date"]
-        .max()
-        .reset_index()
-        .rename(columns={"date": "most_recent_date"})
-    )
-
-    df_living_recent = pd.merge(
-        df_living,
-        most_recent_living,
-        left_on=["setting", "date"],
-        right_on=["setting", "most_recent_date"],
-        how="inner"
-    ).drop(columns=["most_recent_date"])
+    # most recent year per country, countries that appear in df_education_recent
+    df_living_recent = get_table("living_recent")
 
-    living_countries = sorted(df_living_recent['setting'].unique())
 
     # Context text
     st.markdown("""
@@ -363,7 +312,7 @@ elif page == "Health Determinants":
     """)
 
     # Countries in BOTH datasets
-    country_list = [c for c in income_countries if c in living_countries]
+    country_list = health_determinants_countries("income", "living")
 
     # Default countries
     preferred_defaults = ["Dominican Republic", "Armenia", "Philippines", "Peru", "Bangladesh", "South Africa", "Brazil", "Ghana"]
@@ -376,43 +325,46 @@ elif page == "Health Determinants":
         default=default_countries
     )
 
-    # Filter
-    df_plot = df_income_recent[df_income_recent['setting'].isin(selected_countries)]
-    df_plot['estimate'] = pd.to_numeric(df_plot['estimate'], errors='coerce')
-
-    # Chart
-    selection = alt.selection_single(fields=["setting"], empty="none")
-
-    chart = (
-        alt.Chart(df_plot)
-        .mark_bar(color="#4C78A8")
-        .encode(
-            y=alt.Y("setting:N", sort='-x', title="Country"),
-            x=alt.X("estimate:Q", title="Poorest Quintile Income Share (%)"),
-            tooltip=["setting", "estimate", "date"],
-            #opacity=alt.condition(selection, alt.value(1), alt.value(0.3))
+    def build_income_chart():
+        # Filter
+        df_plot = df_income_recent[df_income_recent['setting'].isin(selected_countries)]
+        df_plot['estimate'] = pd.to_numeric(df_plot['estimate'], errors='coerce')
+
+        # Chart
+        selection = alt.selection_single(fields=["setting"], empty="none")
+
+        chart = (
+            alt.Chart(df_plot)
+            .mark_bar(color="#4C78A8")
+            .encode(
+                y=alt.Y("setting:N", sort='-x', title="Country"),
+                x=alt.X("estimate:Q", title="Poorest Quintile Income Share (%)"),
+                tooltip=["setting", alt.Tooltip("estimate:Q", format=".1f"), "date"],
+                #opacity=alt.condition(selection, alt.value(1), alt.value(0.3))
+            )
+            #.add_params(selection)
+            .properties(width=600, height=400, title="Economic Indicator: Share of household income (%)")
         )
-        #.add_params(selection)
-        .properties(width=600, height=400, title="Economic Indicator: Share of household income (%)")
-    )
 
 
 
 
 
-    text = (
-        alt.Chart(df_plot)
-        .mark_text(align="left", baseline="middle", dx=3, fontSize=12)
-        .encode(
-            y=alt.Y("setting:N", sort='-x'),
-            x=alt.X("estimate:Q"),
-            text=alt.Text("estimate:Q", format=".1f")
+        text = (
+            alt.Chart(df_plot)
+            .mark_text(align="left", baseline="middle", dx=3, fontSize=12)
+            .encode(
+                y=alt.Y("setting:N", sort='-x'),
+                x=alt.X("estimate:Q"),
+                text=alt.Text("estimate:Q", format=".1f")
+            )
         )
-    )
+        return chart + text
 
     #st.altair_chart(chart + text, width="stretch")
-    selected_country = st.altair_chart(
-        chart + text, 
+    selected_country = altair_chart(
+        page, table_version("income_recent"), {"chart": "income", "countries": selected_countries},
+        build_income_chart,
         use_container_width=True,
     ).selection  # <— captures selection
 
@@ -445,6 +397,25 @@ elif page == "Health Determinants":
         st.warning("Please select at least one country above.")
         st.stop()
 
+    # As-of year for the selected country, defaulting to its most recent survey
+    as_of_year = None
+    country_years = health_determinants_years(selected_country_name)
+    if len(country_years) > 1:
+        as_of_year = st.select_slider(
+            "Show data as of year:",
+            options=country_years,
+            value=country_years[-1]
+        )
+        if as_of_year == country_years[-1]:
+            as_of_year = None
+        else:
+            # each table at its own latest survey up to the chosen year
+            df_education_recent, education_year = setting_as_of(
+                "education_history", selected_country_name, as_of_year
+            )
+            if education_year > as_of_year:
+                st.caption(f"No education survey up to {as_of_year}; showing {education_year}.")
+
     #----EDUCATION PLLOTS----
     #choose country
 
@@ -486,7 +457,7 @@ elif page == "Health Determinants":
                     ],  
                     range=quintile_colors
                 )),
-                tooltip=["subgroup", "estimate"]
+                tooltip=["subgroup", alt.Tooltip("estimate:Q", format=".1f")]
             )
             .properties(
                 width=250,
@@ -510,15 +481,18 @@ elif page == "Health Determinants":
 
     col1, col2 = st.columns(2)
 
+    pie_state = {"country": selected_country_name, "as_of": as_of_year}
     with col1:
-        st.altair_chart(
-            pie_chart(df_male, "Male"),
+        altair_chart(
+            page, table_version("education_history"), {**pie_state, "chart": "Male"},
+            lambda: pie_chart(df_male, "Male"),
             use_container_width=True
         )
 
     with col2:
-        st.altair_chart(
-            pie_chart(df_female, "Female"),
+        altair_chart(
+            page, table_version("education_history"), {**pie_state, "chart": "Female"},
+            lambda: pie_chart(df_female, "Female"),
             use_container_width=True
         )
     with st.expander("ℹ️ More about this data "):
@@ -531,14 +505,14 @@ elif page == "Health Determinants":
         """)
 
     #----LIVING CDTS PLOTS-----
-    df_regions = df_living_recent[
-        df_living_recent["dimension"] == "Subnational region"
-    ].copy()
-
-    df_regions = df_regions.rename(columns={
-        "subgroup": "region",
-        "estimate": "value"
-    })
+    df_regions = get_table("regions")
+    if as_of_year is not None:
+        df_living_as_of, living_year = setting_as_of("living_history", selected_country_name, as_of_year)
+        if living_year is not None and living_year > as_of_year:
+            st.caption(f"No electricity survey up to {as_of_year}; showing {living_year}.")
+        df_regions_as_of = region_values(df_living_as_of)
+    else:
+        df_regions_as_of = df_regions
 
     country_to_iso = dict(zip(df_regions["setting"], df_regions["iso3"]))
 
@@ -563,97 +537,14 @@ elif page == "Health Determinants":
     st.markdown("##### Living Conditions Indicator: Population with electricity (%) ")
 
     import streamlit as st
-    import geopandas as gpd
-    import requests
-    import os
-    import matplotlib.pyplot as plt
-    from rapidfuzz import process, fuzz
-    import json
+    from electricity_map import chart_config, plot_mosaic_map, plot_setting_animation, plot_setting_map
+    from geo_store import OFFLINE_MAP, start_warmer
 
-    def load_gadm_adm1(iso3):
-        iso3 = iso3.upper()
-        os.makedirs("geo_gadm", exist_ok=True)
-        path = f"geo_gadm/{iso3}_adm1.json"
+    # Download missing GADM boundaries for every mapped country in the
+    # background, once per server process (see geo_store.py)
+    start_warmer(df_regions["iso3"].dropna().unique())
 
-        if os.path.exists(path):
-            return gpd.read_file(path)
-
-        url = f"https://geodata.ucdavis.edu/gadm/gadm4.1/json/gadm41_{iso3}_1.json"
-        r = requests.get(url)
-        if r.status_code != 200:
-            return None
-
-        with open(path, "wb") as f:
-            f.write(r.content)
-
-        return gpd.read_file(path)
-
-
-
-    # Fuzzy match your region names to GADM NAME_1
-
-    def fuzzy_merge_regions(df_setting, gdf):
-        gadm_names = list(gdf["NAME_1"])
-
-        matches = df_setting["region"].apply(
-            lambda x: process.extractOne(
-                x,
-                gadm_names,
-                scorer=fuzz.WRatio
-            )[0]
-        )
 
-        df_setting = df_setting.copy()
-        df_setting["matched_region"] = matches
-        return df_setting
-
-
-
-    # Plot choropleth map
-
-    def plot_setting_map(iso3, df_regions, country):
-        df_setting = df_regions[df_regions["iso3"] == iso3]
-
-        if df_setting.empty:
-            st.error(f"No rows found for ISO3 code: {iso3}")
-            return None
-
-        gdf = load_gadm_adm1(iso3)
-        if gdf is None:
-            st.error("Could not load boundaries.")
-            return None
-
-        df_setting = fuzzy_merge_regions(df_setting, gdf)
-
-        geojson_dict = json.loads(gdf.to_json())
-
-        # center map on the country geometry
-        centroid = gdf.geometry.unary_union.centroid
-        center_lat = centroid.y
-        center_lon = centroid.x
-
-        fig = px.choropleth_mapbox(
-        df_setting,
-        geojson=geojson_dict,
-        locations="matched_region",
-        featureidkey="properties.NAME_1",
-        color="value",
-        color_continuous_scale="RdBu_r",   
-        hover_name="region",
-        hover_data={"value": ":.1f"},
-        mapbox_style="carto-positron",
-        center={"lat": center_lat, "lon": center_lon},
-        zoom=5,
-        opacity=0.8,
-    )
-        fig.update_coloraxes(colorbar_title="% Population with Electricity")
-        fig.update_layout(
-            margin=dict(l=0, r=0, t=40, b=0),
-            height=600,
-            title=f"{country} "
-        )
-
-        return fig
 
     # Streamlit Integration
 
@@ -666,21 +557,28 @@ elif page == "Health Determinants":
         setting = st.selectbox("Choose a setting", sorted(df_regions["setting"].unique()))
         iso3 = setting_to_iso[setting]
 
-        fig = plot_setting_map(iso3, df_regions)
+        fig = plot_setting_map(iso3, df_regions, setting)
         if fig:
             st.pyplot(fig)
 
 
     iso3_selected = country_to_iso[country_selected]
 
-    fig = plot_setting_map(iso3_selected, df_regions, country_selected)
-    fig.update_traces(marker_line_width=0.5, marker_line_color="black")
-    fig.update_traces(
-        marker_line_color="black",
-        marker_line_width=1
-    )
+    map_mode = st.radio("Map:", ["Selected country", "Selected country by survey year", "All selected countries"], horizontal=True)
+    offline_map = st.checkbox("Offline base map (no tile server)", value=OFFLINE_MAP)
+    if map_mode == "Selected country":
+        fig = plot_setting_map(iso3_selected, df_regions_as_of, f"{country_selected} ", offline_map)
+    elif map_mode == "Selected country by survey year":
+        fig = plot_setting_animation(iso3_selected, country_selected, df_regions_as_of, offline_map)
+    else:
+        fig = plot_mosaic_map([country_to_iso[c] for c in selected_countries if c in country_to_iso], df_regions, offline_map)
     if fig:
-        st.plotly_chart(fig, use_container_width=True)
+        fig.update_traces(marker_line_width=0.5, marker_line_color="black")
+        fig.update_traces(
+            marker_line_color="black",
+            marker_line_width=1
+        )
+        st.plotly_chart(fig, use_container_width=True, config=chart_config(offline_map))
 
     with st.expander("ℹ️ More about this data"):
         st.write("""
@@ -710,68 +608,19 @@ elif page == "Health Determinants":
 elif page == "Vaccination Coverage":
     st.header("💉 Vaccination Coverage by Economic & Educational Status")
 
-    # Load the Excel file
-    @st.cache_data
-    def load_immunization_data():
-        df = pd.read_excel('immunizations.xlsx')
-        return df
-
-    df = load_immunization_data()
+    # Country selector: in the chart (every country's rows are sent and the
+    # dropdown filters them in the browser) or on the server (only the
+    # selected country's rows are sent; lighter for slow devices)
+    countries = get_table("vaccination_countries")['setting'].tolist()
+    server_selection = st.checkbox("Choose the country on the server (smaller page for slow devices)",
+                                   value=SERVER_SELECTION)
 
-    # Filter for relevant indicators and dimensions
-    df = df[
-        (df['indicator_name'] == "Full immunization coverage among one-year-olds (%)") &
-        ((df['dimension'] == "Education (3 groups)") |
-         (df['dimension'] == "Economic status (wealth decile)"))
-    ]
-
-    # Prepare plotting DataFrame
-    df = df[['setting', 'date', 'dimension', 'subgroup', 'estimate']].copy()
-    df.rename(columns={'estimate': 'vaccination_coverage'}, inplace=True)
-
-    # Clean data: keep only countries with no missing vaccination coverage
-    valid_countries = df.groupby('setting')['vaccination_coverage'].apply(lambda x: x.notna().all())
-    valid_countries = valid_countries[valid_countries].index.tolist()
-    df = df[df['setting'].isin(valid_countries)]
-
-    # Map subgroups to grouped categories
-    economic_map = {
-        'Decile 1 (poorest)': 'Lowest Economic Status',
-        'Decile 2': 'Lowest Economic Status',
-        'Decile 3': 'Middle Economic Status',
-        'Decile 4': 'Middle Economic Status',
-        'Decile 5': 'Middle Economic Status',
-        'Decile 6': 'Middle Economic Status',
-        'Decile 7': 'Middle Economic Status',
-        'Decile 8': 'Middle Economic Status',
-        'Decile 9': 'Highest Economic Status',
-        'Decile 10 (richest)': 'Highest Economic Status'
-    }
-
-    education_map = {
-        'No education': 'Lowest Educational Status',
-        'Primary education': 'Medium Educational Status',
-        'Secondary or higher education': 'Highest Educational Status'
-    }
-
-    df['group'] = df.apply(
-        lambda row: economic_map.get(row['subgroup']) if row['dimension'] == 'Economic status (wealth decile)'
-        else education_map.get(row['subgroup']) if row['dimension'] == 'Education (3 groups)'
-        else None,
-        axis=1
-    )
-    df['dimension_type'] = df['dimension'].apply(
-        lambda x: 'Economic Status' if 'Economic' in x else 'Education' if 'Education' in x else None
-    )
-    df = df.dropna(subset=['group'])
-
-    # Aggregate line chart data to avoid duplicate points
-    line_data = df.groupby(['setting', 'date', 'dimension_type', 'group'], as_index=False)['vaccination_coverage'].mean()
-
-    # Country selector
-    countries = sorted(df['setting'].dropna().unique())
-    country_dropdown = alt.binding_select(options=countries, name='Country: ')
-    country_select = alt.selection_point(fields=['setting'], bind=country_dropdown, name='country_select', value=countries[0])
+    if server_selection:
+        country = st.selectbox("Country:", options=countries)
+        country_select = None
+    else:
+        country_dropdown = alt.binding_select(options=countries, name='Country: ')
+        country_select = alt.selection_point(fields=['setting'], bind=country_dropdown, name='country_select', value=countries[0])
 
     # Color scale
     color_scale = alt.Scale(domain=[
@@ -779,53 +628,79 @@ elif page == "Vaccination Coverage":
         'Lowest Educational Status', 'Medium Educational Status', 'Highest Educational Status'
     ], range=['#AED6F1', '#5DADE2', '#1F618D', '#D7BDE2', '#AF7AC5', '#6C3483'])
 
-    # Line chart
-    line_chart = alt.Chart(line_data).mark_line(point=True, size=4, opacity=0.9).encode(
-        x=alt.X('date:Q', title='Year', axis=alt.Axis(format='.0f', tickMinStep=1)),
-        y=alt.Y('vaccination_coverage:Q', title='% 1yr Olds Vaccinated', scale=alt.Scale(domain=[0, 105])),
-        color=alt.Color('group:N', title='Group', scale=color_scale),
-        strokeDash=alt.StrokeDash('dimension_type:N', title='Dimension'),
-        tooltip=[
-            alt.Tooltip('setting:N', title='Country'),
-            alt.Tooltip('date:Q', format='.0f', title='Year'),
-            alt.Tooltip('dimension_type:N', title='Dimension'),
-            alt.Tooltip('group:N', title='Group'),
-            alt.Tooltip('vaccination_coverage:Q', format='.1f', title='% Vaccinated')
-        ]
-    ).transform_filter(country_select).properties(
-        width=700,
-        height=400,
-        title='Trends of Vaccination Coverage by Economic & Educational Status'
-    )
+    def build_dashboard():
+        # Coverage by grouped economic/educational status, and line chart
+        # data (only loaded when the spec is not cached)
+        if server_selection:
+            line_data, bar_data = country_slice(country)
+        else:
+            bar_data = get_table("vaccination")
+            line_data = get_table("vaccination_line_data")
+
+        # Line chart
+        line_chart = alt.Chart(line_data).mark_line(point=True, size=4, opacity=0.9).encode(
+            x=alt.X('date:Q', title='Year', axis=alt.Axis(format='.0f', tickMinStep=1)),
+            y=alt.Y('vaccination_coverage:Q', title='% 1yr Olds Vaccinated', scale=alt.Scale(domain=[0, 105])),
+            color=alt.Color('group:N', title='Group', scale=color_scale),
+            strokeDash=alt.StrokeDash('dimension_type:N', title='Dimension'),
+            tooltip=[
+                alt.Tooltip('setting:N', title='Country'),
+                alt.Tooltip('date:Q', format='.0f', title='Year'),
+                alt.Tooltip('dimension_type:N', title='Dimension'),
+                alt.Tooltip('group:N', title='Group'),
+                alt.Tooltip('vaccination_coverage:Q', format='.1f', title='% Vaccinated')
+            ]
+        ).properties(
+            width=700,
+            height=400,
+            title='Trends of Vaccination Coverage by Economic & Educational Status'
+        )
 
-    # Bar chart
-    bar_chart = alt.Chart(df).mark_bar().encode(
-        x=alt.X('vaccination_coverage:Q', title='Average % Vaccinated'),
-        y=alt.Y('group:N', sort='-x', title='Group'),
-        color=alt.Color('group:N', scale=color_scale, legend=None),
-        tooltip=[
-            alt.Tooltip('dimension_type:N', title='Dimension'),
-            alt.Tooltip('group:N', title='Group'),
-            alt.Tooltip('vaccination_coverage:Q', format='.1f', title='Average % Vaccinated')
-        ]
-    ).transform_filter(country_select).transform_aggregate(
-        vaccination_coverage='mean(vaccination_coverage)',
-        groupby=['dimension_type', 'group']
-    ).properties(
-        width=700,
-        height=250,
-        title='Average Vaccination Coverage by Group'
-    )
+        # Bar chart (server-side slices are already averaged by group)
+        bar_chart = alt.Chart(bar_data).mark_bar().encode(
+            x=alt.X('vaccination_coverage:Q', title='Average % Vaccinated'),
+            y=alt.Y('group:N', sort='-x', title='Group'),
+            color=alt.Color('group:N', scale=color_scale, legend=None),
+            tooltip=[
+                alt.Tooltip('dimension_type:N', title='Dimension'),
+                alt.Tooltip('group:N', title='Group'),
+                alt.Tooltip('vaccination_coverage:Q', format='.1f', title='Average % Vaccinated')
+            ]
+        ).properties(
+            width=700,
+            height=250,
+            title='Average Vaccination Coverage by Group'
+        )
 
-    # Combine charts into dashboard
-    dashboard = alt.vconcat(line_chart, bar_chart).add_params(country_select).configure_view(strokeWidth=0).configure_title(
-        fontSize=16,
-        font='Arial',
-        anchor='start'
-    )
+        if country_select is not None:
+            line_chart = line_chart.transform_filter(country_select)
+            bar_chart = bar_chart.transform_filter(country_select).transform_aggregate(
+                vaccination_coverage='mean(vaccination_coverage)',
+                groupby=['dimension_type', 'group']
+            )
 
-    # Render the dashboard
-    st.altair_chart(dashboard)
+        # Combine charts into dashboard
+        dashboard = alt.vconcat(line_chart, bar_chart)
+        if country_select is not None:
+            dashboard = dashboard.add_params(country_select)
+        dashboard = dashboard.configure_view(strokeWidth=0).configure_title(
+            fontSize=16,
+            font='Arial',
+            anchor='start'
+        )
+        return dashboard
+
+    version = table_version("vaccination") + table_version("vaccination_line_data")
+    if server_selection:
+        # One spec per country; then warm the session cache with the
+        # countries likely to be picked next, in the background
+        altair_chart(page, version, {"country": country}, build_dashboard)
+        prefetch(country, countries)
+    else:
+        # Render the dashboard (the dropdown filters in the browser, so one spec
+        # per data version). The bar chart's per-group means are computed here
+        # for every country, so the raw coverage rows are not sent
+        altair_chart(page, version, {}, build_dashboard, server_transforms=True)
 
     # Footer
     st.markdown("---")
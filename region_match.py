@@ -0,0 +1,167 @@
+import os
+import re
+import threading
+import unicodedata
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+from data_store import read_ipc, write_ipc
+from geo_store import GEO_DIR, raw_path, read_json
+
+# Region alias table: survey region name -> GADM admin-1 NAME_1, per iso3.
+# Each country's regions are matched in one batch, trying in order:
+#   exact       the region equals a NAME_1, VARNAME_1 variant or HASC_1 code
+#   normalized  equal after dropping accents, spaces, punctuation, case and
+#               administrative words ("Region", "Province de", ...)
+#   fuzzy       best rapidfuzz WRatio over all candidates (one cdist call)
+# with the score recorded. A region's match does not depend on the other
+# regions, so the table is persisted under SNAPSHOT_DIR/geo and rebuilt per
+# country when its GADM file changes, and a render is a dictionary lookup.
+#
+# Which regions are drawn is decided at render time by confident_names():
+# fuzzy matches below LOW_CONFIDENCE are left out instead of coloring the
+# wrong polygon, and a polygon claimed by several of the regions drawn goes
+# to the best match only.
+#
+# Usage:
+#   aliases = region_aliases("COL", ["Bogota", "Antioquia"])
+#   confident_names(aliases)          # region -> NAME_1
+
+ALIAS_VERSION = 2
+ALIAS_PATH = os.path.join(GEO_DIR, f"region_aliases-v{ALIAS_VERSION}.arrow")
+
+LOW_CONFIDENCE = 85
+
+ALIAS_COLUMNS = ["iso3", "region", "name_1", "method", "score", "source_mtime"]
+
+ADMIN_WORDS = {
+    "region", "regions", "province", "provincia", "department", "departement",
+    "departamento", "state", "estado", "district", "county", "governorate",
+    "prefecture", "division", "zone",
+}
+
+# dropped only right after an administrative word ("Region de Dakar"), so
+# names such as La Romana or Valle del Cauca keep them
+CONNECTOR_WORDS = {"of", "the", "de", "du", "del", "des", "la", "le", "d"}
+
+_aliases = None
+_lock = threading.Lock()
+
+
+def normalize(name):
+    # Lowercase ASCII without spaces, punctuation or administrative words
+    # (some GADM names are written without spaces: "DistritoNacional")
+    name = re.sub(r"(?<=[a-z])(?=[A-Z])", " ", str(name))
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    words = re.findall(r"[a-z0-9]+", name.lower())
+    kept = []
+    after_admin = False
+    for word in words:
+        if word in ADMIN_WORDS or (after_admin and word in CONNECTOR_WORDS):
+            after_admin = True
+            continue
+        after_admin = False
+        kept.append(word)
+    return "".join(kept or words)
+
+
+def candidates(features):
+    # (candidate name, NAME_1) pairs from GADM feature properties
+    pairs = []
+    for feature in features:
+        props = feature["properties"]
+        name = props.get("NAME_1")
+        if not name:
+            continue
+        pairs.append((name, name))
+        for variant in str(props.get("VARNAME_1") or "").split("|"):
+            if variant and variant != "NA":
+                pairs.append((variant, name))
+        hasc = props.get("HASC_1")
+        if hasc and hasc != "NA":
+            pairs.append((hasc, name))
+            pairs.append((hasc.split(".")[-1], name))
+    return pairs
+
+
+def match_regions(regions, features):
+    # One row per region: region, name_1, method, score
+    pairs = candidates(features)
+    exact = {}
+    normalized = {}
+    for candidate, name in pairs:
+        exact.setdefault(candidate, name)
+        normalized.setdefault(normalize(candidate), name)
+
+    rows = []
+    fuzzy = []
+    for region in regions:
+        if region in exact:
+            rows.append((region, exact[region], "exact", 100.0))
+        elif normalize(region) in normalized:
+            rows.append((region, normalized[normalize(region)], "normalized", 100.0))
+        else:
+            fuzzy.append(region)
+
+    if fuzzy and pairs:
+        choices = list(normalized)
+        scores = process.cdist([normalize(r) for r in fuzzy], choices, scorer=fuzz.WRatio, workers=-1)
+        best = scores.argmax(axis=1)
+        for region, i, score in zip(fuzzy, best, scores[np.arange(len(fuzzy)), best]):
+            rows.append((region, normalized[choices[i]], "fuzzy", float(score)))
+    else:
+        rows += [(region, None, "none", 0.0) for region in fuzzy]
+
+    df = pd.DataFrame(rows, columns=["region", "name_1", "method", "score"])
+    # rows in the order of regions
+    return df.set_index("region").loc[list(regions)].reset_index()
+
+
+def confident_names(aliases):
+    # region -> NAME_1 for the regions about to be drawn (alias rows indexed
+    # by region, see region_aliases): matches scoring at least
+    # LOW_CONFIDENCE, a polygon claimed by several going to the best score
+    # (the first region on a tie)
+    confident = aliases[aliases["name_1"].notna() & (aliases["score"] >= LOW_CONFIDENCE)]
+    confident = confident.sort_values("score", ascending=False, kind="stable")
+    return confident.loc[~confident["name_1"].duplicated(), "name_1"]
+
+
+def _load():
+    global _aliases
+    if _aliases is None:
+        if os.path.exists(ALIAS_PATH):
+            _aliases = read_ipc(ALIAS_PATH)
+        else:
+            _aliases = pd.DataFrame(columns=ALIAS_COLUMNS)
+    return _aliases
+
+
+def region_aliases(iso3, regions):
+    # Alias rows (indexed by region) for a country's survey regions, matching
+    # and persisting any that are missing or stale; None without GADM file
+    global _aliases
+    iso3 = iso3.upper()
+    source = raw_path(iso3)
+    if not os.path.exists(source):
+        return None
+    mtime = os.path.getmtime(source)
+    regions = list(dict.fromkeys(regions))
+
+    with _lock:
+        table = _load()
+        rows = table[(table["iso3"] == iso3) & (table["source_mtime"] == mtime)]
+        known = set(rows["region"])
+        missing = [r for r in regions if r not in known]
+
+        if missing:
+            matched = match_regions(missing, read_json(source)["features"])
+            matched = matched.assign(iso3=iso3, source_mtime=mtime)[ALIAS_COLUMNS]
+            rows = pd.concat([rows, matched], ignore_index=True)
+
+            _aliases = pd.concat([table[table["iso3"] != iso3], rows], ignore_index=True)
+            write_ipc(_aliases, ALIAS_PATH)
+
+    return rows.set_index("region").loc[regions]
@@ -1,5 +1,7 @@
 import streamlit as st
-import pandas as pd
+from chart_cache import to_spec
+from derived_tables import get_table
+from pre_transform import pre_transform
 import altair as alt
 
 # Set Streamlit page configuration
@@ -36,61 +38,12 @@ elif page == "Visualization 2":
 elif page == "Vaccination Coverage":
     st.header("Vaccination Coverage by Economic & Educational Status")
 
-    # Load the Excel file
-    df = pd.read_excel('immunizations.xlsx')
-
-    # Filter for relevant indicators and dimensions
-    df = df[
-        (df['indicator_name'] == "Full immunization coverage among one-year-olds (%)") &
-        ((df['dimension'] == "Education (3 groups)") |
-         (df['dimension'] == "Economic status (wealth decile)"))
-    ]
-
-    # Prepare plotting DataFrame
-    df = df[['setting', 'date', 'dimension', 'subgroup', 'estimate']].copy()
-    df.rename(columns={'estimate': 'vaccination_coverage'}, inplace=True)
-
-    # Clean data: keep only countries with no missing vaccination coverage
-    valid_countries = df.groupby('setting')['vaccination_coverage'].apply(lambda x: x.notna().all())
-    valid_countries = valid_countries[valid_countries].index.tolist()
-    df = df[df['setting'].isin(valid_countries)]
-
-    # Map subgroups to grouped categories
-    economic_map = {
-        'Decile 1 (poorest)': 'Lowest Economic Status',
-        'Decile 2': 'Lowest Economic Status',
-        'Decile 3': 'Middle Economic Status',
-        'Decile 4': 'Middle Economic Status',
-        'Decile 5': 'Middle Economic Status',
-        'Decile 6': 'Middle Economic Status',
-        'Decile 7': 'Middle Economic Status',
-        'Decile 8': 'Middle Economic Status',
-        'Decile 9': 'Highest Economic Status',
-        'Decile 10 (richest)': 'Highest Economic Status'
-    }
-
-    education_map = {
-        'No education': 'Lowest Educational Status',
-        'Primary education': 'Medium Educational Status',
-        'Secondary or higher education': 'Highest Educational Status'
-    }
-
-    df['group'] = df.apply(
-        lambda row: economic_map.get(row['subgroup']) if row['dimension'] == 'Economic status (wealth decile)'
-        else education_map.get(row['subgroup']) if row['dimension'] == 'Education (3 groups)'
-        else None,
-        axis=1
-    )
-    df['dimension_type'] = df['dimension'].apply(
-        lambda x: 'Economic Status' if 'Economic' in x else 'Education' if 'Education' in x else None
-    )
-    df = df.dropna(subset=['group'])
-
-    # Aggregate line chart data to avoid duplicate points
-    line_data = df.groupby(['setting', 'date', 'dimension_type', 'group'], as_index=False)['vaccination_coverage'].mean()
+    # Coverage by grouped economic/educational status, and line chart data
+    df = get_table("vaccination")
+    line_data = get_table("vaccination_line_data")
 
     # Country selector
-    countries = sorted(df['setting'].dropna().unique())
+    countries = get_table("vaccination_countries")['setting'].tolist()
     country_dropdown = alt.binding_select(options=[None] + countries, name='Country: ')
     country_select = alt.selection_point(fields=['setting'], bind=country_dropdown, name='country_select', value=None)
 
@@ -145,5 +98,6 @@ elif page == "Vaccination Coverage":
         anchor='start'
     )
 
-    # Render the dashboard
-    st.altair_chart(dashboard)
+    # Render the dashboard, with the bar chart's per-group means computed
+    # here for every country instead of sending the raw coverage rows
+    st.vega_lite_chart(spec=pre_transform(to_spec(dashboard)))
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+# Subgroup taxonomy: maps HIDR (dimension, subgroup) pairs to coarser display
+# groups, e.g. wealth deciles -> Lowest/Middle/Highest Economic Status.
+# Each grouping is a small lookup table, applied to a whole frame with one
+# vectorized index lookup instead of a per-row apply. A new grouping
+# (quintile -> tercile, ...) is one define_grouping call, no per-row code.
+#
+# Usage: assign_groups(df, ["wealth_decile_3", "education_3"])
+
+# name -> lookup table with columns dimension, subgroup, group, dimension_type
+GROUPINGS = {}
+
+
+def define_grouping(name, dimension, mapping, dimension_type):
+    # mapping: subgroup -> group, in display order (poorest/lowest first)
+    GROUPINGS[name] = pd.DataFrame({
+        "dimension": dimension,
+        "subgroup": list(mapping),
+        "group": list(mapping.values()),
+        "dimension_type": dimension_type,
+    })
+
+
+def lookup_table(names):
+    return pd.concat([GROUPINGS[name] for name in names], ignore_index=True)
+
+
+def _categorical(values, positions):
+    # Categorical of values[positions] (missing where position is -1),
+    # categories in first-seen order
+    categories = list(dict.fromkeys(values))
+    codes = pd.Index(categories).get_indexer(values)
+    return pd.Categorical.from_codes(
+        np.where(positions >= 0, codes[positions], -1),
+        categories=categories,
+    )
+
+
+def assign_groups(df, names, group_col="group", type_col="dimension_type"):
+    # Add group and dimension type columns from the named groupings.
+    # Rows whose (dimension, subgroup) is not in any grouping get NaN.
+    table = lookup_table(names)
+    keys = pd.MultiIndex.from_arrays([table["dimension"], table["subgroup"]])
+    positions = keys.get_indexer(pd.MultiIndex.from_arrays([df["dimension"], df["subgroup"]]))
+
+    return df.assign(**{
+        group_col: _categorical(table["group"].tolist(), positions),
+        type_col: _categorical(table["dimension_type"].tolist(), positions),
+    })
+
+
+# -------------------------------------------------------------------------
+# Groupings used by the dashboard
+# -------------------------------------------------------------------------
+define_grouping("wealth_decile_3", "Economic status (wealth decile)", {
+    'Decile 1 (poorest)': 'Lowest Economic Status',
+    'Decile 2': 'Lowest Economic Status',
+    'Decile 3': 'Middle Economic Status',
+    'Decile 4': 'Middle Economic Status',
+    'Decile 5': 'Middle Economic Status',
+    'Decile 6': 'Middle Economic Status',
+    'Decile 7': 'Middle Economic Status',
+    'Decile 8': 'Middle Economic Status',
+    'Decile 9': 'Highest Economic Status',
+    'Decile 10 (richest)': 'Highest Economic Status'
+}, dimension_type="Economic Status")
+
+define_grouping("wealth_quintile_3", "Economic status (wealth quintile)", {
+    'Quintile 1 (poorest)': 'Lowest Economic Status',
+    'Quintile 2': 'Middle Economic Status',
+    'Quintile 3': 'Middle Economic Status',
+    'Quintile 4': 'Middle Economic Status',
+    'Quintile 5 (richest)': 'Highest Economic Status'
+}, dimension_type="Economic Status")
+
+define_grouping("education_3", "Education (3 groups)", {
+    'No education': 'Lowest Educational Status',
+    'Primary education': 'Medium Educational Status',
+    'Secondary or higher education': 'Highest Educational Status'
+}, dimension_type="Education")
+
+define_grouping("sex", "Sex", {
+    'Female': 'Female',
+    'Male': 'Male'
+}, dimension_type="Sex")
@@ -0,0 +1,140 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The dashboard modules live at the repository root
+sys.path.insert(0, ROOT)
+
+# Fixture workbooks in the HIDR layout: ten countries, mortality by sex and
+# wealth quintile for 1950-2022, income share, no-education shares and
+# subnational electricity access for three survey years, and vaccination
+# coverage by wealth decile and education for four. The electricity regions
+# are the GADM NAME_1 names from geo_gadm, about 30% of them rewritten the
+# way surveys spell them ("ASHANTI region"). Congo has no 2000 decile
+# estimates, so it drops out of the vaccination page.
+
+COUNTRIES = [
+    ("Brazil", "BRA", "Americas"), ("India", "IND", "South-East Asia"), ("Ghana", "GHA", "Africa"),
+    ("South Africa", "ZAF", "Africa"), ("Armenia", "ARM", "Europe"), ("Dominican Republic", "DOM", "Americas"),
+    ("Colombia", "COL", "Americas"), ("Albania", "ALB", "Europe"), ("Peru", "PER", "Americas"),
+    ("Congo", "COG", "Africa"),
+]
+QUINTILES = ["Quintile 1 (poorest)", "Quintile 2", "Quintile 3", "Quintile 4", "Quintile 5 (richest)"]
+DECILES = ["Decile 1 (poorest)"] + [f"Decile {i}" for i in range(2, 10)] + ["Decile 10 (richest)"]
+EDUCATION = ["No education", "Primary education", "Secondary or higher education"]
+
+MORTALITY = "Under-five mortality rate (deaths per 1000 live births)"
+VACCINATION = "Full immunization coverage among one-year-olds (%)"
+
+
+def _row(setting, iso3, region, **values):
+    return {"setting": setting, **values, "iso3": iso3, "whoreg6": region, "update": "2024-06-01"}
+
+
+def _gadm_names(iso3):
+    path = os.path.join(ROOT, "geo_gadm", f"{iso3}_adm1.json")
+    if not os.path.exists(path):
+        return ["North", "South"]
+    with open(path) as f:
+        return [feature["properties"]["NAME_1"] for feature in json.load(f)["features"]]
+
+
+def write_workbooks(folder):
+    rng = np.random.default_rng(0)
+
+    rows = []
+    for setting, iso3, region in COUNTRIES:
+        for year in range(1950, 2023):
+            average = 200 * np.exp(-(year - 1950) / 30) + rng.random() * 5
+            for sex in ["Female", "Male"]:
+                rows.append(_row(
+                    setting, iso3, region, date=year, source="UN IGME", indicator_abbr="u5mr",
+                    indicator_name=MORTALITY, dimension="Sex", subgroup=sex,
+                    estimate=average * (1.05 if sex == "Male" else 0.95), setting_average=average,
+                ))
+            if year >= 1990:
+                for i, quintile in enumerate(QUINTILES):
+                    rows.append(_row(
+                        setting, iso3, region, date=year, source="UN IGME", indicator_abbr="u5mr",
+                        indicator_name=MORTALITY, dimension="Economic status (wealth quintile)",
+                        subgroup=quintile, estimate=average * (1.4 - 0.2 * i), setting_average=average,
+                    ))
+    pd.DataFrame(rows).to_excel(os.path.join(folder, "under5_mortality.xlsx"), index=False)
+
+    rows = []
+    for setting, iso3, region in COUNTRIES:
+        survey = dict(source="DHS", setting_average=20)
+        for year in [2005, 2010, 2016]:
+            for i, quintile in enumerate(QUINTILES):
+                rows.append(_row(
+                    setting, iso3, region, date=year, indicator_abbr="inc",
+                    indicator_name="Share of household income (%)", dimension="Economic status (wealth quintile)",
+                    subgroup=quintile, estimate=5 + 4 * i + rng.random(), **survey,
+                ))
+                for sex in ["Female", "Male"]:
+                    rows.append(_row(
+                        setting, iso3, region, date=year, indicator_abbr="noedu",
+                        indicator_name=f"People with no education (%) - {sex}",
+                        dimension="Economic status (wealth quintile)",
+                        subgroup=quintile, estimate=40 - 7 * i + rng.random(), **survey,
+                    ))
+            for name in _gadm_names(iso3):
+                subgroup = name.upper() + " region" if rng.random() < 0.3 else name
+                rows.append(_row(
+                    setting, iso3, region, date=year, source="DHS", indicator_abbr="elec",
+                    indicator_name="Population with electricity (%)", dimension="Subnational region",
+                    subgroup=subgroup, estimate=50 + rng.random() * 50, setting_average=80,
+                ))
+            for residence in ["Urban", "Rural"]:
+                rows.append(_row(
+                    setting, iso3, region, date=year, source="DHS", indicator_abbr="elec",
+                    indicator_name="Population with electricity (%)", dimension="Place of residence",
+                    subgroup=residence, estimate=50 + rng.random() * 50, setting_average=80,
+                ))
+            rows.append(_row(
+                setting, iso3, region, date=year, source="DHS", indicator_abbr="x",
+                indicator_name="Unused indicator", dimension="Sex", subgroup="Male",
+                estimate=1.0, setting_average=1,
+            ))
+    pd.DataFrame(rows).to_excel(os.path.join(folder, "health_determinants.xlsx"), index=False)
+
+    rows = []
+    for setting, iso3, region in COUNTRIES:
+        survey = dict(source="DHS", indicator_abbr="fic", indicator_name=VACCINATION, setting_average=70)
+        for year in [2000, 2005, 2010, 2015]:
+            for decile in DECILES:
+                missing = setting == "Congo" and year == 2000
+                rows.append(_row(
+                    setting, iso3, region, date=year, dimension="Economic status (wealth decile)",
+                    subgroup=decile, estimate=None if missing else 40 + rng.random() * 50, **survey,
+                ))
+            for level in EDUCATION:
+                rows.append(_row(
+                    setting, iso3, region, date=year, dimension="Education (3 groups)",
+                    subgroup=level, estimate=40 + rng.random() * 50, **survey,
+                ))
+            rows.append(_row(setting, iso3, region, date=year, dimension="Sex", subgroup="Male", estimate=50, **survey))
+    pd.DataFrame(rows).to_excel(os.path.join(folder, "immunizations.xlsx"), index=False)
+
+
+@pytest.fixture(scope="session")
+def workbook_dir(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("hidr")
+    write_workbooks(str(folder))
+    os.symlink(os.path.join(ROOT, "geo_gadm"), folder / "geo_gadm")
+    return folder
+
+
+@pytest.fixture
+def workbooks(workbook_dir, monkeypatch):
+    # Run the test from the fixture folder: the pages and stores use paths
+    # relative to the working directory (workbooks, .snapshots, geo_gadm)
+    monkeypatch.delenv("HIDR_EXPORT", raising=False)
+    monkeypatch.chdir(workbook_dir)
+    return workbook_dir
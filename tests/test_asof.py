@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+from asof import DateIndex
+
+
+def frame():
+    rows = [
+        # setting, indicator, dimension, date, estimate
+        ("Peru", "A", "Sex", 2005, 1.0),
+        ("Peru", "A", "Sex", 2010, 2.0),
+        ("Peru", "B", "Sex", 2012, 3.0),
+        ("Ghana", "A", "Sex", 2008, 4.0),
+        ("Ghana", "A", "Sex", 2014, 5.0),
+        ("Ghana", "A", "Sex", None, 6.0),
+        ("Chad", "A", None, 2010, 7.0),
+    ]
+    df = pd.DataFrame(rows, columns=["setting", "indicator_name", "dimension", "date", "estimate"])
+    df["date"] = df["date"].astype("Int16")
+    return df
+
+
+def naive_as_of(df, year=None):
+    # the merge the index replaced: latest date per setting, then its rows
+    dated = df[df["date"].notna() & df["dimension"].notna()]
+    if year is not None:
+        dated = dated[dated["date"] <= year]
+    latest = dated.groupby("setting")["date"].max().rename("latest").reset_index()
+    rows = df.merge(latest, on="setting")
+    return sorted(rows.loc[rows["date"] == rows["latest"], "estimate"])
+
+
+def test_as_of_takes_the_latest_date_per_setting():
+    df = frame()
+    index = DateIndex(df)
+    assert sorted(index.as_of()["estimate"]) == [3.0, 5.0] == naive_as_of(df)
+    assert sorted(index.as_of(year=2010)["estimate"]) == [2.0, 4.0] == naive_as_of(df, 2010)
+
+
+def test_as_of_with_a_year_per_setting():
+    index = DateIndex(frame())
+    rows = index.as_of(year={"Peru": 2006})
+    # Peru as of 2006, every other setting at its latest date
+    assert sorted(zip(rows["setting"], rows["estimate"])) == [("Ghana", 5.0), ("Peru", 1.0)]
+
+
+def test_years_ignore_undated_rows_and_missing_keys():
+    index = DateIndex(frame())
+    assert index.years("Ghana") == [2008, 2014]
+    assert index.years() == [2005, 2008, 2010, 2012, 2014]
+    assert index.years("Chad") == []
+
+
+def test_as_of_matches_the_merge_on_the_fixture(workbooks):
+    from derived_tables import get_table
+
+    df = get_table("education_history")
+    index = DateIndex(df)
+    for year in [None, 2005, 2012]:
+        expected = naive_as_of(df, year)
+        assert np.allclose(sorted(index.as_of(year=year)["estimate"]), expected)
+
+
+def test_setting_as_of_falls_back_to_the_earliest_survey(workbooks):
+    from derived_tables import health_determinants_years, setting_as_of
+
+    assert health_determinants_years("Ghana") == [2005, 2010, 2016]
+
+    rows, shown = setting_as_of("living_history", "Ghana", 2012)
+    assert shown == 2010
+    assert set(rows.loc[rows["setting"] == "Ghana", "date"]) == {2010}
+
+    rows, shown = setting_as_of("living_history", "Ghana", 1999)
+    assert shown == 2005
+    assert set(rows.loc[rows["setting"] == "Ghana", "date"]) == {2005}
+    # other settings stay at their latest survey
+    assert set(rows.loc[rows["setting"] == "Peru", "date"]) == {2016}
@@ -0,0 +1,110 @@
+import altair as alt
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import chart_cache
+from chart_cache import chart_spec, normalize, to_spec
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(chart_cache, "_specs", chart_cache.OrderedDict())
+
+
+def bar_chart(df):
+    return alt.Chart(df).mark_bar().encode(x="setting:N", y="value:Q")
+
+
+def counting(build):
+    calls = []
+
+    def wrapped():
+        calls.append(1)
+        return build()
+    return wrapped, calls
+
+
+def test_normalize_ignores_selection_order():
+    assert normalize({"countries": ["Peru", "Chad"], "year": 2010}) == normalize({"year": 2010, "countries": {"Chad", "Peru"}})
+    assert normalize((2000, 2010)) != normalize((2010, 2000))
+
+
+def test_to_spec_embeds_the_data_as_arrow():
+    df = pd.DataFrame({"setting": ["Peru", "Chad"], "value": [1.5, 2.5]})
+    spec = to_spec(bar_chart(df))
+    name = spec["data"]["name"]
+    table = pa.ipc.open_stream(spec["datasets"][name]).read_pandas()
+    assert table.equals(df)
+    # no fixed size from the default theme
+    assert "continuousWidth" not in spec.get("config", {}).get("view", {})
+
+
+def test_chart_spec_builds_once_per_key():
+    df = pd.DataFrame({"setting": ["Peru"], "value": [1.0]})
+    build, calls = counting(lambda: bar_chart(df))
+
+    first = chart_spec("page", "v1", {"countries": ["Peru", "Chad"]}, build)
+    again = chart_spec("page", "v1", {"countries": ["Chad", "Peru"]}, build)
+    assert again is first and len(calls) == 1
+
+    chart_spec("page", "v2", {"countries": ["Peru", "Chad"]}, build)
+    chart_spec("page", "v1", {"countries": ["Peru"]}, build)
+    assert len(calls) == 3
+
+
+def test_least_recently_used_specs_are_evicted(monkeypatch):
+    monkeypatch.setattr(chart_cache, "MAX_SPECS", 2)
+    df = pd.DataFrame({"setting": ["Peru"], "value": [1.0]})
+    build, calls = counting(lambda: bar_chart(df))
+
+    chart_spec("page", "v1", 1, build)
+    chart_spec("page", "v1", 2, build)
+    chart_spec("page", "v1", 1, build)  # 2 is now the oldest
+    chart_spec("page", "v1", 3, build)
+    assert len(calls) == 3
+    chart_spec("page", "v1", 1, build)
+    assert len(calls) == 3
+    chart_spec("page", "v1", 2, build)
+    assert len(calls) == 4
+
+
+def test_server_transforms_are_cached_separately():
+    df = pd.DataFrame({"setting": ["Peru", "Peru", "Chad"], "group": ["a", "b", "a"], "value": [1.0, 2.0, 3.0]})
+    select = alt.selection_point(fields=["setting"], bind=alt.binding_select(options=["Peru", "Chad"]))
+
+    def build():
+        return (
+            alt.Chart(df).transform_filter(select)
+            .transform_aggregate(value="mean(value)", groupby=["group"])
+            .mark_bar().encode(x="group:N", y="value:Q").add_params(select)
+        )
+
+    client = chart_spec("page", "v1", None, build)
+    server = chart_spec("page", "v1", None, build, server_transforms=True)
+    assert "aggregate" in client["transform"][1]
+    assert not any("aggregate" in t for t in server["transform"])
+
+
+def test_streamlit_receives_the_cached_arrow_bytes():
+    # st.vega_lite_chart passes bytes datasets through (streamlit>=1.35)
+    from streamlit.testing.v1 import AppTest
+
+    def page():
+        import altair as alt
+        import pandas as pd
+
+        from chart_cache import altair_chart
+
+        df = pd.DataFrame({"setting": ["Peru", "Chad"], "value": [1.5, 2.5]})
+        altair_chart("page", "v1", None, lambda: alt.Chart(df).mark_bar().encode(x="setting:N", y="value:Q"))
+
+    at = AppTest.from_function(page).run()
+    assert not at.exception
+    [spec] = [s for key, s in chart_cache._specs.items() if key[0] == "page"]
+    # older Streamlit releases name the element arrow_vega_lite_chart
+    [chart] = at.get("vega_lite_chart") or at.get("arrow_vega_lite_chart")
+    [dataset] = chart.proto.datasets
+    assert dataset.data.data == spec["datasets"][dataset.name]
+    # the cached spec keeps its data for the next rerun
+    assert dataset.name in spec["datasets"]
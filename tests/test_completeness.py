@@ -0,0 +1,53 @@
+import pandas as pd
+
+from completeness import completeness_matrix, select, settings_with
+
+
+def frame():
+    rows = [
+        # setting, indicator, dimension, subgroup, date, estimate
+        ("Peru", "Coverage (%)", "Sex", "Male", 2005, 50.0),
+        ("Peru", "Coverage (%)", "Sex", "Male", 2010, 55.0),
+        ("Chad", "Coverage (%)", "Sex", "Male", 2005, None),
+        ("Chad", "Coverage (%)", "Sex", "Male", 2010, 40.0),
+        ("Chad", "People with no education (%) - Female", "Sex", "Female", 2010, 30.0),
+        ("Mali", "Coverage (%)", "Sex", "Male", None, 45.0),
+    ]
+    return pd.DataFrame(rows, columns=["setting", "indicator_name", "dimension", "subgroup", "date", "estimate"])
+
+
+def test_completeness_matrix_summarizes_each_series():
+    matrix = completeness_matrix(frame()).set_index(["setting", "indicator_name"])
+
+    peru = matrix.loc[("Peru", "Coverage (%)")]
+    assert (peru["rows"], peru["non_null_share"], peru["n_years"]) == (2, 1.0, 2)
+    assert list(peru["years"]) == [2005, 2010]
+
+    chad = matrix.loc[("Chad", "Coverage (%)")]
+    assert chad["non_null_share"] == 0.5
+    assert (chad["first_year"], chad["last_year"]) == (2005, 2010)
+
+    mali = matrix.loc[("Mali", "Coverage (%)")]
+    assert list(mali["years"]) == [] and pd.isna(mali["last_year"])
+
+    # indicator metadata is parsed once per series
+    education = matrix.loc[("Chad", "People with no education (%) - Female")]
+    assert education["indicator_sex"] == "Female"
+
+
+def test_settings_with():
+    matrix = completeness_matrix(frame())
+    assert settings_with(matrix, indicator="Coverage (%)") == ["Chad", "Mali", "Peru"]
+    assert settings_with(matrix, indicator="Coverage (%)", complete=True) == ["Mali", "Peru"]
+    assert settings_with(matrix, indicator="Coverage (%)", dated=True) == ["Chad", "Peru"]
+    assert settings_with(matrix, indicator_prefix="People with no education (%)") == ["Chad"]
+    assert select(matrix, subgroup=["Female"])["setting"].tolist() == ["Chad"]
+
+
+def test_vaccination_countries_on_the_fixture(workbooks):
+    from derived_tables import get_table
+
+    # Congo has no 2000 decile estimates
+    countries = get_table("vaccination_countries")["setting"].tolist()
+    assert "Congo" not in countries
+    assert len(countries) == 9
@@ -0,0 +1,220 @@
+import os
+
+import pandas as pd
+
+import data_store
+
+HEADER = "setting,date,source,indicator_name,dimension,subgroup,estimate,setting_average,iso3,whoreg6,update\n"
+ROWS = [
+    "Peru,2012,DHS,Under-five mortality rate,Sex,Female,20.5,21.0,PER,Americas,2024-06-01\n",
+    "Peru,2012,DHS,Population with electricity (%),Subnational region,Lima,98.0,90.0,PER,Americas,2024-06-01\n",
+    "Peru,2012,DHS,Noise indicator,Sex,Male,1.0,1.0,PER,Americas,2024-06-01\n",
+]
+
+MORTALITY = [{"indicator_name": "Under-five mortality rate*"}]
+ELECTRICITY = [{"indicator_name": "Population with electricity (%)*"}]
+
+
+def test_ingest_csv_keys_the_dataset_by_partitions(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open("export.csv", "w") as f:
+        f.write(HEADER + "".join(ROWS))
+
+    mortality = data_store.ingest_csv("export.csv", partitions=MORTALITY)
+    electricity = data_store.ingest_csv("export.csv", partitions=ELECTRICITY)
+
+    assert mortality != electricity
+    assert os.path.exists(mortality) and os.path.exists(electricity)
+    assert data_store.ingest_csv("export.csv", partitions=MORTALITY) == mortality
+
+    indicators = pd.read_parquet(electricity)["indicator_name"].astype(str).unique().tolist()
+    assert indicators == ["Population with electricity (%)"]
+
+
+def test_ingest_without_matching_rows(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open("export.csv", "w") as f:
+        f.write(HEADER + ROWS[2])  # only an indicator no page uses
+
+    root = data_store.ingest_csv("export.csv", partitions=MORTALITY)
+    assert os.path.isdir(root)
+    df = data_store.load_workbook("export.csv", MORTALITY)
+    assert len(df) == 0 and {"setting", "indicator_name", "estimate"} <= set(df.columns)
+
+
+def test_an_export_is_hashed_in_the_ingest_read(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("HIDR_EXPORT", raising=False)
+    with open("export.csv", "w") as f:
+        f.write(HEADER + "".join(ROWS))
+
+    def content_hash(path):
+        raise AssertionError("export hashed in a separate read")
+
+    readers = []
+    hashing_reader = data_store._HashingReader
+
+    def counting_reader(f):
+        readers.append(f)
+        return hashing_reader(f)
+
+    monkeypatch.setattr(data_store, "_content_hash", content_hash)
+    monkeypatch.setattr(data_store, "_HashingReader", counting_reader)
+
+    df = data_store.load_shared("export.csv", MORTALITY)
+    assert df["indicator_name"].astype(str).unique().tolist() == ["Under-five mortality rate"]
+    # a second partition set reads the rows again, but not to hash them
+    data_store.ingest_csv("export.csv", partitions=ELECTRICITY)
+    assert len(readers) == 1
+
+
+def write_workbook(path, estimates=(20.5, 1.0)):
+    pd.DataFrame({
+        "setting": ["Peru", "Peru"],
+        "date": [2012, 2012],
+        "indicator_name": ["Under-five mortality rate", "Noise indicator"],
+        "dimension": ["Sex", "Sex"],
+        "subgroup": ["Female", "Male"],
+        "estimate": list(estimates),
+    }).to_excel(path, index=False)
+
+
+def test_snapshot_is_keyed_by_the_workbook(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_workbook("workbook.xlsx")
+
+    first = data_store.build_snapshot("workbook.xlsx")
+    stat = os.stat("workbook.xlsx")
+    assert f"-{stat.st_size}-{stat.st_mtime_ns}-" in os.path.basename(first)
+
+    # a fresh process finds the content hash in the index instead of rehashing
+    with monkeypatch.context() as m:
+        m.setattr(data_store, "_hash_memo", {})
+        m.setattr(data_store, "_content_hash", lambda path: 1 / 0)
+        assert data_store.snapshot_path("workbook.xlsx") == first
+
+    # new contents get a new snapshot, and the old one is removed
+    write_workbook("workbook.xlsx", estimates=(30.0, 1.0))
+    second = data_store.build_snapshot("workbook.xlsx")
+    assert second != first
+    assert os.path.exists(second) and not os.path.exists(first)
+
+
+def test_later_loads_do_not_parse_the_workbook(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_workbook("workbook.xlsx")
+    expected = data_store.load_workbook("workbook.xlsx")
+
+    monkeypatch.setattr(data_store, "_hash_memo", {})
+    monkeypatch.setattr(pd, "read_excel", lambda *args, **kwargs: 1 / 0)
+    df = data_store.load_workbook("workbook.xlsx")
+    pd.testing.assert_frame_equal(df, expected)
+    assert df["estimate"].tolist() == [20.5, 1.0]
+
+
+def test_normalize_frame_dtypes():
+    raw = pd.DataFrame({
+        "setting": ["Peru", "Chad", "Peru", "Chad"],
+        "source": ["DHS"] * 4,
+        "note": ["a", "b", "c", "d"],
+        "date": [2010.0, 2012.0, 2010.0, 2012.0],
+        "estimate": [1.5, None, 3.0, 4.0],
+    })
+    df = data_store.normalize_frame(raw)
+
+    assert df["setting"].dtype == "category"
+    # other repeated text too, but not a column of distinct strings
+    assert df["source"].dtype == "category" and df["note"].dtype != "category"
+    assert df["date"].dtype == "int16" and df["date"].tolist() == [2010, 2012, 2010, 2012]
+    assert df["estimate"].dtype == "float32" and df["estimate"].isna().tolist() == [False, True, False, False]
+    assert data_store.memory_mb(df) < data_store.memory_mb(raw)
+    # the input is left as it was
+    assert raw["date"].dtype == "float64"
+
+
+def test_normalize_frame_keeps_missing_and_fractional_dates():
+    missing = data_store.normalize_frame(pd.DataFrame({"date": [2010.0, None]}))
+    assert str(missing["date"].dtype) == "Int16" and missing["date"].isna().tolist() == [False, True]
+
+    # not a year: left as it is
+    fractional = data_store.normalize_frame(pd.DataFrame({"date": [2010.5, 2011.0]}))
+    assert fractional["date"].tolist() == [2010.5, 2011.0]
+
+
+def test_partition_clauses(tmp_path, monkeypatch):
+    import pyarrow.dataset as ds
+
+    monkeypatch.chdir(tmp_path)
+    rows = [
+        ("Under-five mortality rate", "Sex"),
+        ("Under-5 mortality rate (per 1000)", "Sex"),
+        ("Population with electricity (%) - Female", "Subnational region"),
+        ("Population with electricity (%) - Female", "Place of residence"),
+        ("Population with electricity (%) - Female", "Sex"),
+        ("Noise indicator", "Sex"),
+    ]
+    pd.DataFrame({
+        "setting": ["Peru"] * len(rows),
+        "indicator_name": [i for i, _ in rows],
+        "dimension": [d for _, d in rows],
+        "estimate": range(len(rows)),
+    }).to_excel("workbook.xlsx", index=False)
+
+    def read(partitions):
+        df = data_store.load_workbook("workbook.xlsx", partitions)
+        return sorted(df["estimate"].astype(int))
+
+    # patterns are fnmatch globs, matched case-insensitively; a list is any of them
+    assert read([{"indicator_name": ["under-five*", "UNDER-5*"]}]) == [0, 1]
+    # every column of a clause must match
+    assert read([{"indicator_name": "Population with electricity (%)*",
+                  "dimension": ["Subnational region", "Place of residence"]}]) == [2, 3]
+    # a row matching any clause is kept
+    assert read([{"indicator_name": "Under-five*"}, {"dimension": "place of residence"}]) == [0, 3]
+    assert read([{"indicator_name": "No such indicator"}]) == []
+
+    # only the matching partition folders are read
+    dataset = ds.dataset(data_store.build_dataset("workbook.xlsx"), format="parquet",
+                         partitioning=ds.HivePartitioning.discover(infer_dictionary=True))
+    expr = data_store.partition_filter(dataset, [{"indicator_name": "Under-five*"}])
+    assert len(list(dataset.get_fragments())) == 6
+    assert len(list(dataset.get_fragments(filter=expr))) == 1
+
+
+def test_shared_store_round_trip_without_copies(tmp_path):
+    import numpy as np
+    import pyarrow as pa
+
+    df = data_store.normalize_frame(pd.DataFrame({
+        "setting": ["Peru", "Chad"] * 50_000,
+        "date": [2010.0, None] * 50_000,
+        "estimate": np.arange(100_000, dtype="float64"),
+    }))
+    df.loc[1, "estimate"] = np.nan
+    path = str(tmp_path / "frame.arrow")
+    data_store.write_ipc(df, path)
+
+    before = pa.total_allocated_bytes()
+    shared = data_store.read_ipc(path)
+    pd.testing.assert_frame_equal(shared, df)
+
+    # the float column is a read-only view of the mapped file, not a copy
+    estimate = shared["estimate"].to_numpy()
+    assert not estimate.flags.writeable
+    assert pa.total_allocated_bytes() - before < estimate.nbytes
+
+
+def test_load_shared_builds_the_store_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("HIDR_EXPORT", raising=False)
+    write_workbook("workbook.xlsx")
+
+    mortality = data_store.load_shared("workbook.xlsx", MORTALITY)
+    assert mortality["indicator_name"].astype(str).tolist() == ["Under-five mortality rate"]
+    everything = data_store.load_shared("workbook.xlsx")
+    assert len(everything) == 2
+    assert data_store.shared_store_path("workbook.xlsx", MORTALITY) != data_store.shared_store_path("workbook.xlsx")
+
+    # another worker maps the same file instead of loading the workbook
+    monkeypatch.setattr(data_store, "load_workbook", lambda *args: 1 / 0)
+    pd.testing.assert_frame_equal(data_store.load_shared("workbook.xlsx", MORTALITY), mortality)
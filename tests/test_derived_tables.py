@@ -0,0 +1,80 @@
+import os
+
+import derived_tables
+from derived_tables import DERIVED_DIR, get_table, table_version
+
+
+def test_tables_are_built_once_per_version(workbooks, monkeypatch):
+    calls = []
+
+    def build():
+        calls.append(derived_tables.DERIVED_VERSION)
+        return derived_tables.load_source("mortality").head(3)
+
+    monkeypatch.setitem(derived_tables._builders, "first_rows", ("mortality", build))
+
+    table = get_table("first_rows")
+    assert get_table("first_rows") is table and len(calls) == 1
+
+    # another worker maps the file instead of building the table again
+    monkeypatch.setattr(derived_tables, "_tables", {})
+    assert get_table("first_rows").equals(table) and len(calls) == 1
+
+    # a new version is built and replaces the old file
+    old = os.path.join(DERIVED_DIR, f"first_rows-{table_version('first_rows')}.arrow")
+    monkeypatch.setattr(derived_tables, "DERIVED_VERSION", derived_tables.DERIVED_VERSION + 100)
+    get_table("first_rows")
+    assert len(calls) == 2 and not os.path.exists(old)
+    os.remove(os.path.join(DERIVED_DIR, f"first_rows-{table_version('first_rows')}.arrow"))
+
+
+def test_income_recent_is_the_latest_poorest_quintile_share(workbooks):
+    df = derived_tables.load_source("health_determinants")
+    rows = df[
+        (df["indicator_name"] == "Share of household income (%)") &
+        (df["subgroup"] == "Quintile 1 (poorest)")
+    ]
+    latest = rows.sort_values("date").groupby("setting", observed=True).tail(1)
+
+    recent = get_table("income_recent")
+    assert sorted(zip(recent["setting"].astype(str), recent["date"], recent["estimate"])) == \
+        sorted(zip(latest["setting"].astype(str), latest["date"], latest["estimate"]))
+
+
+def test_mortality_envelope_quantiles(workbooks):
+    import numpy as np
+
+    by_year = get_table("mortality_by_year")
+    envelope = get_table("mortality_envelope").set_index(["scope", "date"])
+    assert set(envelope.index.get_level_values("scope")) == {"Global", "Americas", "Africa", "Europe", "South-East Asia"}
+
+    for scope, rows in [("Global", by_year), ("Americas", by_year[by_year["whoreg6"] == "Americas"])]:
+        for year in [1950, 1990, 2022]:
+            values = rows.loc[rows["date"] == year, "setting_average"]
+            band = envelope.loc[(scope, year)]
+            expected = np.quantile(values, list(derived_tables.ENVELOPE_QUANTILES.values()))
+            assert np.allclose(band[list(derived_tables.ENVELOPE_QUANTILES)].astype(float), expected, rtol=1e-5)
+            assert band["n"] == len(values)
+
+
+def test_trend_background_sends_bands_not_every_country(workbooks):
+    import pyarrow as pa
+    from streamlit.testing.v1 import AppTest
+
+    from conftest import ROOT
+
+    def rows_sent(at):
+        (chart,) = [c for c in at.get("vega_lite_chart") if "Overall Trend" in c.proto.spec]
+        return sum(pa.ipc.open_stream(d.data.data).read_all().num_rows for d in chart.proto.datasets)
+
+    at = AppTest.from_file(os.path.join(ROOT, "main_dashboard_trial.py"), default_timeout=120).run()
+    at.sidebar.radio[0].set_value("Under-5 Mortality").run()
+    assert not at.exception
+    trend = get_table("mortality_trend")
+    bands = rows_sent(at)
+    assert bands < len(trend) / 2
+
+    # every other country's line on demand
+    show_lines = next(c for c in at.checkbox if c.label.startswith("Show every other country"))
+    show_lines.check().run()
+    assert rows_sent(at) > len(trend) / 2
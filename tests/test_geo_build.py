@@ -0,0 +1,84 @@
+import json
+import math
+import os
+
+import pytest
+import shapely
+
+import geo_store
+from geo_build import build_levels, grid_digits, read_layer
+
+# A synthetic country of two regions sharing a wiggly border (400 vertices,
+# 0.05 degrees deep), the east one with a small offshore island
+
+
+def border():
+    return [(0.05 * math.sin(i / 4), -10 + 20 * i / 399) for i in range(400)]
+
+
+def feature(name, geometry):
+    return {"type": "Feature", "properties": {"NAME_1": name}, "geometry": geometry}
+
+
+@pytest.fixture
+def country(tmp_path, monkeypatch):
+    west = [(-10, -10)] + border() + [(-10, 10), (-10, -10)]
+    east = [(10, -10), (10, 10)] + border()[::-1] + [(10, -10)]
+    island = [(12, 0), (12.1, 0), (12.1, 0.1), (12, 0.1), (12, 0)]
+    layer = {"type": "FeatureCollection", "features": [
+        feature("West", {"type": "Polygon", "coordinates": [west]}),
+        feature("East", {"type": "MultiPolygon", "coordinates": [[east], [island]]}),
+    ]}
+    os.makedirs(tmp_path / "geo_gadm")
+    with open(tmp_path / "geo_gadm" / "TST_adm1.json", "w") as f:
+        json.dump(layer, f)
+    monkeypatch.chdir(tmp_path)
+    return "TST"
+
+
+def coordinates(geometry):
+    if isinstance(geometry[0], (int, float)):
+        yield geometry
+    else:
+        for part in geometry:
+            yield from coordinates(part)
+
+
+def test_levels_keep_shared_borders(country):
+    paths = build_levels(country)
+    assert len(paths) == len(geo_store.LEVEL_ZOOMS)
+
+    vertices = []
+    for zoom, path in zip(geo_store.LEVEL_ZOOMS, paths):
+        _, (west, east) = read_layer(path)
+        # no gap or overlap along the border: the regions still tile the country
+        union = shapely.union_all([west, east])
+        assert math.isclose(union.area, west.area + east.area)
+        mainland = max(getattr(union, "geoms", [union]), key=lambda p: p.area)
+        assert len(mainland.interiors) == 0
+        assert west.intersection(east).area == 0
+
+        with open(path) as f:
+            layer = json.load(f)
+        points = [p for feature in layer["features"] for p in coordinates(feature["geometry"]["coordinates"])]
+        assert all(round(c, grid_digits(zoom)) == c for p in points for c in p)
+        vertices.append(len(points))
+
+    # coarser levels drop more of the border's wiggles
+    assert vertices == sorted(vertices) and vertices[0] < 50 < 400 < vertices[-1]
+
+
+def test_levels_drop_islands_below_a_pixel(country):
+    paths = dict(zip(geo_store.LEVEL_ZOOMS, build_levels(country)))
+    # the island is 0.1 degrees wide: a fraction of a pixel at zoom 2
+    assert shapely.get_num_geometries(read_layer(paths[2])[1][1]) == 1
+    assert shapely.get_num_geometries(read_layer(paths[8])[1][1]) == 2
+
+
+def test_the_map_reads_the_level_for_its_zoom(country):
+    build_levels(country)
+    assert geo_store.level_for_zoom(3) == 4
+    assert geo_store.load_boundaries(country, 3) == geo_store.read_json(geo_store.level_path(country, 4))
+    # above the last level the full resolution file is drawn
+    assert geo_store.level_for_zoom(9) is None
+    assert geo_store.load_boundaries(country, 9) == geo_store.read_json(geo_store.raw_path(country))
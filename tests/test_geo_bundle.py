@@ -0,0 +1,65 @@
+import json
+import os
+import shutil
+from collections import OrderedDict
+
+import pytest
+
+import geo_store
+from conftest import ROOT
+from geo_build import build_bundle
+
+
+@pytest.fixture
+def bundle(tmp_path, monkeypatch):
+    # A bundle of two small countries built in an empty folder
+    os.makedirs(tmp_path / "geo_gadm")
+    for iso3 in ["ALB", "ARM"]:
+        shutil.copy(os.path.join(ROOT, "geo_gadm", f"{iso3}_adm1.json"), tmp_path / "geo_gadm")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(geo_store, "_manifest", None)
+    monkeypatch.setattr(geo_store, "_source_hashes", {})
+    monkeypatch.setattr(geo_store, "_assets", OrderedDict())
+    return build_bundle()
+
+
+def bundle_path(manifest, iso3, kind):
+    return os.path.join(geo_store.BUNDLE_DIR, manifest["countries"][iso3]["files"][kind]["file"])
+
+
+def test_map_reads_the_bundle(bundle):
+    assert sorted(bundle["countries"]) == ["ALB", "ARM"]
+    level = geo_store.read_json(geo_store.level_path("ARM", 4))
+
+    # with the built levels gone the map still reads every country from the bundle
+    shutil.rmtree(geo_store.GEO_DIR)
+    assert geo_store.load_boundaries("ARM", 4) == level
+    assert geo_store.map_assets("ALB")["names"] == geo_store.read_bundle("ALB", "assets")["names"]
+    assert not os.path.exists(geo_store.GEO_DIR)
+
+    # a deploy may ship only the .gz variants
+    os.remove(bundle_path(bundle, "ARM", "z4"))
+    assert geo_store.read_bundle("ARM", "z4") == level
+
+
+def test_corrupt_or_stale_entries_fall_back_to_geo_gadm(bundle):
+    level = geo_store.read_json(geo_store.level_path("ARM", 4))
+    shutil.rmtree(geo_store.GEO_DIR)
+
+    # a file that does not match its sha256
+    with open(bundle_path(bundle, "ARM", "z4"), "r+b") as f:
+        f.write(b"{}")
+    assert geo_store.read_bundle("ARM", "z4") is None
+    assert geo_store.load_boundaries("ARM", 4) == level
+    assert os.path.exists(geo_store.level_path("ARM", 4))
+
+    # a GADM file changed after the bundle was built
+    source = geo_store.raw_path("ALB")
+    with open(source) as f:
+        data = json.load(f)
+    data["features"][0]["properties"]["NAME_1"] = "Renamed"
+    with open(source, "w") as f:
+        json.dump(data, f)
+    assert geo_store.read_bundle("ALB", "assets") is None
+    assert geo_store.boundaries_url("ALB", 4) is None
+    assert "Renamed" in geo_store.map_assets("ALB")["names"]
@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import geo_store
+
+# GADM downloads against a local HTTP stand-in for the GADM server: the
+# handler answers each path with a scripted list of (status, body), the
+# last one repeating.
+
+COUNTRY = {"type": "FeatureCollection", "features": [{
+    "type": "Feature",
+    "properties": {"NAME_1": "North"},
+    "geometry": {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]},
+}]}
+BODY = json.dumps(COUNTRY).encode()
+
+
+@pytest.fixture
+def gadm_server(tmp_path, monkeypatch):
+    script = {}
+    hits = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits[self.path] = hits.get(self.path, 0) + 1
+            responses = script.get(self.path, [(404, b"")])
+            status, body = responses[min(hits[self.path], len(responses)) - 1]
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(geo_store, "GADM_URL", f"http://127.0.0.1:{server.server_port}/{{iso3}}.json")
+    monkeypatch.setattr(geo_store, "_failures", {})
+    yield script, hits
+    server.shutdown()
+    server.server_close()
+
+
+def test_retries_transient_server_errors(gadm_server):
+    script, hits = gadm_server
+    script["/GHA.json"] = [(503, b""), (503, b""), (200, BODY)]
+
+    path = geo_store.download_gadm("GHA")
+
+    assert path == geo_store.raw_path("GHA")
+    assert hits["/GHA.json"] == 3
+    assert geo_store.read_json(path) == COUNTRY
+    assert geo_store.download_status("GHA") == "ready"
+
+
+def test_not_found_is_unavailable_and_not_retried(gadm_server):
+    script, hits = gadm_server
+    script["/XXX.json"] = [(404, b"")]
+
+    assert geo_store.download_gadm("XXX") is None
+    assert hits["/XXX.json"] == 1
+    assert not os.path.exists(geo_store.raw_path("XXX"))
+    assert geo_store.download_status("XXX") == "unavailable"
+    assert geo_store.retries_due() == ([], None)
+
+
+def test_warmer_retries_a_failed_download(gadm_server, monkeypatch):
+    script, hits = gadm_server
+    # more 503s than the session's own retries, then the file
+    failures = geo_store.DOWNLOAD_RETRIES + 1
+    script["/GHA.json"] = [(503, b"")] * failures + [(200, BODY)]
+    monkeypatch.setattr(geo_store, "RETRY_BACKOFF", 0.01)
+
+    assert geo_store.download_gadm("GHA") is None
+    assert geo_store.download_status("GHA") == "pending"
+
+    geo_store._warm_and_retry(["GHA"])
+
+    assert geo_store.download_status("GHA") == "ready"
+    assert hits["/GHA.json"] == failures + 1
+
+
+def test_gives_up_after_download_attempts(gadm_server, monkeypatch):
+    script, hits = gadm_server
+    script["/GHA.json"] = [(200, b'{"type": "FeatureCollection", "feat')]  # truncated
+    monkeypatch.setattr(geo_store, "RETRY_BACKOFF", 0.01)
+
+    geo_store._warm_and_retry(["GHA"])
+
+    assert hits["/GHA.json"] == geo_store.DOWNLOAD_ATTEMPTS
+    assert geo_store.download_status("GHA") == "unavailable"
+
+
+def test_writes_through_a_temporary_file(gadm_server, monkeypatch):
+    script, _ = gadm_server
+    script["/GHA.json"] = [(200, BODY)]
+    final = geo_store.raw_path("GHA")
+    renames = []
+    replace = os.replace
+
+    def recording_replace(src, dst):
+        # the complete file exists under a temporary name before the rename
+        with open(src, "rb") as f:
+            renames.append((src, dst, f.read(), os.path.exists(dst)))
+        replace(src, dst)
+
+    monkeypatch.setattr(geo_store.os, "replace", recording_replace)
+    geo_store.download_gadm("GHA")
+
+    [(src, dst, data, existed)] = renames
+    assert dst == final and src != final and src.endswith(".tmp")
+    assert data == BODY and not existed
+    assert os.listdir(geo_store.GADM_DIR) == ["GHA_adm1.json"]
+
+
+def test_truncated_download_leaves_no_file(gadm_server):
+    script, _ = gadm_server
+    script["/GHA.json"] = [(200, BODY[:-10])]
+
+    assert geo_store.download_gadm("GHA") is None
+    assert not os.path.exists(geo_store.GADM_DIR) or os.listdir(geo_store.GADM_DIR) == []
+    assert geo_store.download_status("GHA") == "pending"
@@ -0,0 +1,56 @@
+import numpy as np
+
+from heatmap_matrix import ALL_REGIONS, heatmap_frame, heatmap_regions, heatmap_slice
+
+
+def long_form(region, first, last):
+    # the long-form heatmap data the matrix replaced, pivoted for comparison
+    from derived_tables import get_table
+
+    df = get_table("mortality_heatmap")
+    df = df[df["date"].between(first, last)]
+    if region != ALL_REGIONS:
+        df = df[df["whoreg6"] == region]
+    wide = df.pivot(index="setting", columns="date", values="mortality_rate")
+    wide.index = wide.index.astype(str)
+    return wide
+
+
+def test_frame_matches_the_long_form(workbooks):
+    for region in [ALL_REGIONS, "Africa", "Europe"]:
+        frame = heatmap_frame(region, 1990, 2000).set_index("setting")
+        expected = long_form(region, 1990, 2000)
+        assert sorted(frame.index) == sorted(expected.index)
+        assert list(frame.columns) == [str(y) for y in range(1990, 2001)]
+        assert np.allclose(frame.loc[expected.index].to_numpy(), expected.to_numpy().astype(np.float32))
+
+
+def test_rows_are_ordered_by_the_last_year_in_range(workbooks):
+    frame = heatmap_frame(ALL_REGIONS, 1960, 1975)
+    assert frame["1975"].is_monotonic_decreasing
+    assert frame["1975"].dtype == np.float32
+
+
+def test_regions_and_empty_ranges(workbooks):
+    assert heatmap_regions() == ["Africa", "Americas", "Europe", "South-East Asia"]
+    settings, years, values = heatmap_slice(ALL_REGIONS, 2030, 2040)
+    assert len(settings) == 0 and len(years) == 0 and values.shape == (0, 0)
+    assert list(heatmap_frame("Africa", 2030, 2040).columns) == ["setting"]
+
+
+def test_settings_without_an_estimate_sort_last(monkeypatch):
+    import heatmap_matrix
+
+    matrix = (
+        np.array(["A", "B", "C"], dtype=object),
+        np.array(["X", "X", "Y"], dtype=object),
+        np.array([2000, 2001]),
+        np.array([[1, np.nan], [2, 5], [3, 7]], dtype=np.float32),
+    )
+    monkeypatch.setattr(heatmap_matrix, "heatmap_matrix", lambda: matrix)
+    monkeypatch.setattr(heatmap_matrix, "table_version", lambda name: "test")
+    monkeypatch.setattr(heatmap_matrix, "_orders", {})
+
+    assert heatmap_slice(ALL_REGIONS, 2000, 2001)[0].tolist() == ["C", "B", "A"]
+    assert heatmap_slice(ALL_REGIONS, 2000, 2000)[0].tolist() == ["C", "B", "A"]
+    assert heatmap_slice("X", 2000, 2001)[0].tolist() == ["B", "A"]
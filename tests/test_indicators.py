@@ -0,0 +1,44 @@
+import pandas as pd
+
+import indicators
+from indicators import add_indicator_metadata, parse_indicator, startswith_mask
+
+NAMES = [
+    "People with no education (%) - Female",
+    "People with no education (%) - Male",
+    "Under-five mortality rate (deaths per 1000 live births)",
+    "Population with electricity (%)",
+]
+
+
+def test_parse_indicator():
+    assert parse_indicator(NAMES[0]) == ("People with no education (%)", "Female", "%")
+    assert parse_indicator(NAMES[1]) == ("People with no education (%)", "Male", "%")
+    assert parse_indicator(NAMES[2]) == (NAMES[2], "Both", "deaths per 1000 live births")
+    assert parse_indicator("Stunting prevalence") == ("Stunting prevalence", "Both", None)
+
+
+def test_metadata_is_parsed_once_per_distinct_indicator(monkeypatch):
+    calls = []
+    parse = indicators.parse_indicator
+    monkeypatch.setattr(indicators, "parse_indicator", lambda name: calls.append(name) or parse(name))
+
+    df = pd.DataFrame({"indicator_name": NAMES * 50 + [None], "estimate": range(201)})
+    out = add_indicator_metadata(df)
+
+    assert sorted(calls) == sorted(NAMES)
+    for name, base, sex, unit in zip(out["indicator_name"], out["indicator_base"],
+                                     out["indicator_sex"], out["indicator_unit"]):
+        if pd.isna(name):
+            assert pd.isna(base) and pd.isna(sex)
+        else:
+            expected = parse(name)
+            assert (base, sex) == expected[:2]
+            assert unit == expected[2] or (pd.isna(unit) and expected[2] is None)
+    assert out["indicator_sex"].dtype == "category"
+
+
+def test_startswith_mask_matches_the_row_wise_test():
+    series = pd.Series(NAMES * 3 + [None], dtype="category")
+    expected = series.astype(object).map(lambda v: isinstance(v, str) and v.startswith("People with no education"))
+    assert startswith_mask(series, "People with no education").tolist() == expected.tolist()
@@ -0,0 +1,85 @@
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import pytest
+
+import geo_build
+import geo_store
+from conftest import ROOT
+
+
+@pytest.fixture
+def gadm(tmp_path, monkeypatch):
+    # Three small countries and an empty asset cache
+    os.makedirs(tmp_path / "geo_gadm")
+    for iso3 in ["ALB", "ARM", "DOM"]:
+        shutil.copy(os.path.join(ROOT, "geo_gadm", f"{iso3}_adm1.json"), tmp_path / "geo_gadm")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(geo_store, "_assets", OrderedDict())
+    return tmp_path
+
+
+def test_assets_are_ready_to_plot(gadm):
+    assets = geo_store.map_assets("arm")
+    raw = geo_store.read_json(geo_store.raw_path("ARM"))
+
+    assert assets["names"] == [f["properties"]["NAME_1"] for f in raw["features"]]
+    min_lon, min_lat, max_lon, max_lat = assets["bounds"]
+    assert min_lon < assets["center"]["lon"] < max_lon and min_lat < assets["center"]["lat"] < max_lat
+    assert assets["zoom"] == geo_store.fit_zoom(assets["bounds"])
+    assert assets["level"] == geo_store.level_for_zoom(assets["zoom"])
+    assert assets["geojson"] == geo_store.load_boundaries("ARM", assets["zoom"])
+
+
+def test_assets_are_cached_in_memory_and_on_disk(gadm, monkeypatch):
+    assets = geo_store.map_assets("ARM")
+
+    # a rerun reads nothing
+    with monkeypatch.context() as m:
+        m.setattr(geo_store, "read_json", lambda path: 1 / 0)
+        assert geo_store.map_assets("ARM") is assets
+
+    # a restart reads them from disk instead of building them again
+    monkeypatch.setattr(geo_store, "_assets", OrderedDict())
+    with monkeypatch.context() as m:
+        m.setattr(geo_build, "build_assets", lambda iso3: 1 / 0)
+        assert geo_store.map_assets("ARM")["center"] == assets["center"]
+
+    # a new GADM file is built again
+    source = geo_store.raw_path("ARM")
+    mtime = os.path.getmtime(source) + 10
+    os.utime(source, (mtime, mtime))
+    built = []
+    build = geo_build.build_assets
+    monkeypatch.setattr(geo_build, "build_assets", lambda iso3: built.append(iso3) or build(iso3))
+    assert geo_store.map_assets("ARM")["mtime"] == mtime and built == ["ARM"]
+
+
+def test_the_cache_keeps_the_recently_used_countries(gadm, monkeypatch):
+    monkeypatch.setattr(geo_store, "MAX_CACHED_ASSETS", 2)
+    geo_store.map_assets("ALB")
+    geo_store.map_assets("ARM")
+    geo_store.map_assets("ALB")
+    geo_store.map_assets("DOM")
+    assert list(geo_store._assets) == ["ALB", "DOM"]
+
+
+def test_sessions_share_the_cache_across_threads(gadm, monkeypatch):
+    monkeypatch.setattr(geo_store, "MAX_CACHED_ASSETS", 2)
+    errors = []
+
+    def session(countries):
+        try:
+            for iso3 in countries * 5:
+                assert geo_store.map_assets(iso3)["names"]
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=session, args=(["ALB", "ARM", "DOM"][i % 3:] + ["ALB"],)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == [] and len(geo_store._assets) <= 2
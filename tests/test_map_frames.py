@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+import streamlit as st
+
+import map_frames
+from map_frames import frame_locations, frame_values, frame_years
+
+
+@pytest.fixture
+def frames(workbooks, monkeypatch):
+    monkeypatch.setattr(map_frames, "_version", None)
+    monkeypatch.setattr(map_frames, "_countries", {})
+    monkeypatch.setattr(map_frames, "_frames", {})
+    monkeypatch.setattr(st, "get_option", lambda name: False)
+
+
+def test_frames_hold_each_years_values(frames):
+    from derived_tables import get_table
+
+    assert frame_years("GHA") == [2005, 2010, 2016]
+    locations, regions = frame_locations("GHA")
+    assert len(locations) == len(set(locations)) > 0
+
+    df = get_table("region_history")
+    for year in frame_years("GHA"):
+        values = frame_values("GHA", year)
+        assert values.shape == (len(locations),)
+        rows = df[(df["iso3"] == "GHA") & (df["date"] == year)]
+        # the region labelling a polygon was surveyed under that name at least once
+        surveyed = dict(zip(rows["region"].astype(str), rows["value"]))
+        shown = [v for r, v in zip(regions, values) if r in surveyed]
+        assert np.allclose(shown, [surveyed[r] for r in regions if r in surveyed])
+
+
+def test_frames_are_computed_once_per_version(frames, monkeypatch):
+    values = frame_values("GHA", 2010)
+    with monkeypatch.context() as m:
+        m.setattr(map_frames, "get_table", lambda name: 1 / 0)
+        assert frame_values("GHA", 2010) is values
+
+    # new data drops the cached frames
+    version = map_frames.table_version
+    monkeypatch.setattr(map_frames, "table_version", lambda name: version(name) + "-new")
+    again = frame_values("GHA", 2010)
+    assert again is not values and np.array_equal(again, values, equal_nan=True)
+
+
+def test_animation_sends_the_geometry_once(frames):
+    import pandas as pd
+
+    from electricity_map import plot_setting_animation
+
+    fig = plot_setting_animation("GHA", "Ghana", pd.DataFrame(columns=["setting", "iso3", "region", "value"]))
+    locations, _ = frame_locations("GHA")
+    assert [frame.name for frame in fig.frames] == ["2005", "2010", "2016"]
+    for frame in fig.frames:
+        (data,) = frame.data
+        assert data.geojson is None and len(data.z) == len(locations)
+    assert [step["label"] for step in fig.layout.sliders[0].steps] == ["2005", "2010", "2016"]
+    assert np.allclose(fig.frames[1].data[0].z, frame_values("GHA", 2010), equal_nan=True)
@@ -0,0 +1,72 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+import streamlit as st
+
+import electricity_map
+import geo_build
+import geo_store
+from conftest import ROOT
+
+
+def add_country(folder, iso3):
+    shutil.copy(os.path.join(ROOT, "geo_gadm", f"{iso3}_adm1.json"), folder / "geo_gadm")
+
+
+def region_names(iso3):
+    return [f["properties"]["NAME_1"] for f in geo_store.read_json(geo_store.raw_path(iso3))["features"]]
+
+
+@pytest.fixture
+def gadm(tmp_path, monkeypatch):
+    os.makedirs(tmp_path / "geo_gadm")
+    for iso3 in ["ALB", "ARM"]:
+        add_country(tmp_path, iso3)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(geo_store, "_mosaic", None)
+    return tmp_path
+
+
+def test_mosaic_merges_every_country(gadm):
+    mosaic = geo_store.mosaic_assets()
+    assert mosaic["countries"] == ["ALB", "ARM"]
+    assert mosaic["url"] == f"app/static/{mosaic['file']}"
+
+    layer = geo_store.mosaic_geojson()
+    assert [f["id"] for f in layer["features"]] == (
+        [f"ALB/{name}" for name in region_names("ALB")] + [f"ARM/{name}" for name in region_names("ARM")]
+    )
+    assert layer["features"][0]["properties"] == {"iso3": "ALB", "NAME_1": region_names("ALB")[0]}
+    assert mosaic["names"]["ARM"] == region_names("ARM")
+
+
+def test_mosaic_is_rebuilt_for_a_new_country(gadm, monkeypatch):
+    first = geo_store.mosaic_assets()
+    with monkeypatch.context() as m:
+        m.setattr(geo_build, "build_mosaic", lambda: 1 / 0)
+        assert geo_store.mosaic_assets() is first
+
+    add_country(gadm, "DOM")
+    second = geo_store.mosaic_assets()
+    assert second["countries"] == ["ALB", "ARM", "DOM"] and second["url"] != first["url"]
+    # the old layer is no longer published
+    assert os.path.basename(first["file"]) not in os.listdir(gadm / "static" / "geo")
+
+
+def test_the_figure_carries_the_layer_url_and_the_values(gadm, monkeypatch):
+    monkeypatch.setattr(st, "get_option", lambda name: True)
+    names = region_names("ARM")
+    df = pd.DataFrame({
+        "setting": ["Albania", "Armenia", "Armenia"],
+        "iso3": ["ALB", "ARM", "ARM"],
+        "region": [region_names("ALB")[0], names[0], names[1]],
+        "value": [10.0, 20.0, 30.0],
+    })
+
+    fig = electricity_map.plot_mosaic_map(["ARM"], df)
+    trace = fig.data[-1]
+    assert trace.geojson == geo_store.mosaic_assets()["url"]
+    assert list(trace.locations) == [f"ARM/{names[0]}", f"ARM/{names[1]}"]
+    assert list(trace.z) == [20.0, 30.0]
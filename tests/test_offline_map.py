@@ -0,0 +1,65 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+import streamlit as st
+
+import electricity_map
+import geo_store
+from conftest import ROOT
+
+
+@pytest.fixture
+def gadm(tmp_path, monkeypatch):
+    os.makedirs(tmp_path / "geo_gadm")
+    for iso3 in ["ALB", "ARM"]:
+        shutil.copy(os.path.join(ROOT, "geo_gadm", f"{iso3}_adm1.json"), tmp_path / "geo_gadm")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(geo_store, "_mosaic", None)
+    return tmp_path
+
+
+def regions(iso3):
+    names = [f["properties"]["NAME_1"] for f in geo_store.read_json(geo_store.raw_path(iso3))["features"]]
+    return pd.DataFrame({"setting": iso3, "iso3": iso3, "region": names[:2], "value": [40.0, 60.0]}), names
+
+
+def test_base_map_outlines_every_country(gadm, monkeypatch):
+    mosaic = geo_store.mosaic_assets()
+    # plotly fetches {topojsonURL}world_110m.json for a world scope geo map
+    assert mosaic["basemap_url"].endswith("/")
+    topology = geo_store.read_json(os.path.join(geo_store.STATIC_DIR, mosaic["basemap"], "world_110m.json"))
+    geometries = topology["objects"]["countries"]["geometries"]
+    assert [g["id"] for g in geometries] == ["ALB", "ARM"]
+
+    def arc_indexes(arcs):
+        for item in arcs:
+            if isinstance(item, list):
+                yield from arc_indexes(item)
+            else:
+                yield item
+    assert sorted(i for g in geometries for i in arc_indexes(g["arcs"])) == list(range(len(topology["arcs"])))
+
+    monkeypatch.setattr(st, "get_option", lambda name: True)
+    assert electricity_map.chart_config(True) == {"topojsonURL": mosaic["basemap_url"]}
+    assert electricity_map.chart_config(False) == {}
+
+
+def test_offline_map_needs_no_tiles(gadm, monkeypatch):
+    monkeypatch.setattr(st, "get_option", lambda name: False)
+    df, names = regions("ARM")
+
+    online = electricity_map.plot_setting_map("ARM", df, "Armenia")
+    assert online.layout.mapbox.style == "carto-positron"
+
+    fig = electricity_map.plot_setting_map("ARM", df, "Armenia", offline=True)
+    assert {trace.type for trace in fig.data} == {"choropleth"}
+    assert fig.layout.mapbox.style is None and fig.layout.geo.fitbounds == "locations"
+
+    # the regions without a value are drawn once, in grey, under the values
+    base, values = fig.data
+    assert list(values.locations) == names[:2]
+    assert list(base.locations) == sorted(names[2:])
+    assert sorted(f["properties"]["NAME_1"] for f in base.geojson["features"]) == sorted(names[2:])
+    assert "http" not in fig.to_json()
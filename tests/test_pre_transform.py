@@ -0,0 +1,112 @@
+import copy
+import re
+
+import altair as alt
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+import vl_convert as vlc
+
+from chart_cache import to_spec
+from pre_transform import ALL_FIELD, aggregate, pre_transform
+
+
+def read_arrow(data):
+    return pa.ipc.open_stream(data).read_pandas()
+
+
+def inline(spec, value):
+    # Arrow datasets as JSON rows, with the selection preset to value (None:
+    # empty), for rendering with vl-convert
+    spec = copy.deepcopy(spec)
+    for name, data in spec["datasets"].items():
+        df = read_arrow(data)
+        spec["datasets"][name] = df.astype(object).where(df.notna(), None).to_dict("records")
+    param = spec["params"][0]
+    if value is None:
+        param.pop("value", None)
+    else:
+        param["value"] = [{"setting": value}]
+    return spec
+
+
+def render(spec):
+    # SVG with numbers to 9 significant digits: pandas and Vega sum in a
+    # different order, so a mean can differ in its last bits
+    svg = vlc.vegalite_to_svg(spec)
+    return re.sub(r"\d+\.\d+", lambda m: f"{float(m.group()):.9g}", svg)
+
+
+def dashboard(bar_data, line_data, countries, empty=True):
+    # the vaccination page's layout: a line chart filtered by the country
+    # dropdown over a bar chart of per-group means of the selected rows
+    select = alt.selection_point(fields=["setting"], bind=alt.binding_select(options=countries),
+                                 name="country_select", value=countries[0], empty=empty)
+    line = alt.Chart(line_data).mark_line(point=True).encode(
+        x="date:Q", y="vaccination_coverage:Q", color="group:N", strokeDash="dimension_type:N",
+    ).transform_filter(select)
+    bar = alt.Chart(bar_data).mark_bar().encode(
+        x="vaccination_coverage:Q", y=alt.Y("group:N", sort="-x"), color="group:N",
+        tooltip=["dimension_type:N", alt.Tooltip("vaccination_coverage:Q", format=".3f")],
+    ).transform_filter(select).transform_aggregate(
+        vaccination_coverage="mean(vaccination_coverage)", groupby=["dimension_type", "group"],
+    )
+    return alt.vconcat(line, bar).add_params(select)
+
+
+@pytest.fixture
+def vaccination(workbooks):
+    from derived_tables import get_table
+
+    bar_data = get_table("vaccination")
+    line_data = get_table("vaccination_line_data")
+    countries = sorted(bar_data["setting"].astype(str).unique())
+    return bar_data, line_data, countries
+
+
+@pytest.mark.parametrize("empty", [True, False])
+def test_pre_transformed_spec_renders_the_same(vaccination, empty):
+    bar_data, line_data, countries = vaccination
+    spec = to_spec(dashboard(bar_data, line_data, countries, empty))
+    pushed = pre_transform(copy.deepcopy(spec))
+
+    for value in ["Ghana", "Peru", countries[-1], None]:
+        assert render(inline(pushed, value)) == render(inline(spec, value)), value
+
+
+def test_only_aggregated_rows_are_embedded(vaccination):
+    bar_data, line_data, countries = vaccination
+    spec = to_spec(dashboard(bar_data, line_data, countries))
+    pushed = pre_transform(copy.deepcopy(spec))
+
+    bar = pushed["vconcat"][1]
+    rows = read_arrow(pushed["datasets"][bar["data"]["name"]])
+    # one row per (country, dimension type, group), plus the all-countries means
+    assert len(rows) == len(countries) * 6 + 6
+    assert len(rows) < len(bar_data)
+    assert rows[ALL_FIELD].sum() == 6
+    assert not any("aggregate" in t for t in bar["transform"])
+    # the raw bar rows are no longer referenced, so they are dropped
+    assert spec["vconcat"][1]["data"]["name"] not in pushed["datasets"]
+    assert pushed["vconcat"][0] == spec["vconcat"][0]
+
+
+def test_aggregate_groups_missing_values_like_vega():
+    df = pd.DataFrame({
+        "setting": ["A", "A", "B", None],
+        "value": np.array([1.0, 3.0, 5.0, 7.0], dtype=np.float32),
+    })
+    out = aggregate(df, [{"op": "mean", "field": "value", "as": "mean"},
+                         {"op": "count", "as": "n"}], ["setting"])
+    assert out["setting"].tolist()[:2] == ["A", "B"] and pd.isna(out["setting"].iloc[2])
+    assert out["mean"].tolist() == [2.0, 5.0, 7.0] and out["mean"].dtype == np.float64
+    assert out["n"].tolist() == [2, 1, 1]
+
+
+def test_other_views_are_left_alone():
+    df = pd.DataFrame({"setting": ["A", "B"], "value": [1.0, 2.0]})
+    chart = alt.Chart(df).mark_bar().encode(x="setting:N", y="value:Q").transform_aggregate(
+        value="median(value)", groupby=["setting"])
+    spec = to_spec(chart)
+    assert pre_transform(copy.deepcopy(spec)) == spec
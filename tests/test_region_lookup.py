@@ -0,0 +1,83 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import region_lookup
+import region_match
+from region_lookup import RegionIndex, electricity_at
+
+
+def square(x0, y0, x1, y1):
+    return [[[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]]
+
+
+# West and East share the border x=1; Islands has two parts
+FEATURES = [
+    {"type": "Feature", "properties": {"GID_1": "TST.1_1", "NAME_1": "West"},
+     "geometry": {"type": "Polygon", "coordinates": square(0, 0, 1, 1)}},
+    {"type": "Feature", "properties": {"GID_1": "TST.2_1", "NAME_1": "East"},
+     "geometry": {"type": "Polygon", "coordinates": square(1, 0, 2, 1)}},
+    {"type": "Feature", "properties": {"GID_1": "TST.3_1", "NAME_1": "Islands"},
+     "geometry": {"type": "MultiPolygon", "coordinates": [square(5, 5, 6, 6), square(8, 8, 9, 9)]}},
+]
+
+
+@pytest.fixture
+def country(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(region_match, "ALIAS_PATH", str(tmp_path / "aliases.arrow"))
+    monkeypatch.setattr(region_match, "_aliases", None)
+    os.makedirs("geo_gadm")
+    with open(os.path.join("geo_gadm", "TST_adm1.json"), "w") as f:
+        json.dump({"type": "FeatureCollection", "features": FEATURES}, f)
+    index = RegionIndex(["TST"])
+    monkeypatch.setattr(region_lookup, "_index", index)
+    return index
+
+
+def test_locate(country):
+    assert country.locate(0.5, 0.5)["NAME_1"] == "West"
+    assert country.locate(0.5, 1.5)["NAME_1"] == "East"
+    assert country.locate(8.5, 8.5)["NAME_1"] == "Islands"
+    assert country.locate(3.0, 3.0) is None
+
+
+def test_a_point_on_a_shared_border_takes_the_first_region(country):
+    assert country.locate(0.5, 1.0)["NAME_1"] == "West"
+
+
+def test_locate_many(country):
+    lats = [0.5, 0.5, 5.5, 3.0, 0.0]
+    lons = [0.5, 1.5, 5.5, 3.0, 1.0]
+    located = country.locate_many(lats, lons)
+    assert located["NAME_1"].tolist()[:3] == ["West", "East", "Islands"]
+    assert pd.isna(located.loc[3, "NAME_1"]) and pd.isna(located.loc[3, "iso3"])
+    assert located.loc[4, "NAME_1"] == "West"
+    assert country.locate_many([], [])["NAME_1"].tolist() == []
+
+
+def test_electricity_at(country):
+    df_regions = pd.DataFrame({
+        "iso3": "TST",
+        # "WEST region" (100) and "Wst" (86) both claim West; "Isle" matches
+        # Islands below LOW_CONFIDENCE
+        "region": ["WEST region", "Wst", "East", "Isle"],
+        "value": [10.0, 20.0, 30.0, 40.0],
+        "date": 2016,
+    })
+    points = electricity_at([0.5, 0.5, 5.5, 3.0], [0.5, 1.5, 5.5, 3.0], df_regions)
+
+    assert points["region"].tolist()[:2] == ["WEST region", "East"]
+    assert points["value"].tolist()[:2] == [10.0, 30.0]
+    # Islands only has a low-confidence survey region; the last point is in
+    # no region
+    assert np.isnan(points["value"].iloc[2]) and np.isnan(points["value"].iloc[3])
+
+
+def test_electricity_at_without_survey_data(country):
+    df_regions = pd.DataFrame({"iso3": ["XXX"], "region": ["North"], "value": [1.0], "date": [2016]})
+    points = electricity_at([0.5], [0.5], df_regions)
+    assert points["NAME_1"].tolist() == ["West"] and np.isnan(points["value"].iloc[0])
@@ -0,0 +1,134 @@
+import json
+import os
+
+import pytest
+
+import region_match
+from region_match import LOW_CONFIDENCE, confident_names, match_regions, normalize, region_aliases
+
+FEATURES = [
+    {"properties": {"NAME_1": "Greater Accra", "VARNAME_1": "Accra|GAR", "HASC_1": "GH.AA"}},
+    {"properties": {"NAME_1": "Ashanti", "VARNAME_1": "NA", "HASC_1": "GH.AH"}},
+    {"properties": {"NAME_1": "DistritoNacional", "VARNAME_1": "NA", "HASC_1": "NA"}},
+    {"properties": {"NAME_1": "Northern", "VARNAME_1": "NA", "HASC_1": "NA"}},
+]
+
+
+def matched(regions):
+    return match_regions(regions, FEATURES).set_index("region")
+
+
+def test_normalize():
+    assert normalize("ASHANTI region") == normalize("Ashanti") == "ashanti"
+    assert normalize("DistritoNacional") == normalize("Distrito Nacional")
+    assert normalize("Région de Dakar") == "dakar"
+    # articles that are part of the name stay
+    assert normalize("LaRomana") == normalize("LAROMANA region") == "laromana"
+    assert normalize("Departamento del Valle del Cauca") == normalize("Valle del Cauca") == "valledelcauca"
+    assert normalize("La Paz") == "lapaz"
+    # a name made only of administrative words keeps them
+    assert normalize("Region") == "region"
+
+
+def test_match_methods():
+    df = matched(["Accra", "AH", "ASHANTI region", "Distrito Nacional", "Nortern", "Zzqx"])
+    assert df.loc["Accra", ["name_1", "method"]].tolist() == ["Greater Accra", "exact"]
+    assert df.loc["AH", ["name_1", "method"]].tolist() == ["Ashanti", "exact"]
+    assert df.loc["Distrito Nacional", ["name_1", "method"]].tolist() == ["DistritoNacional", "normalized"]
+    assert df.loc["Nortern", ["name_1", "method"]].tolist() == ["Northern", "fuzzy"]
+    assert df.loc["Nortern", "score"] >= LOW_CONFIDENCE
+    assert df.loc["Zzqx", "score"] < LOW_CONFIDENCE
+    assert confident_names(df).to_dict() == {
+        "Accra": "Greater Accra", "AH": "Ashanti", "Distrito Nacional": "DistritoNacional", "Nortern": "Northern",
+    }
+
+
+def test_a_match_does_not_depend_on_the_other_regions():
+    alone = matched(["Northen Region"])
+    together = matched(["Northern", "Northen Region", "Accra"])
+    assert together.loc[["Northen Region"]].equals(alone)
+
+
+def test_weaker_match_does_not_take_a_claimed_polygon():
+    # at render time, among the regions drawn
+    df = matched(["Northen Region", "Northern"])
+    assert confident_names(df).to_dict() == {"Northern": "Northern"}
+    assert confident_names(df.loc[["Northen Region"]]).to_dict() == {"Northen Region": "Northern"}
+
+
+@pytest.fixture
+def alias_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(region_match, "_aliases", None)
+    os.makedirs("geo_gadm")
+    with open(os.path.join("geo_gadm", "TST_adm1.json"), "w") as f:
+        json.dump({"type": "FeatureCollection", "features": FEATURES}, f)
+    return os.path.join("geo_gadm", "TST_adm1.json")
+
+
+def test_region_aliases_are_persisted(alias_store, monkeypatch):
+    first = region_aliases("tst", ["ASHANTI region"])
+    assert first.loc["ASHANTI region", "name_1"] == "Ashanti"
+    assert os.path.exists(region_match.ALIAS_PATH)
+
+    both = region_aliases("TST", ["Nortern", "ASHANTI region"])
+    assert both.index.tolist() == ["Nortern", "ASHANTI region"]
+
+    # a new process reads the table back without matching again
+    monkeypatch.setattr(region_match, "_aliases", None)
+    calls = []
+    match = region_match.match_regions
+    monkeypatch.setattr(region_match, "match_regions", lambda *a: calls.append(a) or match(*a))
+    again = region_aliases("TST", ["ASHANTI region", "Nortern"])
+    assert again["name_1"].tolist() == ["Ashanti", "Northern"] and not calls
+
+    # a changed GADM file is matched again
+    stat = os.stat(alias_store)
+    os.utime(alias_store, (stat.st_atime, stat.st_mtime + 10))
+    region_aliases("TST", ["ASHANTI region"])
+    assert len(calls) == 1
+
+
+def test_region_aliases_without_boundaries(alias_store):
+    assert region_aliases("XXX", ["North"]) is None
+
+
+def test_fixture_regions_match_their_polygons(workbooks):
+    from derived_tables import get_table
+
+    df = get_table("region_history")
+    for iso3, rows in df.groupby(df["iso3"].astype(str)):
+        aliases = region_aliases(iso3, rows["region"].astype(str))
+        if aliases is None:
+            continue
+        # survey spelling: the NAME_1, or it upper-cased with " region"
+        expected = [r[:-len(" region")] if r.endswith(" region") else r for r in aliases.index]
+        assert [n.upper() for n in aliases["name_1"]] == [e.upper() for e in expected], iso3
+        # spellings of one polygon from different survey years all score
+        # as confident
+        assert (aliases["score"] >= LOW_CONFIDENCE).all(), iso3
+
+
+def test_matching_the_history_keeps_the_latest_map(workbooks, tmp_path, monkeypatch):
+    from derived_tables import get_table
+    from electricity_map import fuzzy_merge_regions
+
+    monkeypatch.setattr(region_match, "ALIAS_PATH", str(tmp_path / "aliases.arrow"))
+    monkeypatch.setattr(region_match, "_aliases", None)
+    df_regions = get_table("regions")
+    iso3s = sorted(set(df_regions["iso3"].astype(str)) & {"BRA", "DOM", "GHA", "ZAF"})
+
+    def latest_map():
+        return {iso3: fuzzy_merge_regions(df_regions[df_regions["iso3"] == iso3], iso3)["matched_region"].tolist()
+                for iso3 in iso3s}
+
+    before = latest_map()
+    # the animation / as-of slider match every survey year's spellings
+    history = get_table("region_history")
+    for iso3 in iso3s:
+        region_aliases(iso3, history.loc[history["iso3"] == iso3, "region"].astype(str))
+    monkeypatch.setattr(region_match, "_aliases", None)  # a later session, from disk
+
+    assert latest_map() == before
+    for iso3, names in before.items():
+        assert all(isinstance(n, str) for n in names), iso3
@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+def test_map_render_path_does_not_import_geopandas():
+    # geopandas/shapely only come in through geo_build, on a cache miss
+    code = (
+        "import sys, electricity_map, geo_store, map_frames, region_match;"
+        "print(sorted(m for m in ('geopandas', 'shapely', 'fiona', 'pyproj') if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip().splitlines()[-1] == "[]"
+
+
+COLD_RENDER = """
+import os, sys
+sys.path.insert(0, {root!r})
+import pandas as pd
+import geo_store
+from electricity_map import plot_mosaic_map, plot_setting_map
+
+df = pd.DataFrame({{
+    "setting": ["Ghana", "Ghana", "Armenia"],
+    "iso3": ["GHA", "GHA", "ARM"],
+    "region": ["Ashanti", "Volta", "Shirak"],
+    "value": [80.0, 60.0, 90.0],
+}})
+assert plot_setting_map("GHA", df, "Ghana") is not None
+assert plot_mosaic_map(["GHA", "ARM"], df) is not None
+geo_store.prepare("ARM")
+# the levels, assets and merged layer were all built by this process
+assert os.path.exists(geo_store.level_path("ARM", geo_store.LEVEL_ZOOMS[0]))
+assert os.listdir(os.path.join(geo_store.STATIC_DIR, "geo"))
+print(sorted(m for m in ("geopandas", "fiona", "pyproj") if m in sys.modules))
+"""
+
+
+def test_cold_render_does_not_import_geopandas(tmp_path):
+    # nothing prebuilt: the map builds its levels, assets and merged layer
+    # on the render path
+    os.symlink(os.path.join(ROOT, "geo_gadm"), tmp_path / "geo_gadm")
+    (tmp_path / "static").mkdir()
+    (tmp_path / ".snapshots").mkdir()
+    code = COLD_RENDER.format(root=ROOT)
+    out = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, capture_output=True, text=True)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip().splitlines()[-1] == "[]"
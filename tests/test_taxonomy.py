@@ -0,0 +1,40 @@
+import pandas as pd
+
+from taxonomy import GROUPINGS, assign_groups, define_grouping, lookup_table
+
+
+def test_assign_groups_matches_a_per_row_mapping():
+    df = pd.DataFrame({
+        "dimension": ["Economic status (wealth decile)"] * 3 + ["Education (3 groups)"] * 2 + ["Sex"],
+        "subgroup": ["Decile 1 (poorest)", "Decile 5", "Decile 10 (richest)",
+                     "No education", "Secondary or higher education", "Male"],
+    })
+    table = lookup_table(["wealth_decile_3", "education_3"])
+    mapping = {(d, s): (g, t) for d, s, g, t in table[["dimension", "subgroup", "group", "dimension_type"]].itertuples(index=False)}
+
+    out = assign_groups(df, ["wealth_decile_3", "education_3"])
+
+    expected = [mapping.get(key, (None, None)) for key in zip(df["dimension"], df["subgroup"])]
+    assert [g if isinstance(g, str) else None for g in out["group"]] == [g for g, _ in expected]
+    assert [t if isinstance(t, str) else None for t in out["dimension_type"]] == [t for _, t in expected]
+    # Sex is not in the requested groupings
+    assert out["group"].isna().tolist() == [False] * 5 + [True]
+
+
+def test_groups_keep_display_order():
+    df = pd.DataFrame({
+        "dimension": ["Economic status (wealth decile)"] * 2,
+        "subgroup": ["Decile 10 (richest)", "Decile 1 (poorest)"],
+    })
+    out = assign_groups(df, ["wealth_decile_3"])
+    assert list(out["group"].cat.categories) == [
+        "Lowest Economic Status", "Middle Economic Status", "Highest Economic Status",
+    ]
+
+
+def test_define_grouping(monkeypatch):
+    monkeypatch.setitem(GROUPINGS, "placeholder", None)
+    define_grouping("placeholder", "Place of residence", {"Rural": "Rural", "Urban": "Urban"}, "Residence")
+    df = pd.DataFrame({"dimension": ["Place of residence"], "subgroup": ["Urban"]})
+    out = assign_groups(df, ["placeholder"], group_col="g", type_col="t")
+    assert out[["g", "t"]].astype(str).values.tolist() == [["Urban", "Residence"]]
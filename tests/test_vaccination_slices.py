@@ -0,0 +1,115 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+import streamlit as st
+
+import vaccination_slices
+from conftest import ROOT
+from vaccination_slices import PREFETCH_KEY, SESSION_KEY, build_slice, country_slice, likely_next, prefetch
+
+
+@pytest.fixture
+def session(workbooks, monkeypatch):
+    # st.session_state outside a script run is one process-wide state
+    for key in (SESSION_KEY, PREFETCH_KEY):
+        st.session_state.pop(key, None)
+    yield
+    for key in (SESSION_KEY, PREFETCH_KEY):
+        st.session_state.pop(key, None)
+
+
+def cached_countries():
+    return [country for _, country in st.session_state[SESSION_KEY]]
+
+
+def test_likely_next():
+    countries = ["A", "B", "C", "D", "E"]
+    assert likely_next("C", countries) == ["D", "B", "E"]
+    assert likely_next("A", countries, n=2) == ["B", "C"]
+    assert likely_next("E", countries, n=10) == ["D", "C", "B", "A"]
+    assert likely_next("X", countries) == []
+
+
+def test_slice_matches_the_client_side_filter(session):
+    from derived_tables import get_table
+
+    line_rows, bar_rows = build_slice("Ghana")
+    line_data = get_table("vaccination_line_data")
+    expected = line_data[line_data["setting"] == "Ghana"].reset_index(drop=True)
+    assert line_rows.equals(expected)
+    assert (len(line_rows), len(bar_rows)) == (24, 6)
+
+    # bar rows: mean coverage of the country's rows per group
+    df = get_table("vaccination")
+    df = df[df["setting"] == "Ghana"]
+    means = df.groupby("group", observed=True)["vaccination_coverage"].mean()
+    got = bar_rows.set_index(bar_rows["group"].astype(str))["vaccination_coverage"]
+    assert np.allclose(got.loc[means.index.astype(str)], means.to_numpy())
+
+
+def test_country_slice_is_cached_per_session(session, monkeypatch):
+    calls = []
+    build = vaccination_slices.build_slice
+    monkeypatch.setattr(vaccination_slices, "build_slice", lambda c: calls.append(c) or build(c))
+
+    first = country_slice("Ghana")
+    assert country_slice("Ghana") is first and calls == ["Ghana"]
+
+
+def test_prefetch_fills_the_cache_with_neighbours(session, monkeypatch):
+    monkeypatch.setattr(vaccination_slices, "MAX_SLICES", 3)
+    countries = ["Albania", "Armenia", "Brazil", "Colombia", "Ghana"]
+
+    country_slice("Brazil")
+    prefetch("Brazil", countries, n=2).join()
+    # the country on screen is the most recently used
+    assert cached_countries() == ["Colombia", "Armenia", "Brazil"]
+
+    country_slice("Colombia")
+    prefetch("Colombia", countries, n=2).join()
+    assert cached_countries() == ["Brazil", "Ghana", "Colombia"]
+    # nothing left to fetch
+    assert prefetch("Colombia", countries, n=2) is None
+
+
+def test_prefetch_does_not_block_the_rerun(session, monkeypatch):
+    release = threading.Event()
+    build = vaccination_slices.build_slice
+    monkeypatch.setattr(vaccination_slices, "build_slice", lambda c: release.wait(10) and build(c))
+    countries = ["Albania", "Armenia", "Brazil"]
+
+    thread = prefetch("Armenia", countries, n=2)
+    assert thread.is_alive() and cached_countries() == []
+    # a rerun while it is still running does not start another one
+    assert prefetch("Armenia", countries, n=2) is thread
+
+    release.set()
+    thread.join()
+    assert sorted(cached_countries()) == ["Albania", "Brazil"]
+
+
+def test_page_skips_the_slice_on_a_cached_spec(session, monkeypatch):
+    from streamlit.testing.v1 import AppTest
+
+    calls = []
+    build = vaccination_slices.build_slice
+    monkeypatch.setattr(vaccination_slices, "build_slice", lambda c: calls.append(c) or build(c))
+
+    def open_page():
+        at = AppTest.from_file(os.path.join(ROOT, "main_dashboard_trial.py"), default_timeout=120).run()
+        at.sidebar.radio[0].set_value("Vaccination Coverage").run()
+        at.checkbox[0].check().run()
+        at.selectbox[0].set_value("Ghana").run()
+        assert not at.exception
+        # let the neighbours' prefetch finish inside the fixture folder
+        if PREFETCH_KEY in at.session_state:
+            at.session_state[PREFETCH_KEY].join()
+        return at
+
+    open_page()
+    assert calls.count("Ghana") == 1
+    # a second session gets the country's spec from the chart cache
+    open_page()
+    assert calls.count("Ghana") == 1
@@ -0,0 +1,133 @@
+import os
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+from derived_tables import get_table, table_version
+from pre_transform import aggregate
+
+# Per-country slices of the vaccination dashboard, for the server-side
+# country selection mode.
+#
+# In the default mode the chart's own dropdown filters every country's rows
+# in the browser. In this mode Streamlit owns the choice and the chart only
+# gets one country's rows: its coverage lines and its per-group means,
+# aggregated here. Slices live in a small per-session cache, and after a
+# render the countries the user is likely to pick next (the dropdown
+# neighbours of the current one) are prefetched into it by a background
+# thread, so neither that rerun nor stepping through the list waits on the
+# tables.
+#
+# SERVER_SELECTION (HIDR_SERVER_SELECTION=1) turns the mode on by default.
+#
+# Usage:
+#   line_rows, bar_rows = country_slice("Ghana")
+#   prefetch("Ghana", countries)
+
+SERVER_SELECTION = os.environ.get("HIDR_SERVER_SELECTION", "") not in ("", "0")
+
+# neighbours prefetched after a render, and slices kept per session
+PREFETCH = 3
+MAX_SLICES = 16
+
+SESSION_KEY = "vaccination_slices"
+PREFETCH_KEY = "vaccination_prefetch"
+
+# guards every session's slice cache: the prefetch thread fills it while
+# the script thread reads it
+_slices_lock = threading.Lock()
+
+
+def _version():
+    return table_version("vaccination") + table_version("vaccination_line_data")
+
+
+def build_slice(country):
+    # (line chart rows, bar chart rows) of one country
+    line_data = get_table("vaccination_line_data")
+    line_rows = line_data[line_data["setting"] == country]
+
+    df = get_table("vaccination")
+    bar_rows = aggregate(
+        df[df["setting"] == country],
+        [{"op": "mean", "field": "vaccination_coverage", "as": "vaccination_coverage"}],
+        ["dimension_type", "group"],
+    )
+    return line_rows.reset_index(drop=True), bar_rows
+
+
+def _slices():
+    # (version, country) -> slice, least recently used first
+    if SESSION_KEY not in st.session_state:
+        st.session_state[SESSION_KEY] = OrderedDict()
+    return st.session_state[SESSION_KEY]
+
+
+def _evict(slices):
+    while len(slices) > MAX_SLICES:
+        slices.popitem(last=False)
+
+
+def country_slice(country):
+    # Slice of one country through the session cache
+    slices = _slices()
+    key = (_version(), country)
+    with _slices_lock:
+        if key in slices:
+            slices.move_to_end(key)
+            return slices[key]
+
+    built = build_slice(country)
+    with _slices_lock:
+        slices[key] = built
+        slices.move_to_end(key)
+        _evict(slices)
+    return built
+
+
+def likely_next(country, countries, n=PREFETCH):
+    # The n dropdown neighbours of country, nearest first (the next one
+    # before the previous one)
+    if country not in countries:
+        return []
+    i = countries.index(country)
+    nearby = []
+    for step in range(1, len(countries)):
+        for j in (i + step, i - step):
+            if 0 <= j < len(countries) and countries[j] not in nearby:
+                nearby.append(countries[j])
+    return nearby[:n]
+
+
+def _fill(slices, version, country, others):
+    for other in others:
+        built = build_slice(other)
+        with _slices_lock:
+            slices.setdefault((version, other), built)
+    with _slices_lock:
+        # the country on screen stays the most recently used
+        if (version, country) in slices:
+            slices.move_to_end((version, country))
+        _evict(slices)
+
+
+def prefetch(country, countries, n=PREFETCH):
+    # Fill the session cache with the likely next countries' slices in a
+    # background thread; returns it (None if nothing is missing). A session
+    # runs one prefetch at a time
+    running = st.session_state.get(PREFETCH_KEY)
+    if running is not None and running.is_alive():
+        return running
+
+    slices = _slices()
+    version = _version()
+    with _slices_lock:
+        others = [other for other in likely_next(country, countries, n) if (version, other) not in slices]
+    if not others:
+        return None
+
+    thread = threading.Thread(target=_fill, args=(slices, version, country, others), daemon=True)
+    thread.start()
+    st.session_state[PREFETCH_KEY] = thread
+    return thread